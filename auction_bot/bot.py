@@ -1,9 +1,72 @@
-from aiogram import Bot
+import asyncio
+import ssl
+
+import certifi
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import Bot, __version__ as aiogram_version
 from aiogram.enums import ParseMode
 from aiogram.client.session.aiohttp import AiohttpSession
 from .config import settings
 from aiogram.client.default import DefaultBotProperties
 
 
-session = AiohttpSession()
-bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
\ No newline at end of file
+class TunedAiohttpSession(AiohttpSession):
+    """
+    HTTP-сессия Bot API с настроенным пулом соединений.
+
+    Все исходящие вызовы процесса идут через неё: соединения с api.telegram.org
+    остаются открытыми между запросами (keep-alive), адрес кэшируется, а размер пула
+    ограничивает одновременные запросы при массовых рассылках. ClientSession и
+    TCPConnector создаются здесь же, через публичный create_session().
+    """
+
+    def __init__(self, limit: int, keepalive_timeout: float, ttl_dns_cache: int, **kwargs):
+        super().__init__(limit=limit, **kwargs)
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.client: ClientSession | None = None
+
+    async def create_session(self) -> ClientSession:
+        if self.client is None or self.client.closed:
+            connector = TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                limit=self.limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+            )
+            self.client = ClientSession(
+                connector=connector,
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{aiogram_version}"},
+            )
+        return self.client
+
+    async def close(self) -> None:
+        if self.client is not None and not self.client.closed:
+            await self.client.close()
+            # Даём закрыться SSL-соединениям (как AiohttpSession.close)
+            await asyncio.sleep(0.25)
+
+
+def create_session() -> AiohttpSession:
+    return TunedAiohttpSession(
+        limit=settings.BOT_HTTP_LIMIT,
+        keepalive_timeout=settings.BOT_HTTP_KEEPALIVE,
+        ttl_dns_cache=settings.BOT_HTTP_DNS_TTL,
+        timeout=settings.BOT_HTTP_TIMEOUT,
+    )
+
+
+def create_bot(token: str = settings.BOT_TOKEN) -> Bot:
+    return Bot(
+        token=token,
+        session=create_session(),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+
+
+# Единственный экземпляр на процесс: обработчики получают его как message.bot,
+# сервисы — через конструктор, остальные модули импортируют отсюда
+bot = create_bot()
@@ -17,5 +17,69 @@ class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./auction.db")
     FILES_DIR: str = os.getenv("FILES_DIR", "./files")
 
+    # HTTP-пул Bot API: одна сессия aiohttp на процесс (bot.py)
+    BOT_HTTP_LIMIT: int = int(os.getenv("BOT_HTTP_LIMIT", "100"))  # соединений одновременно
+    BOT_HTTP_KEEPALIVE: float = float(os.getenv("BOT_HTTP_KEEPALIVE", "60"))  # с простоя до закрытия соединения
+    BOT_HTTP_DNS_TTL: int = int(os.getenv("BOT_HTTP_DNS_TTL", "3600"))
+    BOT_HTTP_TIMEOUT: float = float(os.getenv("BOT_HTTP_TIMEOUT", "30"))  # таймаут запроса, с
+
+    # Приём апдейтов через webhook вместо long polling (WEBHOOK_URL — публичный адрес бота)
+    WEBHOOK_MODE: bool = os.getenv("WEBHOOK_MODE", "0").lower() in ("1", "true", "yes")
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")  # пусто — случайный при каждом запуске (при PARTITIONS обязателен)
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "16"))
+
+    # Разбиение тендеров между процессами одного хоста: PARTITIONS > 0 включает режим,
+    # WORKER_ID — номер процесса (0..N-1), IPC между ними — на IPC_BASE_PORT + WORKER_ID
+    PARTITIONS: int = int(os.getenv("PARTITIONS", "0"))
+    WORKER_ID: int = int(os.getenv("WORKER_ID", "0"))
+    PARTITION_LEASE_TTL: float = float(os.getenv("PARTITION_LEASE_TTL", "15"))
+    PARTITION_RENEW_INTERVAL: float = float(os.getenv("PARTITION_RENEW_INTERVAL", "5"))
+    IPC_HOST: str = os.getenv("IPC_HOST", "127.0.0.1")
+    IPC_BASE_PORT: int = int(os.getenv("IPC_BASE_PORT", "9200"))
+    IPC_TIMEOUT: float = float(os.getenv("IPC_TIMEOUT", "10"))
+
+    # Профиль SQLite: WAL и pragma на каждом соединении, один писатель и пул читателей.
+    # Включается явно: задача, держащая незафиксированную запись, не может писать второй сессией
+    SQLITE_PROFILE: bool = os.getenv("SQLITE_PROFILE", "0").lower() in ("1", "true", "yes")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # < 0 — в КиБ
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    SQLITE_READERS: int = int(os.getenv("SQLITE_READERS", "8"))
+
+    # Кэш пользователей бота по telegram_id (middleware апдейтов)
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL: float = float(os.getenv("USER_CACHE_TTL", "300"))
+
+    # Outbox уведомлений
+    OUTBOX_WORKERS: int = int(os.getenv("OUTBOX_WORKERS", "4"))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_CHAT_BATCH: int = int(os.getenv("OUTBOX_CHAT_BATCH", "1"))  # сообщений одного чата в пачке
+    OUTBOX_RETENTION: float = float(os.getenv("OUTBOX_RETENTION", str(7 * 24 * 3600)))  # с хранения отправленных
+    OUTBOX_CLAIM_TIMEOUT: float = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", "600"))  # с до возврата чужого захвата
+
+    # Хранилище FSM: "database" — таблица fsm_states с кэшем отложенной записи, "memory" — MemoryStorage
+    FSM_STORAGE: str = os.getenv("FSM_STORAGE", "database")
+    FSM_FLUSH_INTERVAL: float = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))  # с между записями в базу
+    FSM_CACHE_SIZE: int = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+    FSM_STATE_TTL: float = float(os.getenv("FSM_STATE_TTL", str(24 * 3600)))  # с без изменений до сброса
+
+    # Групповой коммит заявок: заявки всех тендеров за окно пишутся одной транзакцией
+    GROUP_COMMIT: bool = os.getenv("GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+    GROUP_COMMIT_WINDOW_MS: float = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "5"))
+    GROUP_COMMIT_MAX_BATCH: int = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+
+    # Режим "тикера": вместо сообщения на каждую заявку — одно закреплённое сообщение, которое редактируется
+    TICKER_MODE: bool = os.getenv("TICKER_MODE", "0").lower() in ("1", "true", "yes")
+    TICKER_DEBOUNCE: float = float(os.getenv("TICKER_DEBOUNCE", "1.0"))
+
 
 settings = Settings()
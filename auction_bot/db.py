@@ -1,15 +1,139 @@
 from __future__ import annotations
+import asyncio
+import logging
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import sessionmaker
+import weakref
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql import Select
 from .models import Base
 from .config import settings
+from .migrations import run_migrations
 
+logger = logging.getLogger(__name__)
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
-SessionLocal: async_sessionmaker[AsyncSession] = async_sessionmaker(engine, expire_on_commit=False)
+_WRITING_KEY = "routing_writer"
+
+# Задача -> сессия, которая держит в ней соединение писателя
+_writer_holders: weakref.WeakKeyDictionary[asyncio.Task, Session] = weakref.WeakKeyDictionary()
+
+
+def _sqlite_pragmas(readonly: bool) -> list[str]:
+    pragmas = [
+        f"busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"cache_size={settings.SQLITE_CACHE_SIZE}",
+        f"temp_store={settings.SQLITE_TEMP_STORE}",
+    ]
+    if readonly:
+        pragmas.append("query_only=ON")
+    else:
+        # Режим журнала хранится в самом файле базы, достаточно писателя
+        pragmas.insert(0, "journal_mode=WAL")
+    return pragmas
+
+
+def _on_connect(pragmas: list[str]):
+    def apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+    return apply
+
+
+def create_engines(url: str, profile: bool) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    Движки (писатель, читатель).
+
+    С профилем SQLite пишет ровно одно соединение (пул из одного — конкурирующие
+    транзакции ждут его в очереди пула, а не ловят «database is locked»), а читают
+    несколько соединений с query_only: в WAL читатели не блокируют писателя и друг
+    друга. Без профиля, для in-memory базы и не-SQLite — один общий движок.
+    """
+    if not profile or not url.startswith("sqlite") or ":memory:" in url:
+        engine = create_async_engine(url, echo=False, future=True)
+        return engine, engine
+
+    # aiosqlite по умолчанию открывает соединение на каждую сессию (NullPool);
+    # здесь соединения долгоживущие — pragma применяются один раз, кэш страниц не теряется
+    options = dict(echo=False, future=True, poolclass=AsyncAdaptedQueuePool, max_overflow=0,
+                   pool_timeout=max(30.0, settings.SQLITE_BUSY_TIMEOUT_MS / 1000))
+    writer = create_async_engine(url, pool_size=1, **options)
+    reader = create_async_engine(url, pool_size=settings.SQLITE_READERS, **options)
+    event.listen(writer.sync_engine, "connect", _on_connect(_sqlite_pragmas(readonly=False)))
+    event.listen(reader.sync_engine, "connect", _on_connect(_sqlite_pragmas(readonly=True)))
+    return writer, reader
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая читает через пул читателей и пишет через соединение писателя.
+
+    SELECT идут читателю, пока транзакция ничего не записала. Первая запись (flush,
+    INSERT/UPDATE/DELETE или произвольный text()) переключает сессию на писателя до
+    конца транзакции, чтобы последующие чтения видели собственные изменения.
+
+    Писатель один, поэтому задача, чья транзакция уже пишет, не может писать второй
+    сессией: та ждала бы соединение, которое держит сама задача. Такая вложенная
+    запись сразу завершается ошибкой, а не ожиданием pool_timeout.
+    """
+    writer: AsyncEngine
+    reader: AsyncEngine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get(_WRITING_KEY):
+            return self.writer.sync_engine
+        if isinstance(clause, Select):
+            return self.reader.sync_engine
+        self._claim_writer()
+        return self.writer.sync_engine
+
+    def _claim_writer(self):
+        task = asyncio.current_task()
+        if task is not None:
+            holder = _writer_holders.get(task)
+            if holder is not None and holder is not self:
+                raise RuntimeError(
+                    "Вложенная запись: транзакция этой задачи уже держит писателя SQLite; "
+                    "зафиксируйте её до записи через другую сессию"
+                )
+            _writer_holders[task] = self
+        self.info[_WRITING_KEY] = True
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _route_flush(session: Session, flush_context, instances):
+    # flush пишет: все запросы до конца транзакции, включая SELECT внутри flush, — писателю
+    if not session.info.get(_WRITING_KEY):
+        session._claim_writer()
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session: Session, transaction):
+    if transaction.parent is None and session.info.pop(_WRITING_KEY, None):
+        task = asyncio.current_task()
+        if task is not None and _writer_holders.get(task) is session:
+            del _writer_holders[task]
+
+
+def create_session_factory(writer: AsyncEngine, reader: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    if writer is reader:
+        return async_sessionmaker(writer, expire_on_commit=False)
+    routing = type("BoundRoutingSession", (RoutingSession,), {"writer": writer, "reader": reader})
+    return async_sessionmaker(expire_on_commit=False, sync_session_class=routing)
+
+
+engine, read_engine = create_engines(settings.DATABASE_URL, settings.SQLITE_PROFILE)
+SessionLocal: async_sessionmaker[AsyncSession] = create_session_factory(engine, read_engine)
 
 
 async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+    if engine is not read_engine:
+        logger.info(f"🗄 SQLite: WAL, один писатель, читателей до {settings.SQLITE_READERS}")
@@ -1,23 +1,34 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher, types
+from aiogram import Dispatcher, types
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
 from aiogram.types import BotCommand
 
 from .config import settings
-from .db import init_db, SessionLocal
+from .bot import bot
+from .db import init_db
 from .keyboards import *
 from sqlalchemy import select
 from .routes import admin, organizer, supplier, common, auctions
 from .services.timers import AuctionTimer
 from .services.reports import ReportService
-from .services.activate_pending_tenders import activate_pending_tenders
+from .services.activate_pending_tenders import TenderActivator
+from .services.lifecycle import tender_lifecycle
+from .services.auction_book import auction_books
+from .services.bid_actors import BidActorRegistry
+from .services.group_commit import GroupCommitter
+from .services.identity import UserMiddleware, identity_cache
+from .services.unit_of_work import session_scope, unit_of_work
+from .services.notifier import Notifier
+from .services.outbox import OutboxDispatcher, set_forward_wake
+from .services.ticker import PriceTicker
+from .services.webhook import WebhookServer
+from .services.fsm_storage import DatabaseStorage
+from .services.partitions import PartitionManager, PartitionRouter
 from .services import bids
 from .services import timers
 from .routes import organizer
@@ -27,14 +38,61 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
-bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-storage = MemoryStorage()
+# Состояния FSM переживают перезапуск: таблица fsm_states с кэшем отложенной записи
+# (несколько процессов — без кэша: апдейты пользователя могут попасть в любой)
+if settings.FSM_STORAGE == "database":
+    storage = DatabaseStorage(write_back=not settings.PARTITIONS)
+else:
+    storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
+# Одна сессия базы на апдейт (параметр session и session_scope() в помощниках)
+dp.update.outer_middleware(unit_of_work)
+# Пользователь бота определяется один раз на апдейт и передается обработчикам параметром user
+dp.update.outer_middleware(UserMiddleware(identity_cache))
 
 # Инициализация сервисов
-auction_timer = timers.AuctionTimer(bot)
+notifier = Notifier(bot)
+delivery = OutboxDispatcher(notifier)
+ticker = PriceTicker(notifier) if settings.TICKER_MODE else None
+auction_timer = timers.AuctionTimer(bot, notifier, ticker)
+bid_actors = BidActorRegistry(committer=GroupCommitter(
+    settings.GROUP_COMMIT_WINDOW_MS, settings.GROUP_COMMIT_MAX_BATCH
+) if settings.GROUP_COMMIT else None)
+activator = TenderActivator()
+# Подписчики на смену статусов тендеров
+transition_subscribers = [auction_books.on_transition, auction_timer.on_transition, activator.on_transition]
+if settings.PARTITIONS:
+    # Тендеры поделены между процессами: книги, дедлайны и акторы держит владелец
+    # партиции, остальные пересылают ему заявки и события по IPC
+    partitions = PartitionManager(
+        f"worker-{settings.WORKER_ID}", f"{settings.IPC_HOST}:{settings.IPC_BASE_PORT + settings.WORKER_ID}"
+    )
+    partition_router = PartitionRouter(partitions, bid_actors, transition_subscribers)
+    partition_router.bid_hook = supplier.forwarded_bid_hook
+    partition_router.after_bid = supplier.after_forwarded_bid
+    auction_books.owns = auction_timer.owns = activator.owns = partitions.owns
+    auction_books.router = bid_actors.router = partition_router
+    # Outbox разбирает держатель роли outbox: захваты помечаются именем процесса, а
+    # wake() остальных процессов уходит ему по IPC
+    delivery.owner = partitions.worker
+    set_forward_wake(partition_router.wake_outbox)
+    tender_lifecycle.subscribe(partition_router.on_transition)
+    auctions.set_partitions(partitions, partition_router)
+else:
+    partitions = partition_router = None
+    for subscriber in transition_subscribers:
+        tender_lifecycle.subscribe(subscriber)
 organizer.set_timer(auction_timer)
 supplier.set_timer(auction_timer)
+auctions.set_timer(auction_timer)
+supplier.set_bid_actors(bid_actors)
+supplier.set_delivery(delivery)
+auctions.set_delivery(delivery)
+supplier.set_ticker(ticker)
+auctions.set_ticker(ticker)
+bids.set_timer(auction_timer)
+bids.set_bid_actors(bid_actors)
+auctions.set_bid_actors(bid_actors)
 report_service = ReportService()
 
 # Состояния для регистрации поставщика
@@ -58,16 +116,12 @@ class AuctionParticipation(StatesGroup):
     waiting_for_bid = State()
 
 @dp.message(Command("start"))
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, user=None):
     """Начальная команда бота"""
     user_id = message.from_user.id
 
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         from .models import User
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-
         
         if not user:
             # Если это админ
@@ -91,6 +145,7 @@ async def cmd_start(message: Message):
                 )
                 session.add(user)
                 await session.commit()
+                identity_cache.put(user)
                 await message.answer("Панель организатора", reply_markup=menu_organizer)
                 return
 
@@ -102,6 +157,7 @@ async def cmd_start(message: Message):
             )
             session.add(user)
             await session.commit()
+            identity_cache.put(user)
 
 
         # Если пользователь заблокирован
@@ -186,7 +242,7 @@ async def process_fio(message: Message, state: FSMContext):
     
     user_id = message.from_user.id
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         from .models import User
         stmt = select(User).where(User.telegram_id == user_id)
         result = await session.execute(stmt)
@@ -200,6 +256,7 @@ async def process_fio(message: Message, state: FSMContext):
             user.fio = user_data['fio']
             
             await session.commit()
+            identity_cache.invalidate(user_id)
             
             await message.answer(
                 f"✅ Регистрация завершена!\n\n"
@@ -218,6 +275,63 @@ async def process_fio(message: Message, state: FSMContext):
 
 
 
+webhook: WebhookServer | None = None
+polling: asyncio.Task | None = None
+
+
+async def start_updates():
+    """Приём апдейтов этим процессом (при PARTITIONS — у держателя роли updates)"""
+    global polling
+    if webhook:
+        await webhook.register(settings.WEBHOOK_URL)
+    elif polling is None or polling.done():
+        # Апдейты, накопившиеся при смене получателя, не сбрасываем
+        await bot.delete_webhook(drop_pending_updates=False)
+        polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+
+
+async def stop_updates():
+    global polling
+    if polling and not polling.done():
+        await dp.stop_polling()
+        await asyncio.gather(polling, return_exceptions=True)
+    polling = None
+
+
+async def on_roles_acquired(roles: set[str]):
+    if "outbox" in roles:
+        delivery.start()
+    if "updates" in roles:
+        await start_updates()
+
+
+async def on_roles_released(roles: set[str]):
+    # Роль ушла другому процессу (аренда истекла) — не дублируем его работу
+    if "outbox" in roles:
+        await delivery.stop()
+    if "updates" in roles:
+        await stop_updates()
+
+
+async def on_partitions_acquired(acquired: set[int]):
+    """Новые партиции: состояние их тендеров перечитывается из базы"""
+    await auction_books.load_active()
+    await auction_timer.rehydrate()
+    await activator.load()
+
+
+async def on_partitions_released(released: set[int]):
+    """Отданные партиции: книги, дедлайны и акторы их тендеров больше не наши"""
+    known = set(auction_books.books) | set(auction_timer.deadlines.entries) \
+        | set(activator.deadlines.entries) | set(bid_actors.actors)
+    for tender_id in known:
+        if partitions.partition(tender_id) in released:
+            auction_books.drop(tender_id)
+            auction_timer.deadlines.cancel(tender_id)
+            activator.deadlines.cancel(tender_id)
+            await bid_actors.stop(tender_id)
+
+
 def register_handlers(dp: Dispatcher):
     """Регистрация всех хендлеров"""
     admin.register_handlers(dp)
@@ -229,24 +343,69 @@ def register_handlers(dp: Dispatcher):
 
 async def main():
     """Главная функция"""
+    global webhook
+
+    if partitions and settings.WEBHOOK_MODE and not settings.WEBHOOK_SECRET:
+        # Иначе у каждого процесса свой случайный токен, и апдейты, пришедшие не тому, получат 401
+        raise RuntimeError("PARTITIONS с WEBHOOK_MODE требует общий WEBHOOK_SECRET для всех процессов")
 
-    await bot.delete_webhook(drop_pending_updates=True)
     # Инициализация базы данных
     await bot.set_my_commands([
         BotCommand(command="start", description="Запуск бота"),
         BotCommand(command="help", description="Помощь"),
     ])
     await init_db()
-    
-    
+    if settings.WEBHOOK_MODE and settings.WEBHOOK_URL:
+        # До аренд: роль updates может прийти в любой момент и должна зарегистрировать webhook
+        webhook = WebhookServer(dp, bot)
+        auctions.set_webhook(webhook)
+    if partitions:
+        # До загрузки книг и дедлайнов: грузим только тендеры своих партиций
+        partitions.on_acquired.append(on_partitions_acquired)
+        partitions.on_released.append(on_partitions_released)
+        await partitions.start()
+        await partition_router.start(settings.IPC_HOST, settings.IPC_BASE_PORT + settings.WORKER_ID)
+    # Книги активных аукционов — в память до приема апдейтов
+    await auction_books.load_active()
+    # Дедлайны активных аукционов (истекшие за время простоя закрываются сразу)
+    await auction_timer.rehydrate()
+
 
     register_handlers(dp)
 
-    asyncio.create_task(activate_pending_tenders())
+    if partitions:
+        # Роли — после регистрации обработчиков: опрос может начаться сразу
+        partitions.on_roles_acquired.append(on_roles_acquired)
+        partitions.on_roles_released.append(on_roles_released)
+    # Доставка уведомлений из outbox (при PARTITIONS — у держателя роли outbox: outbox не делится)
+    if not partitions or "outbox" in partitions.roles:
+        delivery.start()
+
+    # Активация одобренных тендеров по времени начала
+    await activator.load()
     
     # Запуск бота
     logger.info("Бот запущен")
-    await dp.start_polling(bot)
+    try:
+        if webhook:
+            await webhook.run(settings.WEBHOOK_URL, register=not partitions or "updates" in partitions.roles)
+        elif partitions:
+            # Long polling допускает одного получателя — держателя роли updates; если он
+            # умрёт, роль (и опрос) перейдёт другому. Остальные процессы обслуживают свои
+            # партиции и заявки, пересланные по IPC
+            if "updates" in partitions.roles:
+                await start_updates()
+            await asyncio.Event().wait()
+        else:
+            if settings.WEBHOOK_MODE:
+                logger.warning("WEBHOOK_MODE без WEBHOOK_URL — работаем через long polling")
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        if partitions:
+            await stop_updates()
+            await partition_router.stop()
+            await partitions.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,192 @@
+"""
+Версионированные миграции схемы.
+
+create_all создаёт только отсутствующие таблицы (вместе с их индексами), а база
+с прошлых версий бота уже есть. Всё, что меняет существующие таблицы, оформляется
+миграцией: функцией от синхронного Connection с номером версии. При старте
+применяются ещё не применённые миграции по возрастанию номера, каждая отмечается
+в schema_migrations в той же транзакции, что и init_db.
+
+Миграции должны быть идемпотентны: на новой базе create_all уже создал всё,
+что описано в models.py, и миграция просто ничего не находит.
+"""
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, delete, func, insert, inspect, select, update,
+)
+from sqlalchemy.engine import Connection
+
+from .models import Base, Bid, Tender, TenderAccess, TenderParticipant
+
+logger = logging.getLogger(__name__)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str):
+    """Регистрация миграции; номера версий уникальны и только растут"""
+    def decorator(fn: Callable[[Connection], None]):
+        assert all(m.version != version for m in MIGRATIONS), f"Повторная версия миграции {version}"
+        MIGRATIONS.append(Migration(version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return decorator
+
+
+# Вспомогательные операции
+
+def add_column(conn: Connection, table_name: str, column_name: str) -> bool:
+    """
+    ALTER TABLE ADD COLUMN по описанию колонки в models.py; False, если колонка уже есть.
+
+    Колонка должна быть nullable или иметь server_default.
+    """
+    if column_name in {column["name"] for column in inspect(conn).get_columns(table_name)}:
+        return False
+    column = Base.metadata.tables[table_name].columns[column_name]
+    ddl = f'ALTER TABLE {table_name} ADD COLUMN "{column.name}" {column.type.compile(dialect=conn.dialect)}'
+    if column.server_default is not None:
+        ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+    elif not column.nullable:
+        raise RuntimeError(f"Колонку {table_name}.{column_name} нельзя добавить без server_default")
+    conn.exec_driver_sql(ddl)
+    logger.info(f"🛠 Добавлена колонка {table_name}.{column_name}")
+    return True
+
+
+def create_index(conn: Connection, table_name: str, index_name: str):
+    """Создание индекса, описанного в models.py, если его ещё нет"""
+    index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+    index.create(conn, checkfirst=True)
+
+
+def dedupe_pairs(conn: Connection, model) -> int:
+    """Удаление повторных строк (tender_id, supplier_id), остаётся самая ранняя; возвращает число удалённых"""
+    first_ids = (
+        select(func.min(model.id))
+        .group_by(model.tender_id, model.supplier_id)
+    )
+    result = conn.execute(delete(model).where(model.id.not_in(first_ids)))
+    if result.rowcount:
+        logger.info(f"🧹 {model.__tablename__}: удалено повторов {result.rowcount}")
+    return result.rowcount
+
+
+def backfill_participant_count(conn: Connection):
+    conn.execute(
+        update(Tender).values(
+            participant_count=(
+                select(func.count(TenderParticipant.id))
+                .where(TenderParticipant.tender_id == Tender.id)
+                .scalar_subquery()
+            ),
+        )
+    )
+
+
+def backfill_bid_counters(conn: Connection):
+    best_bid = (
+        select(Bid.id, Bid.supplier_id)
+        .where(Bid.tender_id == Tender.id)
+        .order_by(Bid.amount.asc(), Bid.created_at.asc())
+        .limit(1)
+    )
+    conn.execute(
+        update(Tender).values(
+            bid_count=select(func.count(Bid.id)).where(Bid.tender_id == Tender.id).scalar_subquery(),
+            best_bid_id=best_bid.with_only_columns(Bid.id).scalar_subquery(),
+            best_supplier_id=best_bid.with_only_columns(Bid.supplier_id).scalar_subquery(),
+        )
+    )
+
+
+# Миграции
+
+@migration(1, "tender_deadline_and_counters")
+def _tender_deadline_and_counters(conn: Connection):
+    """Колонки, которые раньше досоздавались при старте: дедлайн и денормализованные счетчики"""
+    add_column(conn, "tenders", "closes_at")
+    create_index(conn, "tenders", "ix_tenders_status_closes_at")
+    added = [
+        add_column(conn, "tenders", name)
+        for name in ("participant_count", "bid_count", "best_bid_id", "best_supplier_id")
+    ]
+    if any(added):
+        backfill_participant_count(conn)
+        backfill_bid_counters(conn)
+        logger.info("🛠 Счетчики участников и заявок тендеров заполнены")
+
+
+@migration(2, "hot_query_indexes")
+def _hot_query_indexes(conn: Connection):
+    """Составные индексы под частые запросы: журнал заявок, заявки поставщика, активация"""
+    create_index(conn, "bids", "ix_bids_tender_created_at")
+    create_index(conn, "bids", "ix_bids_supplier_id")
+    create_index(conn, "tenders", "ix_tenders_status_start_at")
+
+
+@migration(3, "unique_participant_and_access_pairs")
+def _unique_participant_and_access_pairs(conn: Connection):
+    """Поставщик участвует в тендере и получает доступ к нему не более одного раза"""
+    if dedupe_pairs(conn, TenderParticipant):
+        backfill_participant_count(conn)
+    dedupe_pairs(conn, TenderAccess)
+    create_index(conn, "tender_participants", "ux_tender_participants_tender_supplier")
+    create_index(conn, "tender_access", "ux_tender_access_tender_supplier")
+
+
+@migration(4, "tender_version")
+def _tender_version(conn: Connection):
+    """Версия строки тендера для оптимистичной блокировки; существующим строкам — 1"""
+    add_column(conn, "tenders", "version")
+
+
+@migration(5, "tender_conditions_file_id")
+def _tender_conditions_file_id(conn: Connection):
+    """Кэш file_id файла условий; у существующих тендеров заполнится при первой отправке"""
+    add_column(conn, "tenders", "conditions_file_id")
+
+
+@migration(6, "outbox_claims")
+def _outbox_claims(conn: Connection):
+    """Кто и когда захватил сообщение outbox: новый держатель роли не трогает чужие живые захваты"""
+    add_column(conn, "outbox", "claimed_by")
+    add_column(conn, "outbox", "claimed_at")
+    add_column(conn, "tenders", "conditions_hash")
+
+
+def run_migrations(conn: Connection) -> list[int]:
+    """Применение ещё не применённых миграций; возвращает номера применённых"""
+    schema_migrations.create(conn, checkfirst=True)
+    done = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    applied = []
+    for m in MIGRATIONS:
+        if m.version in done:
+            continue
+        m.apply(conn)
+        conn.execute(insert(schema_migrations).values(version=m.version, name=m.name, applied_at=datetime.now()))
+        applied.append(m.version)
+        logger.info(f"🗄 Миграция {m.version} ({m.name}) применена")
+    return applied
+
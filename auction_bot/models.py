@@ -1,6 +1,6 @@
 from __future__ import annotations
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, BigInteger, Text, ForeignKey, DateTime, Float, Boolean, Enum
+from sqlalchemy import String, Integer, BigInteger, Text, ForeignKey, DateTime, Float, Boolean, Enum, Index
 from datetime import datetime
 import enum
 
@@ -53,13 +53,28 @@ class Tender(Base):
     start_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     status: Mapped[str] = mapped_column(String(16), default=TenderStatus.draft.value)
     conditions_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # file_id файла условий в Telegram и SHA-256 содержимого, для которого он получен:
+    # файл отправляется по file_id и загружается заново, только если содержимое изменилось
+    conditions_file_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    conditions_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
     organizer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     
     # auction fields
     last_bid_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    closes_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # дедлайн закрытия (локальное время)
     current_price: Mapped[float] = mapped_column(Float)
     min_bid_decrease: Mapped[float] = mapped_column(Float, default=10000.0)  # минимальное снижение цены
+
+    # Денормализованные счетчики — поддерживаются в транзакциях присоединения, выхода и заявки,
+    # чтобы списки тендеров не грузили participants/bids
+    participant_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    bid_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    best_bid_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    best_supplier_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Версия строки: растёт при каждом изменении тендера. ORM проверяет её при flush
+    # (version_id_col), UPDATE через Core увеличивают явно; она же — токен кэша представлений
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
     
     # relationships
     organizer: Mapped[User] = relationship(back_populates="tenders")
@@ -67,6 +82,14 @@ class Tender(Base):
     participants: Mapped[list["TenderParticipant"]] = relationship(back_populates="tender")
     access_grants: Mapped[list["TenderAccess"]] = relationship()
 
+    __table_args__ = (
+        # Восстановление дедлайнов при старте: только активные тендеры
+        Index("ix_tenders_status_closes_at", "status", "closes_at"),
+        # Активация одобренных тендеров по времени начала
+        Index("ix_tenders_status_start_at", "status", "start_at"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
 
 class TenderParticipant(Base):
     __tablename__ = "tender_participants"
@@ -79,6 +102,10 @@ class TenderParticipant(Base):
     tender: Mapped[Tender] = relationship(back_populates="participants")
     supplier: Mapped[User] = relationship()
 
+    __table_args__ = (
+        Index("ux_tender_participants_tender_supplier", "tender_id", "supplier_id", unique=True),
+    )
+
 
 class TenderAccess(Base):
     __tablename__ = "tender_access"
@@ -91,6 +118,10 @@ class TenderAccess(Base):
     tender: Mapped[Tender] = relationship()
     supplier: Mapped[User] = relationship()
 
+    __table_args__ = (
+        Index("ux_tender_access_tender_supplier", "tender_id", "supplier_id", unique=True),
+    )
+
 
 class Bid(Base):
     __tablename__ = "bids"
@@ -102,4 +133,61 @@ class Bid(Base):
     
     # relationships
     tender: Mapped[Tender] = relationship(back_populates="bids")
-    supplier: Mapped[User] = relationship(back_populates="bids")
\ No newline at end of file
+    supplier: Mapped[User] = relationship(back_populates="bids")
+
+    __table_args__ = (
+        # Журнал заявок тендера и рейтинг при закрытии
+        Index("ix_bids_tender_created_at", "tender_id", "created_at"),
+        # «Мои заявки» поставщика
+        Index("ix_bids_supplier_id", "supplier_id"),
+    )
+
+class OutboxStatus(str, enum.Enum):
+    pending = "pending"
+    sending = "sending"  # выбрано диспетчером, отправка идёт
+    sent = "sent"
+    failed = "failed"
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    text: Mapped[str] = mapped_column(Text)
+    reply_markup: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON клавиатуры
+    dedupe_key: Mapped[str] = mapped_column(String(128), unique=True)
+    status: Mapped[str] = mapped_column(String(16), default=OutboxStatus.pending.value, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    claimed_by: Mapped[str | None] = mapped_column(String(64), nullable=True)  # процесс, отправляющий сообщение
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class FsmRecord(Base):
+    """Состояние FSM aiogram (DatabaseStorage): ключ StorageKey, состояние и данные в JSON"""
+    __tablename__ = "fsm_states"
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, default="{}")
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class PartitionLease(Base):
+    """Аренда партиции тендеров процессом (режим PARTITIONS): владелец продлевает её, пока жив"""
+    __tablename__ = "partition_leases"
+    partition: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    owner: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    address: Mapped[str | None] = mapped_column(String(64), nullable=True)  # host:port IPC владельца
+    epoch: Mapped[int] = mapped_column(Integer, default=0)  # растёт при каждой смене владельца
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class PartitionWorker(Base):
+    """Живые процессы режима PARTITIONS: по ним считается справедливая доля партиций"""
+    __tablename__ = "partition_workers"
+    worker: Mapped[str] = mapped_column(String(64), primary_key=True)
+    address: Mapped[str] = mapped_column(String(64))
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime)
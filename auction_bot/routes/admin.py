@@ -7,12 +7,14 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
 from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased
 
-from ..db import SessionLocal
+from ..services.unit_of_work import session_scope
 from ..models import User, Tender, TenderStatus
 from ..keyboards import menu_admin
 from ..config import settings
+from ..services.lifecycle import tender_lifecycle
+from ..services.identity import identity_cache
 
 router = Router()
 
@@ -29,7 +31,7 @@ async def show_users(message: Message):
         await message.answer("У вас нет прав администратора.")
         return
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Получаем всех пользователей
         stmt = select(User).order_by(User.created_at.desc())
         result = await session.execute(stmt)
@@ -96,7 +98,7 @@ async def process_ban_user_id(message: Message, state: FSMContext):
     try:
         telegram_id = int(message.text)
         
-        async with SessionLocal() as session:
+        async with session_scope() as session:
             # Ищем пользователя
             stmt = select(User).where(User.telegram_id == telegram_id)
             result = await session.execute(stmt)
@@ -113,6 +115,7 @@ async def process_ban_user_id(message: Message, state: FSMContext):
             new_status = "заблокирован" if user.banned else "активен"
             
             await session.commit()
+            identity_cache.invalidate(telegram_id)
             
             await message.answer(
                 f"✅ Статус пользователя изменен!\n\n"
@@ -154,7 +157,7 @@ async def show_system_stats(callback: CallbackQuery):
         await callback.answer("У вас нет прав администратора.")
         return
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Статистика пользователей
         stmt = select(User)
         result = await session.execute(stmt)
@@ -242,11 +245,7 @@ async def system_info(message: Message):
 async def approve_tender(message: Message):
     user_id = message.from_user.id
 
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-
+    async with session_scope() as session:
         if user_id not in settings.ADMIN_IDS:
             await message.answer("У вас нет прав для одобрения тендеров.")
             return
@@ -285,7 +284,7 @@ async def show_tender_statuses(message: Message):
         await message.answer("У вас нет прав для просмотра статусов тендеров.")
         return
 
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Получаем все тендеры с их статусами
         stmt = select(Tender).order_by(Tender.created_at.desc())
         result = await session.execute(stmt)
@@ -333,15 +332,17 @@ async def show_tender_statuses(message: Message):
 async def process_approve_tender(callback: CallbackQuery):
     tender_id = int(callback.data.split("_")[-1])
 
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         tender = await session.get(Tender, tender_id)
         if not tender:
             await callback.answer("Тендер не найден.", show_alert=True)
             return
 
-        # Тендер переходит в статус "ожидающий активации"
-        tender.status = TenderStatus.active_pending.value
-        await session.commit()
+    # Тендер переходит в статус "ожидающий активации"; активатор получит событие и
+    # запустит тендер ровно в момент начала
+    if not await tender_lifecycle.approve(tender_id):
+        await callback.answer("Тендер уже одобрен или недоступен.", show_alert=True)
+        return
 
     await callback.message.edit_text(f"✅ Тендер '{tender.title}' одобрен! Он будет активирован в {tender.start_at.strftime('%d.%m.%Y %H:%M')}")
 
@@ -354,19 +355,20 @@ async def show_admin_history(message: Message):
         await message.answer("У вас нет прав администратора.")
         return
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Получаем все завершенные тендеры
+        # Организатор и победитель — джойнами, без загрузки участников и заявок
+        organizer = aliased(User)
+        winner = aliased(User)
         stmt = (
-            select(Tender)
+            select(Tender, organizer.org_name.label("organizer_name"), winner.org_name.label("winner_name"))
+            .outerjoin(organizer, organizer.id == Tender.organizer_id)
+            .outerjoin(winner, winner.id == Tender.best_supplier_id)
             .where(Tender.status.in_([TenderStatus.closed.value, TenderStatus.cancelled.value]))
-            .options(
-                selectinload(Tender.participants),
-                selectinload(Tender.bids),
-            )
             .order_by(Tender.created_at.desc())
         )
         result = await session.execute(stmt)
-        closed_tenders = result.scalars().all()
+        closed_tenders = result.all()
 
         if not closed_tenders:
             await message.answer("Завершенных тендеров пока нет.", reply_markup=menu_admin)
@@ -374,23 +376,18 @@ async def show_admin_history(message: Message):
 
         # Формируем ответ
         response = "📚 История всех завершенных тендеров:\n\n"
-        for tender in closed_tenders:
+        for tender, organizer_name, winner_name in closed_tenders:
             from zoneinfo import ZoneInfo
             from datetime import timezone as _tz
             local_tz = ZoneInfo("Europe/Moscow")
             created_local = tender.created_at.astimezone(local_tz) if tender.created_at.tzinfo else tender.created_at.replace(tzinfo=_tz.utc).astimezone(local_tz)
             
-            # Получаем информацию об организаторе
-            organizer = await session.get(User, tender.organizer_id)
-            organizer_name = organizer.org_name if organizer else "Неизвестный организатор"
+            organizer_name = organizer_name or "Неизвестный организатор"
             
-            # Находим победителя (самую низкую ставку)
+            # Победитель — лучшая заявка; её цена и есть финальная цена тендера
             winner_info = ""
-            if tender.bids:
-                winner_bid = min(tender.bids, key=lambda x: x.amount)
-                winner = await session.get(User, winner_bid.supplier_id)
-                if winner:
-                    winner_info = f"🏆 Победитель: {winner.org_name} ({winner_bid.amount:,.0f} ₽)"
+            if tender.best_supplier_id and winner_name:
+                winner_info = f"🏆 Победитель: {winner_name} ({tender.current_price:,.0f} ₽)"
 
             status_text = {
                 TenderStatus.closed.value: "Завершён",
@@ -403,8 +400,8 @@ async def show_admin_history(message: Message):
                 f"💰 Финальная цена: {tender.current_price:,.0f} ₽\n"
                 f"📅 Дата начала: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n"
                 f"📅 Создан: {created_local.strftime('%d.%m.%Y %H:%M')}\n"
-                f"🏆 Участников: {len(tender.participants)}\n"
-                f"📈 Заявок: {len(tender.bids)}\n"
+                f"🏆 Участников: {tender.participant_count}\n"
+                f"📈 Заявок: {tender.bid_count}\n"
                 f"{winner_info}\n\n"
             )
 
@@ -6,18 +6,64 @@ from aiogram.filters import Command
 from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import SessionLocal
+from ..services.unit_of_work import session_scope, unit_of_work
 from ..models import User, Tender, TenderStatus, Bid, TenderParticipant
 from ..services.timers import AuctionTimer
 from ..services.reports import ReportService
+from ..services.bid_actors import BidActorRegistry
+from ..services.outbox import OutboxDispatcher
+from ..services.ticker import PriceTicker
+from ..services.webhook import WebhookServer
+from ..services.partitions import PartitionManager, PartitionRouter
+from ..services.identity import identity_cache
+from ..services.conditions_files import conditions_files
 
 
 router = Router()
+auction_timer: AuctionTimer | None = None
+bid_actors: BidActorRegistry | None = None
+delivery: OutboxDispatcher | None = None
+ticker: PriceTicker | None = None
+webhook: WebhookServer | None = None
+partitions: PartitionManager | None = None
+partition_router: PartitionRouter | None = None
+
+
+def set_timer(timer: AuctionTimer):
+    global auction_timer
+    auction_timer = timer
+
+
+def set_bid_actors(registry: BidActorRegistry):
+    global bid_actors
+    bid_actors = registry
+
+
+def set_delivery(dispatcher: OutboxDispatcher):
+    global delivery
+    delivery = dispatcher
+
+
+def set_ticker(price_ticker: PriceTicker | None):
+    global ticker
+    ticker = price_ticker
+
+
+def set_webhook(server: WebhookServer | None):
+    global webhook
+    webhook = server
+
+
+def set_partitions(manager: PartitionManager | None, router: PartitionRouter | None):
+    global partitions, partition_router
+    partitions = manager
+    partition_router = router
+
 
 @router.message(Command("check_auctions"))
 async def check_auctions(message: Message):
     """Проверка активных аукционов"""
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         stmt = select(Tender).where(Tender.status == TenderStatus.active.value)
         result = await session.execute(stmt)
         active_tenders = result.scalars().all()
@@ -27,6 +73,48 @@ async def check_auctions(message: Message):
             return
 
         response = "🟢 Активные аукционы:\n\n"
+        if delivery:
+            response += (
+                f"✅ Подтверждение заявки: {delivery.ack_latency.format()}\n"
+                f"📨 Рассылка участникам: {delivery.fanout_latency.format()}\n\n"
+            )
+        if auction_timer:
+            response += (
+                f"⏱ Таймеров: {auction_timer.get_active_timers_count()}, "
+                f"опоздание срабатывания: {auction_timer.deadlines.lateness.format()}\n\n"
+            )
+        if bid_actors and bid_actors.committer:
+            committer = bid_actors.committer
+            response += (
+                f"📦 Групповой коммит, заявок в пачке: {committer.batch_sizes.format()}\n"
+                f"💾 Коммит пачки: {committer.commit_latency.format(' мс')}\n\n"
+            )
+        if ticker:
+            t = ticker.stats()
+            response += (
+                f"📊 Табло: {t['messages']} сообщений, {t['edits']} правок "
+                f"на {t['touches']} изменений (схлопнуто {t['coalesced']})\n\n"
+            )
+        response += (
+            f"🗄 Сессий на апдейт: {unit_of_work.sessions.format()}\n"
+            f"🧾 SQL-запросов на апдейт: {unit_of_work.statements.format()}\n\n"
+        )
+        if webhook:
+            w = webhook.stats()
+            response += (
+                f"🌐 Webhook: в очереди {w['queued']}, отклонено {w['rejected']}, "
+                f"обработка апдейта: {webhook.handler_latency.format()}\n\n"
+            )
+        if partitions:
+            p, r = partitions.stats(), partition_router.stats()
+            response += (
+                f"🧩 {p['worker']}: партиций {p['owned']} из {p['partitions']}, роли {', '.join(p['roles']) or '—'}, "
+                f"переслано {r['forwarded']}, принято {r['received']}, локально при сбое {r['fallbacks']}\n\n"
+            )
+        u = identity_cache.stats()
+        response += f"👤 Кэш пользователей: {u['size']}, попаданий {u['hit_rate']:.0%}\n\n"
+        f = conditions_files.stats()
+        response += f"📎 Файлы условий: по file_id {f['reused']}, загрузок {f['uploaded']}\n\n"
         for tender in active_tenders:
             status = "⏰ Ожидание заявок"
             if tender.last_bid_at:
@@ -38,10 +126,17 @@ async def check_auctions(message: Message):
                 f"📋 <b>{tender.title}</b>\n"
                 f"💰 Текущая цена: {tender.current_price} ₽\n"
                 f"📅 Начало: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n"
-                f"🏆 Участников: {len(tender.participants)}\n"
-                f"📈 Заявок: {len(tender.bids)}\n"
-                f"📊 Статус: {status}\n\n"
+                f"🏆 Участников: {tender.participant_count}\n"
+                f"📈 Заявок: {tender.bid_count}\n"
+                f"📊 Статус: {status}\n"
             )
+            actor = bid_actors.actors.get(tender.id) if bid_actors else None
+            if actor:
+                response += (
+                    f"⚙️ Очередь заявок: {actor.queue_depth}, "
+                    f"обработка: {actor.avg_service_ms:.1f} мс (макс. {actor.max_service_ms:.1f} мс)\n"
+                )
+            response += "\n"
 
         await message.answer(response)
 
@@ -50,30 +145,26 @@ async def check_auctions(message: Message):
 async def close_expired_auctions(message: Message):
     """Закрытие истекших аукционов вручную"""
     user_id = message.from_user.id
-    auction_timer = AuctionTimer(message.bot)
+    timer = auction_timer or AuctionTimer(message.bot)
 
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Проверяем права
         user = await session.get(User, user_id)
         if not user or user.role not in ["admin", "organizer"]:
             await message.answer("У вас нет прав для закрытия аукционов.")
             return
 
-        # Находим активные аукционы
-        stmt = select(Tender).where(Tender.status == TenderStatus.active.value)
-        result = await session.execute(stmt)
-        active_tenders = result.scalars().all()
-
-        closed_count = 0
-        for tender in active_tenders:
-            if tender.last_bid_at and datetime.utcnow() - tender.last_bid_at > timedelta(minutes=2):
-                await auction_timer._close_tender(session, tender)
-                closed_count += 1
+    report = await timer.close_expired()
 
-        if closed_count == 0:
-            await message.answer("Истекших аукционов нет.")
-        else:
-            await message.answer(f"✅ Закрыто {closed_count} истекших аукционов.")
+    if report["closed"] == 0:
+        await message.answer("Истекших аукционов нет.")
+    else:
+        await message.answer(
+            f"✅ Закрыто {report['closed']} истекших аукционов.\n"
+            f"⏱ Закрытие с итогами: {report['transition_ms']:.0f} мс, "
+            f"табло: {report['delivery_ms']:.0f} мс"
+            + (f"\n⚠️ Ошибок при обновлении табло: {report['failed']}" if report["failed"] else "")
+        )
 
 
 @router.message(Command("auction_report"))
@@ -81,7 +172,7 @@ async def generate_auction_report(message: Message):
     """Генерация отчета по аукциону"""
     user_id = message.from_user.id
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         user = await session.get(User, user_id)
         if not user or user.role not in ["admin", "organizer"]:
             await message.answer("У вас нет прав для генерации отчетов.")
@@ -116,7 +207,7 @@ async def generate_tender_report(callback: CallbackQuery):
     """Генерация отчета по конкретному тендеру"""
     tender_id = int(callback.data.split("_")[2])
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         tender = await session.get(Tender, tender_id)
         if not tender:
             await callback.answer("Тендер не найден.")
@@ -184,15 +275,15 @@ async def generate_tender_report(callback: CallbackQuery):
 async def auto_close_check(message: Message):
     """Запуск автоматической проверки и закрытия аукционов"""
     user_id = message.from_user.id
-    auction_timer = AuctionTimer(message.bot)
+    timer = auction_timer or AuctionTimer(message.bot)
 
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         user = await session.get(User, user_id)
         if not user or user.role not in ["admin", "organizer"]:
             await message.answer("У вас нет прав для автоматического закрытия.")
             return
 
-    asyncio.create_task(auction_timer.start_periodic_check())
+    asyncio.create_task(timer.start_periodic_check())
     await message.answer("✅ Автоматическая проверка аукционов запущена.")
 
 
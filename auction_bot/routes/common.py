@@ -6,9 +6,10 @@ from aiogram.filters import Command
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import SessionLocal
+from ..services.unit_of_work import session_scope
 from ..models import User, Tender, TenderStatus, TenderParticipant
 from ..keyboards import menu_main
+from ..services.versioning import VersionedCache
 
 router = Router()
 
@@ -49,7 +50,7 @@ async def show_profile(message: Message):
     """Показать профиль пользователя"""
     user_id = message.from_user.id
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         user = await session.get(User, user_id)
         if not user:
             await message.answer("Профиль не найден.")
@@ -95,43 +96,63 @@ async def show_profile(message: Message):
         
         await message.answer(profile_text)
 
+# Карточки списка тендеров по (id, version): неизменившиеся тендеры не перечитываются
+tender_cards: VersionedCache[str] = VersionedCache(maxsize=2000)
+
+
+def render_tender_card(tender: Tender) -> str:
+    status_emoji = {
+        "draft": "📝",
+        "active": "🟢",
+        "closed": "🔴",
+        "cancelled": "❌"
+    }
+
+    status_name = {
+        "draft": "Черновик",
+        "active": "Активен",
+        "closed": "Завершен",
+        "cancelled": "Отменен"
+    }
+
+    return (
+        f"{status_emoji.get(tender.status, '❓')} <b>{tender.title}</b>\n"
+        f"💰 Цена: {tender.current_price} ₽\n"
+        f"📅 Дата: {tender.start_at.strftime('%d.%m.%Y %H:%M') if tender.start_at else 'Не указана'}\n"
+        f"📊 Статус: {status_name.get(tender.status, tender.status)}\n"
+        f"🏆 Участников: {tender.participant_count}\n"
+        f"📈 Заявок: {tender.bid_count}\n\n"
+    )
+
+
 @router.message(Command("tenders"))
 async def show_tenders(message: Message):
     """Показать список тендеров"""
-    async with SessionLocal() as session:
-        # Получаем все тендеры
-        stmt = select(Tender).order_by(Tender.created_at.desc())
-        result = await session.execute(stmt)
-        tenders = result.scalars().all()
+    async with session_scope() as session:
+        # Сначала только id и версии; полные строки — для тендеров, которых нет в кэше
+        stmt = select(Tender.id, Tender.version).order_by(Tender.created_at.desc())
+        versions = (await session.execute(stmt)).all()
         
-        if not tenders:
+        if not versions:
             await message.answer("Тендеров пока нет.")
             return
+
+        cards = {}
+        stale = []
+        for tender_id, version in versions:
+            card = tender_cards.get(tender_id, version)
+            if card is None:
+                stale.append(tender_id)
+            else:
+                cards[tender_id] = card
+        if stale:
+            result = await session.execute(select(Tender).where(Tender.id.in_(stale)))
+            for tender in result.scalars():
+                cards[tender.id] = render_tender_card(tender)
+                tender_cards.put(tender.id, tender.version, cards[tender.id])
         
         response = "📋 <b>Список тендеров:</b>\n\n"
-        for tender in tenders:
-            status_emoji = {
-                "draft": "📝",
-                "active": "🟢",
-                "closed": "🔴",
-                "cancelled": "❌"
-            }
-            
-            status_name = {
-                "draft": "Черновик",
-                "active": "Активен",
-                "closed": "Завершен",
-                "cancelled": "Отменен"
-            }
-            
-            response += (
-                f"{status_emoji.get(tender.status, '❓')} <b>{tender.title}</b>\n"
-                f"💰 Цена: {tender.current_price} ₽\n"
-                f"📅 Дата: {tender.start_at.strftime('%d.%m.%Y %H:%M') if tender.start_at else 'Не указана'}\n"
-                f"📊 Статус: {status_name.get(tender.status, tender.status)}\n"
-                f"🏆 Участников: {len(tender.participants)}\n"
-                f"📈 Заявок: {len(tender.bids)}\n\n"
-            )
+        response += "".join(cards[tender_id] for tender_id, _ in versions if tender_id in cards)
         
         await message.answer(response)
 
@@ -7,13 +7,17 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 from . import organizer
 
-from ..db import SessionLocal
+from ..services.unit_of_work import session_scope
 from ..models import User, Tender, TenderStatus, TenderParticipant, TenderAccess
 from ..keyboards import menu_organizer
 from ..services.timers import AuctionTimer
+from ..services.lifecycle import tender_lifecycle
+from ..services.conditions_files import conditions_files
+from ..services import outbox
 auction_timer: AuctionTimer | None = None
 
 def set_timer(timer: AuctionTimer):
@@ -40,14 +44,10 @@ class AccessManagement(StatesGroup):
     selecting_suppliers = State()
 
 @router.message(lambda message: message.text == "Создать тендер")
-async def start_tender_creation(message: Message, state: FSMContext):
+async def start_tender_creation(message: Message, state: FSMContext, user: User | None = None):
     """Начало создания тендера"""
-    user_id = message.from_user.id
     
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
+    async with session_scope() as session:
         if not user or user.role != "organizer":
             await message.answer("У вас нет прав для создания тендеров.")
             return
@@ -99,40 +99,38 @@ async def process_tender_price(message: Message, state: FSMContext):
     
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-async def notify_admins_about_new_tender(tender: Tender, bot):
-    """Отправка уведомления админам о новом тендере с кнопкой подтверждения"""
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.role == "admin")
-        result = await session.execute(stmt)
-        admins = result.scalars().all()
-        
-        if not admins:
-            print("Нет администраторов для уведомления.")
-            return
+async def notify_admins_about_new_tender(session: AsyncSession, tender: Tender):
+    """Уведомление админов о новом тендере с кнопкой подтверждения (через outbox, в транзакции создания)"""
+    stmt = select(User.id, User.telegram_id).where(User.role == "admin")
+    admins = (await session.execute(stmt)).all()
 
-        # Формируем клавиатуру с кнопкой подтверждения
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="✅ Одобрить тендер",
-                    callback_data=f"approve_tender_{tender.id}"  # сюда идёт ID тендера
-                )
-            ]
-        ])
+    if not admins:
+        print("Нет администраторов для уведомления.")
+        return
 
-        for admin in admins:
-            await bot.send_message(
-                admin.telegram_id,
-                f"📢 Новый тендер ожидает подтверждения:\n\n"
-                f"📋 Название: {tender.title}\n"
-                f"💰 Стартовая цена: {format_price(tender.start_price)} ₽\n"
-                f"📅 Дата начала: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n"
-                f"📝 Описание: {tender.description}",
-                reply_markup=keyboard
+    # Формируем клавиатуру с кнопкой подтверждения
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text="✅ Одобрить тендер",
+                callback_data=f"approve_tender_{tender.id}"  # сюда идёт ID тендера
             )
+        ]
+    ])
 
-        
-        
+    text = (
+        f"📢 Новый тендер ожидает подтверждения:\n\n"
+        f"📋 Название: {tender.title}\n"
+        f"💰 Стартовая цена: {format_price(tender.start_price)} ₽\n"
+        f"📅 Дата начала: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n"
+        f"📝 Описание: {tender.description}"
+    )
+    for admin in admins:
+        await outbox.enqueue(
+            session, admin.telegram_id, text,
+            dedupe_key=f"approve:{tender.id}:{admin.id}",
+            reply_markup=keyboard
+        )
 
 
 @router.message(TenderCreation.waiting_for_start_date)
@@ -158,12 +156,13 @@ async def process_tender_date(message: Message, state: FSMContext):
 
 @router.message(TenderCreation.waiting_for_conditions)
 @router.message(TenderCreation.waiting_for_conditions)
-async def process_tender_conditions(message: Message, state: FSMContext):
+async def process_tender_conditions(message: Message, state: FSMContext, user: User | None = None):
     """Обработка условий тендера (файл или 'нет')"""
     user_data = await state.get_data()
     user_id = message.from_user.id
 
     conditions_path = None
+    conditions_file_id = conditions_hash = None
     if message.document:
         # Получаем расширение файла
         ext = message.document.file_name.split('.')[-1]
@@ -172,16 +171,15 @@ async def process_tender_conditions(message: Message, state: FSMContext):
         # Скачиваем файл
         await message.bot.download(message.document, file_path)
         conditions_path = file_path
+        # Файл уже есть в Telegram: поставщикам он уйдёт по file_id без повторной загрузки
+        conditions_file_id = message.document.file_id
+        conditions_hash = await conditions_files.content_hash(file_path)
     elif message.text.strip().lower() != "нет":
         await message.answer("Отправьте файл с условиями или напишите 'нет':")
         return  # ждем корректный ввод
     
     # Создание тендера
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-
+    async with session_scope() as session:
         if not user:
             await message.answer("❌ Пользователь не найден в базе. Попробуйте заново.")
             return
@@ -193,15 +191,19 @@ async def process_tender_conditions(message: Message, state: FSMContext):
             current_price=user_data['current_price'],
             start_at=user_data['start_at'],
             conditions_path=conditions_path,
+            conditions_file_id=conditions_file_id,
+            conditions_hash=conditions_hash,
             organizer_id=user.id,
             status=TenderStatus.draft.value
         )
 
         session.add(tender)
-        await session.commit()
+        await session.flush()
 
-        # Уведомление админов о новом тендере
-        await notify_admins_about_new_tender(tender, message.bot)
+        # Уведомление админов о новом тендере — в той же транзакции
+        await notify_admins_about_new_tender(session, tender)
+        await session.commit()
+        outbox.wake()
         await auction_timer.schedule_start_notifications(tender.id)
 
         price_str = f"{tender.start_price:,.0f}".replace(",", " ")
@@ -218,15 +220,11 @@ async def process_tender_conditions(message: Message, state: FSMContext):
     await state.clear()
 
 @router.message(F.text == "Удалить тендер")
-async def delete_tender(message: Message):
+async def delete_tender(message: Message, user: User | None = None):
     """Выбор тендера для удаления"""
-    user_id = message.from_user.id
 
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Проверяем, что это организатор
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
         if not user or user.role != "organizer":
             await message.answer("У вас нет прав для удаления тендеров.")
             return
@@ -283,7 +281,7 @@ async def delete_tender_confirmed(callback: CallbackQuery):
     tender_id = int(callback.data.split("_")[2])
     user_id = callback.from_user.id
 
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         tender = await session.get(
             Tender,
             tender_id,
@@ -302,15 +300,10 @@ async def delete_tender_confirmed(callback: CallbackQuery):
             await callback.answer("❌ Этот тендер уже начался, его нельзя удалить.")
             return
 
-        # отменяем таймер и уведомления
-        if auction_timer:
-            await auction_timer.cancel_timer_for_tender(tender.id)
-            await auction_timer.cancel_start_notifications(tender.id)
-
-        if tender and tender.organizer.telegram_id == user_id:
-            tender.status = "cancelled"
-       
-            await session.commit()
+    # Таймер и уведомления о старте снимает подписчик на смену статуса
+    if not await tender_lifecycle.cancel(tender_id):
+        await callback.answer("❌ Тендер уже завершен или удалён.")
+        return
 
     await callback.message.edit_text("✅ Тендер успешно удалён.")
     await callback.message.answer(
@@ -327,16 +320,10 @@ async def cancel_delete(callback: CallbackQuery):
     await callback.message.edit_text("Удаление отменено.", reply_markup=menu_organizer)
 
 @router.message(F.text == "Мои тендеры")
-async def show_my_tenders(message: Message):
+async def show_my_tenders(message: Message, user: User | None = None):
     """Показать тендеры организатора"""
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        # Находим пользователя по telegram_id
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or user.role != "organizer":
             await message.answer("У вас нет прав для просмотра тендеров.")
             return
@@ -353,10 +340,6 @@ async def show_my_tenders(message: Message):
                 Tender.organizer_id == user.id,
                 Tender.status.not_in([TenderStatus.closed.value, TenderStatus.cancelled.value])
             )
-            .options(
-                selectinload(Tender.participants),
-                selectinload(Tender.bids),
-            )
             .order_by(Tender.created_at.desc())
         )
         result = await session.execute(stmt)
@@ -385,23 +368,17 @@ async def show_my_tenders(message: Message):
                 f"💰 Цена: {format_price(tender.current_price)} ₽\n"
                 f"📅 Дата: {tender.start_at.strftime('%d.%m.%Y %H:%M') if tender.start_at else 'Не указана'}\n"
                 f"📊 Статус: {tender.status}\n"
-                f"🏆 Участников: {len(tender.participants)}\n"
-                f"📈 Заявок: {len(tender.bids)}\n\n"
+                f"🏆 Участников: {tender.participant_count}\n"
+                f"📈 Заявок: {tender.bid_count}\n\n"
             )
 
         await message.answer(response, reply_markup=menu_organizer)
 
 @router.message(F.text == "История")
-async def show_tender_history(message: Message):
+async def show_tender_history(message: Message, user: User | None = None):
     """Показать историю завершенных тендеров организатора"""
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        # Находим пользователя по telegram_id
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or user.role != "organizer":
             await message.answer("У вас нет прав для просмотра истории тендеров.")
             return
@@ -411,22 +388,19 @@ async def show_tender_history(message: Message):
             await message.answer("Ваш аккаунт заблокирован. Обратитесь к администратору.")
             return
 
-        # Получаем только завершенные тендеры организатора
+        # Получаем только завершенные тендеры организатора; победитель — по best_supplier_id
         stmt = (
-            select(Tender)
+            select(Tender, User.org_name.label("winner_name"))
+            .outerjoin(User, User.id == Tender.best_supplier_id)
             .where(
                 Tender.organizer_id == user.id,
                 Tender.status.in_([TenderStatus.closed.value, TenderStatus.cancelled.value])
             )
-            .options(
-                selectinload(Tender.participants),
-                selectinload(Tender.bids),
-            )
             .order_by(Tender.created_at.desc())
         )
 
         result = await session.execute(stmt)
-        closed_tenders = result.scalars().all()
+        closed_tenders = result.all()
 
         if not closed_tenders:
             await message.answer("У вас пока нет завершенных тендеров.", reply_markup=menu_organizer)
@@ -434,19 +408,16 @@ async def show_tender_history(message: Message):
 
         # Формируем ответ
         response = "📚 История завершенных тендеров:\n\n"
-        for tender in closed_tenders:
+        for tender, winner_name in closed_tenders:
             from zoneinfo import ZoneInfo
             from datetime import timezone as _tz
             local_tz = ZoneInfo("Europe/Moscow")
             created_local = tender.created_at.astimezone(local_tz) if tender.created_at.tzinfo else tender.created_at.replace(tzinfo=_tz.utc).astimezone(local_tz)
             
-            # Находим победителя (самую низкую ставку)
+            # Победитель — лучшая заявка; её цена и есть финальная цена тендера
             winner_info = ""
-            if tender.bids:
-                winner_bid = min(tender.bids, key=lambda x: x.amount)
-                winner = await session.get(User, winner_bid.supplier_id)
-                if winner:
-                    winner_info = f"🏆 Победитель: {winner.org_name} ({winner_bid.amount:,.0f} ₽)"
+            if tender.best_supplier_id and winner_name:
+                winner_info = f"🏆 Победитель: {winner_name} ({tender.current_price:,.0f} ₽)"
 
             status_text = {
                 TenderStatus.closed.value: "Завершён",
@@ -458,8 +429,8 @@ async def show_tender_history(message: Message):
                 f"💰 Финальная цена: {format_price(tender.current_price)} ₽\n"
                 f"📅 Дата начала: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n"
                 f"📅 Создан: {created_local.strftime('%d.%m.%Y %H:%M')}\n"
-                f"🏆 Участников: {len(tender.participants)}\n"
-                f"📈 Заявок: {len(tender.bids)}\n"
+                f"🏆 Участников: {tender.participant_count}\n"
+                f"📈 Заявок: {tender.bid_count}\n"
                 f"{winner_info}\n\n"
             )
 
@@ -470,7 +441,7 @@ async def start_auction(message: Message):
     """Запуск аукциона"""
     user_id = message.from_user.id
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         user = await session.get(User, user_id)
         if not user or user.role != "organizer":
             await message.answer("У вас нет прав для запуска аукционов.")
@@ -513,37 +484,30 @@ async def process_start_tender(callback: CallbackQuery):
     """Обработка запуска тендера"""
     tender_id = int(callback.data.split("_")[2])
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         tender = await session.get(Tender, tender_id)
         if not tender:
             await callback.answer("Тендер не найден.")
             return
-        
-        if tender.status != TenderStatus.draft:
-            await callback.answer("Тендер уже запущен или завершен.")
-            return
-        
-        # Активируем тендер
-        tender.status = TenderStatus.active.value
-        await session.commit()
-        
-        await callback.message.edit_text(
-            f"✅ Аукцион запущен!\n\n"
-            f"📋 {tender.title}\n"
-            f"💰 Стартовая цена: {format_price(tender.start_price)} ₽\n"
-            f"📅 Начало: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-            f"Поставщики могут подавать заявки!"
-        )
+
+    # Активируем тендер (условный переход из draft; книгу аукциона загрузит подписчик)
+    if not await tender_lifecycle.activate([tender_id], Tender.status == TenderStatus.draft.value):
+        await callback.answer("Тендер уже запущен или завершен.")
+        return
+
+    await callback.message.edit_text(
+        f"✅ Аукцион запущен!\n\n"
+        f"📋 {tender.title}\n"
+        f"💰 Стартовая цена: {format_price(tender.start_price)} ₽\n"
+        f"📅 Начало: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+        f"Поставщики могут подавать заявки!"
+    )
 
 @router.message(F.text == "Управление доступом")
-async def start_access_management(message: Message, state: FSMContext):
+async def start_access_management(message: Message, state: FSMContext, user: User | None = None):
     """Начало управления доступом к тендерам"""
-    user_id = message.from_user.id
     
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
+    async with session_scope() as session:
         if not user or user.role != "organizer":
             await message.answer("У вас нет прав для управления доступом к тендерам.")
             return
@@ -586,16 +550,12 @@ async def start_access_management(message: Message, state: FSMContext):
         )
 
 @router.callback_query(lambda c: c.data.startswith("manage_access_"))
-async def manage_tender_access(callback: CallbackQuery, state: FSMContext = None):
+async def manage_tender_access(callback: CallbackQuery, state: FSMContext = None, user: User | None = None):
     """Управление доступом к конкретному тендеру"""
     tender_id = int(callback.data.split("_")[2])
-    user_id = callback.from_user.id
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Проверяем права
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
         if not user or user.role != "organizer":
             await callback.answer("У вас нет прав для управления доступом.")
             return
@@ -664,18 +624,14 @@ async def manage_tender_access(callback: CallbackQuery, state: FSMContext = None
             await callback.message.answer(response, reply_markup=keyboard)
 
 @router.callback_query(lambda c: c.data.startswith("toggle_access_"))
-async def toggle_supplier_access(callback: CallbackQuery):
+async def toggle_supplier_access(callback: CallbackQuery, user: User | None = None):
     """Переключение доступа поставщика к тендеру"""
     parts = callback.data.split("_")
     tender_id = int(parts[2])
     supplier_id = int(parts[3])
-    user_id = callback.from_user.id
     
-    async with SessionLocal() as session:
+    async with session_scope() as session:
         # Проверяем права
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
         if not user or user.role != "organizer":
             await callback.answer("У вас нет прав для управления доступом.")
             return
@@ -712,7 +668,13 @@ async def toggle_supplier_access(callback: CallbackQuery):
             session.add(access)
             action = "предоставлен"
         
-        await session.commit()
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Доступ уже выдан параллельным нажатием
+            await session.rollback()
+            await callback.answer("Доступ уже предоставлен.")
+            return
         
         # Получаем поставщика для уведомления
         supplier = await session.get(User, supplier_id)
@@ -720,10 +682,10 @@ async def toggle_supplier_access(callback: CallbackQuery):
             await callback.answer(f"Доступ {action} для {supplier.org_name}")
         
         # Обновляем интерфейс
-        await manage_tender_access(callback, None)
+        await manage_tender_access(callback, None, user=user)
 
 @router.callback_query(lambda c: c.data.startswith("finish_access_"))
-async def finish_access_management(callback: CallbackQuery):
+async def finish_access_management(callback: CallbackQuery, user: User | None = None):
     """Завершение управления доступом"""
     try:
         tender_id = int(callback.data.split("_")[2])
@@ -735,11 +697,8 @@ async def finish_access_management(callback: CallbackQuery):
         return
     
     try:
-        async with SessionLocal() as session:
+        async with session_scope() as session:
             # Проверяем права
-            stmt = select(User).where(User.telegram_id == user_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
             if not user or user.role != "organizer":
                 await callback.answer("У вас нет прав для управления доступом.")
                 return
@@ -1,9 +1,9 @@
 import asyncio
-import os
+import time
 from datetime import datetime, timedelta, timezone
 from aiogram import Router, F
 from aiogram.types import (
-    Message, CallbackQuery, FSInputFile,
+    Message, CallbackQuery,
     InlineKeyboardMarkup, InlineKeyboardButton,
     ReplyKeyboardMarkup, KeyboardButton
 )
@@ -11,21 +11,45 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
 from sqlalchemy import select, and_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from ..db import SessionLocal
+from ..services.unit_of_work import session_scope
 from ..models import User, Tender, TenderStatus, TenderParticipant, Bid, TenderAccess
 from ..keyboards import menu_participant, menu_supplier_registered
 from ..services.timers import AuctionTimer
-from ..bot import bot
+from ..services.bid_actors import BidActorRegistry
+from ..services import outbox
+from ..services.outbox import OutboxDispatcher
+from ..services.ticker import PriceTicker
+from ..services.bid_engine import BidResult
+from ..services.auction_book import AuctionBook, auction_books
+from ..services.lifecycle import tender_lifecycle
+from ..services.participants import add_participant, remove_participant
+from ..services.identity import identity_cache
+from ..services.conditions_files import conditions_files
 
 auction_timer: AuctionTimer | None = None
+bid_actors: BidActorRegistry | None = None
+delivery: OutboxDispatcher | None = None
+ticker: PriceTicker | None = None
 
 def set_timer(timer: AuctionTimer):
     global auction_timer
     auction_timer = timer
 
+def set_bid_actors(registry: BidActorRegistry):
+    global bid_actors
+    bid_actors = registry
+
+def set_delivery(dispatcher: OutboxDispatcher):
+    global delivery
+    delivery = dispatcher
+
+def set_ticker(price_ticker: PriceTicker | None):
+    global ticker
+    ticker = price_ticker
+
 router = Router()
 
 def format_price(value: float | int) -> str:
@@ -47,15 +71,13 @@ async def build_supplier_menu(telegram_id: int) -> ReplyKeyboardMarkup:
     При возможности копирует последующие строки из menu_supplier_registered.
     """
     try:
-        async with SessionLocal() as session:
-            # Получаем пользователя по telegram_id
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            # Если пользователя нет — возвращаем исходный menu_supplier_registered
-            if not user:
-                return menu_supplier_registered
+        # Пользователь по telegram_id — из кэша, обычно без обращения к БД
+        user = await identity_cache.get(telegram_id)
+        # Если пользователя нет — возвращаем исходный menu_supplier_registered
+        if not user:
+            return menu_supplier_registered
 
+        async with session_scope() as session:
             # Есть ли у пользователя участие в активном тендере?
             stmt = (
                 select(TenderParticipant)
@@ -119,16 +141,10 @@ async def build_supplier_menu(telegram_id: int) -> ReplyKeyboardMarkup:
 
 
 @router.message(F.text == "Активные тендеры")
-async def show_active_tenders(message: Message):
+async def show_active_tenders(message: Message, user: User | None = None):
     """Показать активные тендеры"""
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        # Проверяем пользователя
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or not user.org_name:
             await message.answer("Для участия в тендерах необходимо зарегистрироваться.")
             return
@@ -154,10 +170,6 @@ async def show_active_tenders(message: Message):
                     TenderAccess.supplier_id == user.id
                 )
             )
-            .options(
-                selectinload(Tender.participants),
-                selectinload(Tender.bids),
-            )
             .order_by(Tender.start_at.desc())
         )
         result = await session.execute(stmt)
@@ -174,10 +186,6 @@ async def show_active_tenders(message: Message):
                     TenderAccess.supplier_id == user.id
                 )
             )
-            .options(
-                selectinload(Tender.participants),
-                selectinload(Tender.bids),
-            )
             .order_by(Tender.start_at.asc())
         )
         result_pending = await session.execute(stmt_pending)
@@ -208,23 +216,21 @@ async def show_active_tenders(message: Message):
         keyboard = InlineKeyboardMarkup(inline_keyboard=[])
 
         for tender in active_tenders:
-            # Проверяем участие пользователя
-            stmt = select(TenderParticipant).where(
-                TenderParticipant.tender_id == tender.id,
-                TenderParticipant.supplier_id == user.id
-            )
-            result = await session.execute(stmt)
-            participant = result.scalar_one_or_none()
+            # Цена, участие и счетчики — из книги аукциона, без запросов к БД
+            book = await auction_books.get_or_load(tender.id)
+            if book is None:
+                continue
+            participant = book.is_participant(user.id)
 
             status = "✅ Участвуете" if participant else "🆕 Не участвуете"
 
             response += (
                 f"📋 <b>{tender.title}</b>\n"
-                f"💰 Текущая цена: {format_price(tender.current_price)} ₽\n"
+                f"💰 Текущая цена: {format_price(book.current_price)} ₽\n"
                 f"📅 Начало: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n"
                 f"📝 Описание: {tender.description[:100]}...\n"
-                f"🏆 Участников: {len(tender.participants)}\n"
-                f"📈 Заявок: {len(tender.bids)}\n"
+                f"🏆 Участников: {len(book.participants)}\n"
+                f"📈 Заявок: {book.bid_count}\n"
                 f"📊 Статус: {status}\n\n"
             )
 
@@ -257,14 +263,15 @@ async def show_active_tenders(message: Message):
         if pending_tenders:
             response += "\n🕐 Предстоящие тендеры:\n\n"
 
+            # Участие пользователя во всех предстоящих тендерах — одним запросом
+            stmt = select(TenderParticipant.tender_id).where(
+                TenderParticipant.supplier_id == user.id,
+                TenderParticipant.tender_id.in_([tender.id for tender in pending_tenders])
+            )
+            joined_ids = set((await session.execute(stmt)).scalars())
+
             for tender in pending_tenders:
-                # Проверяем участие пользователя
-                stmt = select(TenderParticipant).where(
-                    TenderParticipant.tender_id == tender.id,
-                    TenderParticipant.supplier_id == user.id
-                )
-                result = await session.execute(stmt)
-                participant = result.scalar_one_or_none()
+                participant = tender.id in joined_ids
 
                 status = "✅ Участвуете" if participant else "🆕 Новый"
 
@@ -273,7 +280,7 @@ async def show_active_tenders(message: Message):
                     f"💰 Стартовая цена: {format_price(tender.start_price)} ₽\n"
                     f"📅 Начало: {tender.start_at.strftime('%d.%m.%Y %H:%M')}\n"
                     f"📝 Описание: {tender.description[:100]}...\n"
-                    f"🏆 Участников: {len(tender.participants)}\n"
+                    f"🏆 Участников: {tender.participant_count}\n"
                     f"📊 Статус: {status}\n\n"
                 )
 
@@ -300,27 +307,18 @@ async def show_active_tenders(message: Message):
         tenders_with_files = [t for t in active_tenders + pending_tenders if getattr(t, "conditions_path", None)]
         for tender in tenders_with_files:
             try:
-                file_path = tender.conditions_path
-                if file_path and os.path.exists(file_path):
-                    await message.answer_document(
-                        FSInputFile(file_path),
-                        caption=f"📎 Условия тендера: {tender.title}"
-                    )
+                # По сохранённому file_id; файл загружается, только если изменился
+                await conditions_files.send(message, tender, caption=f"📎 Условия тендера: {tender.title}")
             except Exception as e:
                 print(f"Ошибка отправки файла условий для тендера {tender.id}: {e}")
 
 
 @router.callback_query(lambda c: c.data.startswith("leave_tender_"))
-async def leave_tender(callback: CallbackQuery):
+async def leave_tender(callback: CallbackQuery, user: User | None = None):
     """Отмена участия в тендере"""
     tender_id = int(callback.data.split("_")[2])
-    user_id = callback.from_user.id
-
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user:
             await callback.answer("Ошибка: пользователь не найден.")
             return
@@ -336,8 +334,9 @@ async def leave_tender(callback: CallbackQuery):
             await callback.answer("Вы не участвуете в этом тендере.")
             return
 
-        await session.delete(participant)
+        version = await remove_participant(session, participant)
         await session.commit()
+        auction_books.remove_participant(tender_id, user.id, version)
 
         tender = await session.get(Tender, tender_id)
         # после отмены — показываем динамическое меню (подстраивается под участие)
@@ -346,14 +345,9 @@ async def leave_tender(callback: CallbackQuery):
 
 
 @router.message(F.text == "Подать заявку")
-async def handle_bid_button(message: Message, state: FSMContext):
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
+async def handle_bid_button(message: Message, state: FSMContext, user: User | None = None):
 
+    async with session_scope() as session:
         if not user:
             await message.answer("Ошибка: пользователь не найден.")
             return
@@ -395,16 +389,11 @@ async def handle_bid_button(message: Message, state: FSMContext):
 
 
 @router.callback_query(lambda c: c.data.startswith("join_tender_"))
-async def join_tender(callback: CallbackQuery):
+async def join_tender(callback: CallbackQuery, user: User | None = None):
     """Присоединение к тендеру"""
     tender_id = int(callback.data.split("_")[2])
-    user_id = callback.from_user.id
-
-    async with SessionLocal() as session:
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or not user.org_name:
             await callback.answer("Для участия необходимо зарегистрироваться.")
             return
@@ -448,13 +437,18 @@ async def join_tender(callback: CallbackQuery):
             await callback.message.answer("⚠️ Вы уже участвуете в другом тендере. Сначала отмените участие.")
             return
 
-        # Добавляем участника
-        participant = TenderParticipant(
-            tender_id=tender_id,
-            supplier_id=user.id
-        )
-        session.add(participant)
-        await session.commit()
+        # Добавляем участника (вместе со счетчиком участников тендера)
+        version = await add_participant(session, tender_id, user.id)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Повторное нажатие «Участвовать»: пару (тендер, поставщик) уже записал параллельный запрос
+            await session.rollback()
+            await callback.answer("Вы уже участвуете в этом тендере.")
+            return
+        auction_books.add_participant(tender_id, user.id, version)
+        if ticker and auction_books.get(tender_id):
+            ticker.touch(tender_id)
 
         # Планируем уведомления о скором старте и о начале тендера
         try:
@@ -479,17 +473,11 @@ async def join_tender(callback: CallbackQuery):
 
 
 @router.callback_query(lambda c: c.data.startswith("bid_tender_"))
-async def start_bidding(callback: CallbackQuery, state: FSMContext):
+async def start_bidding(callback: CallbackQuery, state: FSMContext, user: User | None = None):
     """Начало подачи заявки"""
     tender_id = int(callback.data.split("_")[2])
-    user_id = callback.from_user.id
-
-    async with SessionLocal() as session:
-        # Получаем пользователя по telegram_id
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or not user.org_name:
             await callback.answer("Для участия необходимо зарегистрироваться.")
             return
@@ -546,8 +534,9 @@ async def start_bidding(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(AuctionParticipation.waiting_for_bid)
-async def process_bid(message: Message, state: FSMContext):
+async def process_bid(message: Message, state: FSMContext, user: User | None = None):
     """Обработка заявки"""
+    received_at = time.perf_counter()
     try:
         bid_amount = float(message.text.replace(',', '.'))
         if bid_amount <= 0:
@@ -559,62 +548,56 @@ async def process_bid(message: Message, state: FSMContext):
 
     user_data = await state.get_data()
     tender_id = user_data['tender_id']
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        tender = await session.get(Tender, tender_id)
-        if not tender or tender.status not in [TenderStatus.active.value, TenderStatus.active_pending.value]:
-            await message.answer("Тендер недоступлен.")
-            await state.clear()
-            return
-
-        # Получаем пользователя для проверки доступа
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user:
             await message.answer("Пользователь не найден.")
             await state.clear()
             return
 
-        # Проверяем, есть ли у пользователя доступ к тендеру
-        stmt = select(TenderAccess).where(
-            TenderAccess.tender_id == tender_id,
-            TenderAccess.supplier_id == user.id
-        )
-        result = await session.execute(stmt)
-        access = result.scalar_one_or_none()
-
-        if not access:
-            await message.answer("У вас нет доступа к этому тендеру. Обратитесь к организатору.")
+        # Состояние аукциона берём из книги в памяти; её нет только у неактивного тендера
+        book = await auction_books.get_or_load(tender_id)
+        if book is None:
+            tender = await session.get(Tender, tender_id)
+            if tender and tender.status == TenderStatus.active_pending.value:
+                await message.answer("Тендер еще не начался. Дождитесь активации.")
+            else:
+                await message.answer("Тендер недоступлен.")
             await state.clear()
             return
 
-        # Проверяем, что тендер активен (не ожидает активации)
-        if tender.status == TenderStatus.active_pending.value:
-            await message.answer("Тендер еще не начался. Дождитесь активации.")
-            await state.clear()
-            return
+        # Участник уже прошел проверку доступа при присоединении
+        if not book.is_participant(user.id):
+            stmt = select(TenderAccess).where(
+                TenderAccess.tender_id == tender_id,
+                TenderAccess.supplier_id == user.id
+            )
+            result = await session.execute(stmt)
+            access = result.scalar_one_or_none()
+
+            if not access:
+                await message.answer("У вас нет доступа к этому тендеру. Обратитесь к организатору.")
+                await state.clear()
+                return
 
         # Проверяем, что цена ниже текущей
-        if bid_amount >= tender.current_price:
+        if bid_amount >= book.current_price:
             await message.answer(
-                f"Ваша цена должна быть ниже текущей ({tender.current_price} ₽).\n"
+                f"Ваша цена должна быть ниже текущей ({book.current_price} ₽).\n"
                 f"Попробуйте снова:"
             )
             return
 
         # Проверяем минимальное снижение
-        if tender.current_price - bid_amount < tender.min_bid_decrease:
+        if not book.can_accept(bid_amount):
             await message.answer(
-                f"Минимальное снижение цены: {tender.min_bid_decrease} ₽\n"
+                f"Минимальное снижение цены: {book.min_bid_decrease} ₽\n"
                 f"Попробуйте снова:"
             )
             return
 
-        max_decrease = tender.start_price * 0.1
-        excess = tender.start_price - bid_amount
+        max_decrease = book.start_price * 0.1
+        excess = book.start_price - bid_amount
 
         if excess > max_decrease:
             # Получаем информацию из state о предыдущем предупреждении
@@ -642,110 +625,116 @@ async def process_bid(message: Message, state: FSMContext):
                     "ts": now_ts
                 })
                 await message.answer(
-                    f"Вы снизили цену более чем на 10% от начальной ({tender.start_price:,.0f} ₽).\n"
+                    f"Вы снизили цену более чем на 10% от начальной ({book.start_price:,.0f} ₽).\n"
                     f"Возможно вы ошиблись.\n\n"
                     f"Если вы действительно хотите подать эту цену, введите её ещё раз, "
                     f"и мы примем заявку."
                 )
                 return
 
-        # Создаем заявку
-        bid = Bid(
-            tender_id=tender_id,
-            supplier_id=user.id,
-            amount=bid_amount
-        )
-        session.add(bid)
-
-        # Обновляем текущую цену тендера
-        tender.current_price = bid_amount
-        tender.last_bid_at = datetime.now()
+        # Заявки одного тендера применяет его актор — строго по очереди,
+        # атомарным условным UPDATE; книга аукциона обновляется там же
+        async def enqueue_bid_notifications(tx_session: AsyncSession, result: BidResult):
+            await notify_participants_about_bid(tx_session, book, result, user)
 
-        await session.commit()
+        # В режиме тикера участники видят заявку в своём табло, отдельных сообщений не шлём
+        bid_result = await bid_actors.submit(
+            tender_id, user.id, bid_amount,
+            on_accept=None if ticker else enqueue_bid_notifications
+        )
+        if not bid_result.accepted:
+            if bid_result.reason == "not_active":
+                await message.answer("Тендер недоступен.")
+                await state.clear()
+                return
+            await message.answer(
+                f"Пока вы вводили цену, её успели снизить.\n"
+                f"Текущая цена: {format_price(bid_result.current_price)} ₽\n"
+                f"Минимальное снижение: {format_price(book.min_bid_decrease)} ₽\n"
+                f"Попробуйте снова:"
+            )
+            return
 
         if auction_timer:
-            await auction_timer.reset_timer_for_tender(tender.id)
-
-        # Получаем пользователя для уведомлений
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-
-        # Уведомляем всех участников о новой заявке
-        await notify_participants_about_bid(session, tender, bid, user)
+            await auction_timer.reset_timer_for_tender(tender_id, bid_result.closes_at)
 
         price_str = f"{bid_amount:,.0f}".replace(",", " ")
-        start_price_str = f"{tender.start_price:,.0f}".replace(",", " ")
+        start_price_str = f"{book.start_price:,.0f}".replace(",", " ")
 
+        # Сначала подтверждаем заявку подавшему; уведомления участникам уже лежат
+        # в outbox (записаны в транзакции заявки) и уходят в фоне
         await message.answer(
             f"✅ Заявка подана!\n\n"
-            f"📋 Тендер: {tender.title}\n"
+            f"📋 Тендер: {book.title}\n"
             f"💰 Начальная цена: {start_price_str} ₽\n"
             f"💰 Ваша цена: {price_str} ₽\n"
-            f"📅 Время подачи: {tender.last_bid_at.strftime('%H:%M:%S')}\n\n"
+            f"📅 Время подачи: {bid_result.last_bid_at.strftime('%H:%M:%S')}\n\n"
             f"Аукцион продолжается!",
             reply_markup=menu_participant
         )
+        delivery.ack_latency.observe((time.perf_counter() - received_at) * 1000)
+        if ticker:
+            ticker.touch(tender_id)
+        else:
+            outbox.wake()
 
     await state.clear()
 
 
-async def notify_participants_about_bid(session: AsyncSession, tender: Tender, bid: Bid, bidder: User):
-    """Уведомление участников о новой заявке"""
-    # Получаем всех участников тендера
-    stmt = select(TenderParticipant).where(TenderParticipant.tender_id == tender.id)
-    result = await session.execute(stmt)
-    participants = result.scalars().all()
+async def notify_participants_about_bid(session: AsyncSession, book: AuctionBook, bid: BidResult, bidder: User):
+    """Уведомление участников о новой заявке (запись в outbox в транзакции заявки)"""
+    # Номер участника (анонимно) берём из книги аукциона
+    participant_number = book.alias(bidder.id) or 1
 
-    # Находим номер участника (анонимно)
-    participant_number = 1
-    for i, participant in enumerate(participants):
-        if participant.supplier_id == bidder.id:
-            participant_number = i + 1
-            break
-
-    amount_str = f"{bid.amount:,.0f}".replace(",", " ")
+    amount_str = f"{bid.current_price:,.0f}".replace(",", " ")
     from zoneinfo import ZoneInfo
     from datetime import timezone as _tz
     local_tz = ZoneInfo("Europe/Moscow")
     created_local = bid.created_at.replace(tzinfo=_tz.utc).astimezone(local_tz) if bid.created_at.tzinfo is None else bid.created_at.astimezone(local_tz)
     notification_text = (
-        f"🔥 Новая заявка в тендере '{tender.title}'!\n\n"
+        f"🔥 Новая заявка в тендере '{book.title}'!\n\n"
         f"👤 Участник {participant_number}\n"
         f"💰 Цена: {amount_str} ₽\n"
         f"📅 Время: {created_local.strftime('%H:%M:%S')}\n\n"
-        f"Текущая цена: {tender.current_price} ₽"
+        f"Текущая цена: {bid.current_price} ₽"
     )
 
-    # Отправляем уведомления всем участникам
-    for participant in participants:
-        if participant.supplier_id != bidder.id:  # Не уведомляем подавшего заявку
-            try:
-                # Получаем пользователя-участника для отправки уведомления
-                stmt = select(User).where(User.id == participant.supplier_id)
-                result = await session.execute(stmt)
-                participant_user = result.scalar_one_or_none()
-
-                if participant_user:
-                    await bot.send_message(
-                        participant_user.telegram_id,
-                        notification_text
-                    )
-            except Exception as e:
-                print(f"Ошибка отправки уведомления: {e}")
+    # Отправляем уведомления всем участникам, кроме подавшего заявку
+    recipients = [supplier_id for supplier_id in book.participants if supplier_id != bidder.id]
+    await outbox.enqueue_users(session, recipients, notification_text, dedupe_prefix=f"bid:{bid.bid_id}")
+
+
+async def forwarded_bid_hook(tender_id: int, supplier_id: int):
+    """Режим PARTITIONS: уведомления о заявке, пересланной другим процессом (на стороне владельца)"""
+    book = auction_books.get(tender_id) or await auction_books.load(tender_id)
+    if book is None:
+        return None
+    async with session_scope() as session:
+        bidder = await session.get(User, supplier_id)
+    if bidder is None:
+        return None
+
+    async def enqueue_bid_notifications(tx_session: AsyncSession, result: BidResult):
+        await notify_participants_about_bid(tx_session, book, result, bidder)
+
+    return enqueue_bid_notifications
+
+
+async def after_forwarded_bid(tender_id: int, result: BidResult):
+    """Режим PARTITIONS: дедлайн и рассылка после пересланной заявки (на стороне владельца)"""
+    if auction_timer:
+        await auction_timer.reset_timer_for_tender(tender_id, result.closes_at)
+    if ticker:
+        ticker.touch(tender_id)
+    else:
+        outbox.wake()
 
 
 @router.message(Command("debug_tenders"))
-async def debug_tenders(message: Message):
+async def debug_tenders(message: Message, user: User | None = None):
     """Отладочная команда для проверки тендеров"""
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        # Проверяем пользователя
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or not user.org_name:
             await message.answer("Для участия в тендерах необходимо зарегистрироваться.")
             return
@@ -819,16 +808,10 @@ async def debug_tenders(message: Message):
 
 
 @router.message(Command("force_activate"))
-async def force_activate_tenders(message: Message):
+async def force_activate_tenders(message: Message, user: User | None = None):
     """Принудительная активация тендеров (для отладки)"""
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        # Проверяем пользователя
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or not user.org_name:
             await message.answer("Для участия в тендерах необходимо зарегистрироваться.")
             return
@@ -858,14 +841,13 @@ async def force_activate_tenders(message: Message):
         response += f"📅 Локальное время: {now_local.strftime('%d.%m.%Y %H:%M:%S')}\n"
         response += f"🌍 UTC время: {now_utc.strftime('%d.%m.%Y %H:%M:%S')}\n\n"
 
+        # Активируем одним условным переходом; уже активированные другим путём пропускаются
+        activated = set(await tender_lifecycle.activate([tender.id for tender in pending_tenders]))
         for tender in pending_tenders:
-            # Активируем тендер
-            tender.status = TenderStatus.active.value
-            tender.current_price = tender.start_price
-            response += f"✅ Активирован: {tender.title}\n"
+            if tender.id in activated:
+                response += f"✅ Активирован: {tender.title}\n"
 
-        await session.commit()
-        response += f"\n🎉 Активировано тендеров: {len(pending_tenders)}"
+        response += f"\n🎉 Активировано тендеров: {len(activated)}"
 
         # динамическое меню
         menu = await build_supplier_menu(user.telegram_id)
@@ -873,16 +855,10 @@ async def force_activate_tenders(message: Message):
 
 
 @router.message(Command("my_bids"))
-async def show_my_bids(message: Message):
+async def show_my_bids(message: Message, user: User | None = None):
     """Показать заявки поставщика"""
-    user_id = message.from_user.id
-
-    async with SessionLocal() as session:
-        # Получаем пользователя по telegram_id
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
 
+    async with session_scope() as session:
         if not user or not user.org_name:
             await message.answer("Для участия в тендерах необходимо зарегистрироваться.")
             return
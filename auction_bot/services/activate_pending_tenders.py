@@ -1,52 +1,95 @@
-# tasks.py
-import asyncio
 import logging
-from datetime import datetime, timezone
+from datetime import datetime
+from typing import Callable
 from ..models import Tender, TenderStatus
 from ..db import SessionLocal
+from .lifecycle import TenderTransition, tender_lifecycle
+from .scheduler import DeadlineScheduler
 from sqlalchemy import select
 
 logger = logging.getLogger(__name__)
 
-async def activate_pending_tenders():
-    """Активирует тендеры, когда наступает их время начала"""
-    logger.info("🚀 Сервис активации тендеров запущен")
-    
-    while True:
-        try:
+
+class TenderActivator:
+    """
+    Активация тендеров точно в момент start_at.
+
+    Одобренные тендеры лежат в куче дедлайнов (тот же DeadlineScheduler, что у таймеров
+    аукционов); очередь пополняется при одобрении тендера и при старте бота. Когда
+    дедлайн наступает, все тендеры, время которых пришло, активируются одним UPDATE.
+    Пока активировать нечего, к БД никто не обращается.
+    """
+
+    def __init__(self):
+        self.deadlines = DeadlineScheduler(self._on_due)
+        self.activated = 0
+        # Режим PARTITIONS: активацию планирует только владелец тендера
+        self.owns: Callable[[int], bool] | None = None
+
+    def schedule(self, tender_id: int, start_at: datetime):
+        if self.owns and not self.owns(tender_id):
+            return
+        # Время в БД хранится в локальном времени, поэтому считаем задержку от локального
+        delay = max(0.0, (start_at - datetime.now()).total_seconds())
+        self.deadlines.schedule(tender_id, delay)
+        logger.info(f"⏰ Активация тендера {tender_id} запланирована на {start_at.strftime('%d.%m.%Y %H:%M:%S')}")
+
+    async def load(self) -> int:
+        """Загрузка одобренных, но не активированных тендеров (при старте бота)"""
+        async with SessionLocal() as session:
+            stmt = select(Tender.id, Tender.start_at).where(
+                Tender.status == TenderStatus.active_pending.value,
+                Tender.start_at.is_not(None),
+            )
+            rows = (await session.execute(stmt)).all()
+        if self.owns:
+            rows = [row for row in rows if self.owns(row[0])]
+        for tender_id, start_at in rows:
+            self.schedule(tender_id, start_at)
+        logger.info(f"🚀 Ожидают активации: {len(rows)} тендеров")
+        return len(rows)
+
+    async def activate_due(self) -> list[int]:
+        """Активирует все тендеры, время начала которых наступило; возвращает их id"""
+        # Книги аукционов загружаются, а дедлайны активации снимаются подписчиками
+        if self.owns:
+            # Режим PARTITIONS: только тендеры своих партиций (номер партиции считается не в SQL)
+            now = datetime.now()
+            criteria = (Tender.status == TenderStatus.active_pending.value, Tender.start_at <= now)
+            async with SessionLocal() as session:
+                due = (await session.execute(select(Tender.id).where(*criteria))).scalars().all()
+            tender_ids = await tender_lifecycle.activate([i for i in due if self.owns(i)], *criteria)
+        else:
+            tender_ids = await tender_lifecycle.activate_due()
+        self.activated += len(tender_ids)
+        return tender_ids
+
+    async def on_transition(self, event: TenderTransition):
+        """Подписчик TenderLifecycle: очередь активации следует за статусом тендера"""
+        if event.status == TenderStatus.active_pending.value:
             async with SessionLocal() as session:
-                # Получаем текущее время в UTC и локальное время
-                # UTC - стандартное время, не зависит от часового пояса
-                # Локальное время - время вашей системы/часового пояса
-                # ВАЖНО: Время в БД хранится в локальном времени, поэтому используем его для сравнения
-                now_utc = datetime.now(timezone.utc)
-                now_local = datetime.now()  # Локальное время системы
-                
-                # Ищем тендеры, которые ожидают активации и время которых наступило
-                # Время в БД хранится в локальном времени, поэтому сравниваем с локальным временем
-                stmt = select(Tender).where(
-                    Tender.status == TenderStatus.active_pending.value,
-                    Tender.start_at <= now_local
+                stmt = select(Tender.id, Tender.start_at).where(
+                    Tender.id.in_(event.tender_ids), Tender.start_at.is_not(None)
                 )
-                result = await session.execute(stmt)
-                pending_tenders = result.scalars().all()
-                
-                logger.info(f"🔍 Проверка активации тендеров")
-                logger.info(f"📅 Локальное время: {now_local.strftime('%d.%m.%Y %H:%M:%S')}")
-                logger.info(f"🌍 UTC время: {now_utc.strftime('%d.%m.%Y %H:%M:%S')}")
-                logger.info(f"📋 Найдено тендеров для активации: {len(pending_tenders)}")
-
-                for tender in pending_tenders:
-                    logger.info(f"⏰ Активируем тендер '{tender.title}' (время начала: {tender.start_at})")
-                    # Активируем тендер
-                    tender.status = TenderStatus.active.value
-                    tender.current_price = tender.start_price  # Устанавливаем текущую цену
-                    await session.commit()
-                    logger.info(f"✅ Тендер '{tender.title}' активирован!")
-                    logger.info(f"   📅 Локальное время: {now_local.strftime('%d.%м.%Y %H:%M:%S')}")
-                    logger.info(f"   🌍 UTC время: {now_utc.strftime('%d.%м.%Y %H:%M:%S')}")
-                    
+                for tender_id, start_at in (await session.execute(stmt)).all():
+                    self.schedule(tender_id, start_at)
+        else:
+            # Активирован (в том числе вручную) или отменён — ждать больше нечего
+            for tender_id in event.tender_ids:
+                self.deadlines.cancel(tender_id)
+
+    async def _on_due(self, tender_id: int):
+        try:
+            activated = await self.activate_due()
         except Exception as e:
-            logger.error(f"❌ Ошибка в activate_pending_tenders: {e}")
-            
-        await asyncio.sleep(30)  # проверка каждые 30 секунд
+            logger.error(f"❌ Ошибка активации тендеров: {e}")
+            self.deadlines.schedule(tender_id, 5)
+            return
+
+        if tender_id in activated:
+            return
+        # Тендер не попал в пачку: его отменили, активировали вручную или перенесли время начала
+        async with SessionLocal() as session:
+            tender = await session.get(Tender, tender_id)
+            if tender and tender.status == TenderStatus.active_pending.value and tender.start_at:
+                self.schedule(tender_id, tender.start_at)
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict
+
+from sqlalchemy import select, func
+
+from .unit_of_work import session_scope
+from ..models import Tender, TenderStatus, TenderParticipant, Bid
+
+if TYPE_CHECKING:
+    from .partitions import PartitionRouter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AuctionBook:
+    """Состояние активного аукциона в памяти процесса"""
+    tender_id: int
+    title: str
+    start_price: float
+    current_price: float
+    min_bid_decrease: float
+    organizer_id: int
+    bid_count: int = 0
+    best_bid_id: int | None = None
+    best_supplier_id: int | None = None
+    last_bid_at: datetime | None = None
+    deadline: datetime | None = None
+    # Tender.version, до которой книга знает состояние тендера
+    version: int = 0
+    # supplier_id участников в порядке присоединения — отсюда "Участник N"
+    participants: list[int] = field(default_factory=list)
+    # лучшая (минимальная) цена каждого поставщика — для места в тикере
+    supplier_best: Dict[int, float] = field(default_factory=dict)
+
+    def alias(self, supplier_id: int) -> int | None:
+        """Анонимный номер участника (1-based)"""
+        try:
+            return self.participants.index(supplier_id) + 1
+        except ValueError:
+            return None
+
+    def rank(self, supplier_id: int) -> int | None:
+        """Место поставщика по лучшей цене (1 — лидер); None, если заявок не было"""
+        best = self.supplier_best.get(supplier_id)
+        if best is None:
+            return None
+        return 1 + sum(1 for price in self.supplier_best.values() if price < best)
+
+    def is_participant(self, supplier_id: int) -> bool:
+        return supplier_id in self.participants
+
+    def can_accept(self, amount: float) -> bool:
+        """Быстрая проверка цены без обращения к БД (окончательно решает условный UPDATE)"""
+        return self.current_price - amount >= self.min_bid_decrease
+
+    def apply_bid(self, bid_id: int, supplier_id: int, amount: float, created_at: datetime,
+                  version: int | None = None):
+        self.observe_version(version)
+        self.current_price = amount
+        self.best_bid_id = bid_id
+        self.best_supplier_id = supplier_id
+        self.last_bid_at = created_at
+        self.bid_count += 1
+        previous = self.supplier_best.get(supplier_id)
+        if previous is None or amount < previous:
+            self.supplier_best[supplier_id] = amount
+
+    def add_participant(self, supplier_id: int, version: int | None = None):
+        self.observe_version(version)
+        if supplier_id not in self.participants:
+            self.participants.append(supplier_id)
+
+    def remove_participant(self, supplier_id: int, version: int | None = None):
+        self.observe_version(version)
+        if supplier_id in self.participants:
+            self.participants.remove(supplier_id)
+
+    def observe_version(self, version: int | None):
+        # Коммиты заявок и присоединений доходят до книги не строго по порядку
+        if version is not None and version > self.version:
+            self.version = version
+
+
+class AuctionBookRegistry:
+    """Реестр книг аукционов: загружается при активации тендера, обновляется при каждой принятой заявке"""
+
+    def __init__(self):
+        self.books: Dict[int, AuctionBook] = {}
+        self._load_lock = asyncio.Lock()
+        # Режим PARTITIONS: книги держит только владелец тендера. Для чужого тендера
+        # книга читается из БД при каждом обращении — её цену меняет другой процесс
+        self.owns: Callable[[int], bool] | None = None
+        self.router: PartitionRouter | None = None
+
+    def cacheable(self, tender_id: int) -> bool:
+        return self.owns is None or self.owns(tender_id)
+
+    def get(self, tender_id: int) -> AuctionBook | None:
+        return self.books.get(tender_id)
+
+    async def get_or_load(self, tender_id: int) -> AuctionBook | None:
+        book = self.books.get(tender_id)
+        if book is not None:
+            return book
+        return await self.load(tender_id)
+
+    async def load(self, tender_id: int) -> AuctionBook | None:
+        """Загрузка книги из БД; для неактивного тендера возвращает None"""
+        async with self._load_lock:
+            if tender_id in self.books:
+                return self.books[tender_id]
+
+            async with session_scope() as session:
+                tender = await session.get(Tender, tender_id)
+                if not tender or tender.status != TenderStatus.active.value:
+                    return None
+
+                stmt = (
+                    select(TenderParticipant.supplier_id)
+                    .where(TenderParticipant.tender_id == tender_id)
+                    .order_by(TenderParticipant.id)
+                )
+                participants = list((await session.execute(stmt)).scalars().all())
+
+                stmt = (
+                    select(Bid.supplier_id, func.min(Bid.amount))
+                    .where(Bid.tender_id == tender_id)
+                    .group_by(Bid.supplier_id)
+                )
+                supplier_best = {supplier_id: amount for supplier_id, amount in await session.execute(stmt)}
+
+            book = AuctionBook(
+                tender_id=tender.id,
+                title=tender.title,
+                start_price=tender.start_price,
+                current_price=tender.current_price,
+                min_bid_decrease=tender.min_bid_decrease,
+                organizer_id=tender.organizer_id,
+                bid_count=tender.bid_count,
+                best_bid_id=tender.best_bid_id,
+                best_supplier_id=tender.best_supplier_id,
+                last_bid_at=tender.last_bid_at,
+                version=tender.version,
+                participants=participants,
+                supplier_best=supplier_best,
+            )
+            if not self.cacheable(tender_id):
+                return book
+            self.books[tender_id] = book
+            logger.info(f"📗 Книга аукциона {tender_id} загружена: "
+                        f"{len(participants)} участников, {tender.bid_count} заявок")
+            return book
+
+    async def load_active(self) -> int:
+        """Загрузка книг всех активных тендеров (при старте бота)"""
+        async with session_scope() as session:
+            stmt = select(Tender.id).where(Tender.status == TenderStatus.active.value)
+            tender_ids = (await session.execute(stmt)).scalars().all()
+        tender_ids = [tender_id for tender_id in tender_ids if self.cacheable(tender_id)]
+        for tender_id in tender_ids:
+            await self.load(tender_id)
+        return len(tender_ids)
+
+    def drop(self, tender_id: int):
+        if self.books.pop(tender_id, None) is not None:
+            logger.info(f"📕 Книга аукциона {tender_id} выгружена")
+
+    async def on_transition(self, event):
+        """Подписчик TenderLifecycle: книга живёт, пока тендер активен"""
+        for tender_id in event.tender_ids:
+            if event.status == TenderStatus.active.value:
+                await self.load(tender_id)
+            else:
+                self.drop(tender_id)
+
+    def add_participant(self, tender_id: int, supplier_id: int, version: int | None = None):
+        book = self.books.get(tender_id)
+        if book:
+            book.add_participant(supplier_id, version)
+        elif self.router:
+            self.router.participant_changed(tender_id, supplier_id, version, joined=True)
+
+    def remove_participant(self, tender_id: int, supplier_id: int, version: int | None = None):
+        book = self.books.get(tender_id)
+        if book:
+            book.remove_participant(supplier_id, version)
+        elif self.router:
+            self.router.participant_changed(tender_id, supplier_id, version, joined=False)
+
+
+auction_books = AuctionBookRegistry()
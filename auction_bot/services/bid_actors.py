@@ -0,0 +1,238 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import SessionLocal
+from .auction_book import auction_books
+from .bid_engine import BidResult, accept_bid
+from .group_commit import GroupCommitter
+
+if TYPE_CHECKING:
+    from .partitions import PartitionRouter
+
+logger = logging.getLogger(__name__)
+
+
+# Вызывается для принятой заявки до коммита — в той же транзакции (например, запись в outbox)
+OnAccept = Callable[[AsyncSession, BidResult], Awaitable[None]]
+
+
+@dataclass
+class _BidRequest:
+    supplier_id: int
+    amount: float
+    future: asyncio.Future
+    enqueued_at: float
+    on_accept: OnAccept | None = None
+
+
+class BidActor:
+    """
+    Единственный обработчик заявок одного тендера.
+
+    Заявки попадают в очередь и применяются строго по одной в порядке поступления;
+    разные тендеры обслуживаются своими акторами и идут параллельно.
+    С committer заявка пишется не своей транзакцией, а в пачке группового коммита.
+    """
+
+    def __init__(self, tender_id: int, idle_timeout: float = 600, committer: GroupCommitter | None = None):
+        self.tender_id = tender_id
+        self.idle_timeout = idle_timeout
+        self.committer = committer
+        self.queue: asyncio.Queue[_BidRequest] = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+        # Вызывается, когда задача актора завершилась (простой или остановка)
+        self.on_exit: Callable[[BidActor], None] | None = None
+
+        # Метрики
+        self.processed = 0
+        self.last_service_ms = 0.0
+        self.avg_service_ms = 0.0
+        self.max_service_ms = 0.0
+        self.last_wait_ms = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if not self.running:
+            self.task = asyncio.create_task(self._run())
+            self.task.add_done_callback(self._exited)
+
+    def _exited(self, task: asyncio.Task):
+        if self.on_exit:
+            self.on_exit(self)
+
+    async def submit(self, supplier_id: int, amount: float, on_accept: OnAccept | None = None) -> BidResult:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(_BidRequest(supplier_id, amount, future, time.perf_counter(), on_accept))
+        self.start()
+        return await future
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if self.queue.empty():
+                        logger.info(f"💤 Актор заявок тендера {self.tender_id} остановлен по простою")
+                        return
+                    continue
+
+                started = time.perf_counter()
+                apply = asyncio.ensure_future(self._apply(request.supplier_id, request.amount, request.on_accept))
+                try:
+                    await asyncio.shield(apply)
+                except asyncio.CancelledError:
+                    # Заявку, которая уже пишется, доводим до конца: подавший должен
+                    # узнать её настоящий исход, а не ждать ответа вечно
+                    await asyncio.wait([apply])
+                    raise
+                except Exception:
+                    pass  # ошибку заявки отдаёт подавшему _resolve
+                finally:
+                    self._resolve(request, apply)
+                    self._record(started, request.enqueued_at)
+                    self.queue.task_done()
+        except asyncio.CancelledError:
+            self._reject_queued()
+            raise
+
+    def _resolve(self, request: _BidRequest, apply: asyncio.Future):
+        if request.future.done():
+            return
+        if not apply.done() or apply.cancelled():
+            # Повторная отмена во время дописывания заявки
+            apply.cancel()
+            request.future.set_result(BidResult(False, None, reason="not_active"))
+        elif apply.exception() is not None:
+            logger.error(f"Ошибка обработки заявки в тендере {self.tender_id}: {apply.exception()}")
+            request.future.set_exception(apply.exception())
+        else:
+            request.future.set_result(apply.result())
+
+    def _reject_queued(self):
+        # Заявки, оставшиеся в очереди, отклоняем явно
+        while not self.queue.empty():
+            request = self.queue.get_nowait()
+            if not request.future.done():
+                request.future.set_result(BidResult(False, None, reason="not_active"))
+            self.queue.task_done()
+
+    async def _apply(self, supplier_id: int, amount: float, on_accept: OnAccept | None) -> BidResult:
+        if self.committer:
+            result = await self.committer.submit(self.tender_id, supplier_id, amount, on_accept)
+        else:
+            async with SessionLocal() as session:
+                result = await accept_bid(session, self.tender_id, supplier_id, amount)
+                if not result.accepted:
+                    await session.rollback()
+                else:
+                    if on_accept:
+                        await on_accept(session, result)
+                    await session.commit()
+
+        book = auction_books.get(self.tender_id)
+        if result.accepted:
+            if book:
+                book.apply_bid(result.bid_id, supplier_id, amount, result.last_bid_at, result.version)
+        elif result.reason == "not_active":
+            auction_books.drop(self.tender_id)
+        elif book and result.version is not None and result.version != book.version:
+            # Тендер менялся мимо книги — перечитываем её целиком, а не только цену
+            auction_books.drop(self.tender_id)
+            await auction_books.load(self.tender_id)
+        return result
+
+    def _record(self, started: float, enqueued_at: float):
+        service_ms = (time.perf_counter() - started) * 1000
+        self.processed += 1
+        self.last_service_ms = service_ms
+        self.max_service_ms = max(self.max_service_ms, service_ms)
+        # экспоненциальное среднее — видно "горячие" аукционы без хранения истории
+        self.avg_service_ms = service_ms if self.processed == 1 else 0.8 * self.avg_service_ms + 0.2 * service_ms
+        self.last_wait_ms = (started - enqueued_at) * 1000
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self._reject_queued()
+
+    def stats(self) -> dict:
+        return {
+            "tender_id": self.tender_id,
+            "queue_depth": self.queue_depth,
+            "processed": self.processed,
+            "last_service_ms": round(self.last_service_ms, 2),
+            "avg_service_ms": round(self.avg_service_ms, 2),
+            "max_service_ms": round(self.max_service_ms, 2),
+            "last_wait_ms": round(self.last_wait_ms, 2),
+        }
+
+
+class BidActorRegistry:
+    """Реестр акторов заявок: один актор на активный тендер"""
+
+    def __init__(self, idle_timeout: float = 600, committer: GroupCommitter | None = None):
+        self.idle_timeout = idle_timeout
+        self.committer = committer
+        self.actors: Dict[int, BidActor] = {}
+        # Режим PARTITIONS: заявки на чужие тендеры уходят актору процесса-владельца
+        self.router: PartitionRouter | None = None
+
+    def get(self, tender_id: int) -> BidActor:
+        actor = self.actors.get(tender_id)
+        if actor is None:
+            actor = BidActor(tender_id, self.idle_timeout, self.committer)
+            actor.on_exit = self._forget
+            self.actors[tender_id] = actor
+        return actor
+
+    async def submit(self, tender_id: int, supplier_id: int, amount: float,
+                     on_accept: OnAccept | None = None) -> BidResult:
+        if self.router:
+            result = await self.router.submit_bid(tender_id, supplier_id, amount, on_accept)
+            if result is not None:
+                return result
+        return await self.get(tender_id).submit(supplier_id, amount, on_accept)
+
+    def _forget(self, actor: BidActor):
+        # Актор, остановленный по простою, убираем из реестра; если он уже
+        # перезапущен новой заявкой или заменён другим — не трогаем
+        if self.actors.get(actor.tender_id) is actor and not actor.running:
+            del self.actors[actor.tender_id]
+
+    async def stop(self, tender_id: int):
+        actor = self.actors.pop(tender_id, None)
+        if actor:
+            await actor.stop()
+
+    def stats(self) -> list[dict]:
+        # Сначала самые загруженные
+        return sorted(
+            (actor.stats() for actor in self.actors.values()),
+            key=lambda s: (s["queue_depth"], s["avg_service_ms"]),
+            reverse=True,
+        )
+
+    async def cleanup(self):
+        for tender_id in list(self.actors.keys()):
+            await self.stop(tender_id)
+        if self.committer:
+            await self.committer.stop()
+        logger.info("Все акторы заявок остановлены")
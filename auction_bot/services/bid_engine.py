@@ -0,0 +1,86 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Tender, TenderStatus, Bid
+
+# Аукцион закрывается, если после последней заявки прошло столько времени
+CLOSE_AFTER_LAST_BID = timedelta(minutes=2)
+
+
+@dataclass
+class BidResult:
+    """Результат попытки применить заявку"""
+    accepted: bool
+    current_price: float | None
+    bid_id: int | None = None
+    created_at: datetime | None = None   # время заявки (UTC, как Bid.created_at)
+    last_bid_at: datetime | None = None  # локальное время, как Tender.last_bid_at
+    closes_at: datetime | None = None    # новый дедлайн закрытия (локальное время)
+    reason: str | None = None  # "not_active" | "too_high" при отклонении
+    version: int | None = None  # Tender.version после заявки (при отклонении — текущая)
+
+
+async def accept_bid(session: AsyncSession, tender_id: int, supplier_id: int, amount: float) -> BidResult:
+    """
+    Атомарное применение заявки.
+
+    Цена тендера меняется одним условным UPDATE — он проходит, только если тендер
+    активен и снижение не меньше минимального шага. Проверка и запись происходят
+    в одном операторе, поэтому две одновременные заявки не могут обе пройти проверку
+    по одной и той же старой цене. Тем же UPDATE переносится дедлайн закрытия
+    и обновляются счетчик заявок, лучшая заявка и версия тендера.
+    Вставка заявки выполняется в той же транзакции; фиксирует транзакцию вызывающий код.
+    """
+    now = datetime.now()
+    closes_at = now + CLOSE_AFTER_LAST_BID
+    created_at = datetime.utcnow()
+
+    stmt = (
+        update(Tender)
+        .where(
+            Tender.id == tender_id,
+            Tender.status == TenderStatus.active.value,
+            Tender.current_price - amount >= Tender.min_bid_decrease,
+        )
+        .values(
+            current_price=amount,
+            last_bid_at=now,
+            closes_at=closes_at,
+            bid_count=Tender.bid_count + 1,
+            best_supplier_id=supplier_id,
+            version=Tender.version + 1,
+        )
+        .returning(Tender.version)
+        .execution_options(synchronize_session=False)
+    )
+    version = (await session.execute(stmt)).scalar_one_or_none()
+
+    if version is None:
+        # Заявка отклонена — сообщаем актуальное состояние тендера
+        row = (await session.execute(
+            select(Tender.status, Tender.current_price, Tender.version).where(Tender.id == tender_id)
+        )).one_or_none()
+        if row is None or row.status != TenderStatus.active.value:
+            return BidResult(False, row.current_price if row else None, reason="not_active",
+                             version=row.version if row else None)
+        return BidResult(False, row.current_price, reason="too_high", version=row.version)
+
+    bid_id = (await session.execute(
+        insert(Bid)
+        .values(tender_id=tender_id, supplier_id=supplier_id, amount=amount, created_at=created_at)
+        .returning(Bid.id)
+    )).scalar_one()
+    # Та же транзакция, что и UPDATE выше, — версию второй раз не увеличиваем
+    await session.execute(
+        update(Tender)
+        .where(Tender.id == tender_id)
+        .values(best_bid_id=bid_id)
+        .execution_options(synchronize_session=False)
+    )
+
+    return BidResult(True, amount, bid_id=bid_id, created_at=created_at, last_bid_at=now, closes_at=closes_at,
+                     version=version)
@@ -1,14 +1,27 @@
-from datetime import datetime
 from aiogram import Router
 from aiogram.types import Message
 from sqlalchemy import select
 
-from ..db import SessionLocal
-from ..models import Tender, TenderStatus, Bid, User, TenderParticipant
+from .unit_of_work import session_scope
+from ..models import Tender, TenderStatus, User, TenderParticipant
 from ..services.timers import AuctionTimer
+from ..services.bid_actors import BidActorRegistry
+from ..services.auction_book import auction_books
+from ..services.participants import add_participant
 
 router = Router()
 auction_timer = None  # Глобально, чтобы использовать один сервис таймеров
+bid_actors: BidActorRegistry | None = None
+
+
+def set_timer(timer: AuctionTimer):
+    global auction_timer
+    auction_timer = timer
+
+
+def set_bid_actors(registry: BidActorRegistry):
+    global bid_actors
+    bid_actors = registry
 
 
 @router.message(lambda m: m.text and m.text.startswith("/bid"))
@@ -28,7 +41,7 @@ async def place_bid(message: Message):
         amount = float(parts[2])
         user_id = message.from_user.id
 
-        async with SessionLocal() as session:
+        async with session_scope() as session:
             # Проверяем пользователя
             user = await session.get(User, user_id)
             if not user:
@@ -41,26 +54,18 @@ async def place_bid(message: Message):
                 await message.answer("❌ Тендер не найден или уже завершен.")
                 return
 
-            # Проверка суммы (ставка должна быть ниже текущей цены)
-            if amount >= tender.current_price:
-                await message.answer(
-                    f"❌ Ваша ставка должна быть меньше текущей цены ({tender.current_price} ₽)."
-                )
+            # Ставку применяет актор тендера (условный UPDATE + вставка в одной транзакции)
+            bid_result = await bid_actors.submit(tender.id, user.id, amount)
+            if not bid_result.accepted:
+                if bid_result.reason == "not_active":
+                    await message.answer("❌ Тендер не найден или уже завершен.")
+                else:
+                    await message.answer(
+                        f"❌ Ваша ставка должна быть меньше текущей цены ({bid_result.current_price} ₽) "
+                        f"минимум на {tender.min_bid_decrease} ₽."
+                    )
                 return
 
-            # Создаем новую ставку
-            new_bid = Bid(
-                tender_id=tender.id,
-                supplier_id=user.id,
-                amount=amount,
-                created_at=datetime.utcnow()
-            )
-            session.add(new_bid)
-
-            # Обновляем тендер
-            tender.current_price = amount
-            tender.last_bid_at = datetime.utcnow()
-
             # Добавляем участника (если его ещё нет)
             stmt = select(TenderParticipant).where(
                 TenderParticipant.tender_id == tender.id,
@@ -68,13 +73,15 @@ async def place_bid(message: Message):
             )
             result = await session.execute(stmt)
             participant = result.scalar_one_or_none()
+            version = None
             if not participant:
-                session.add(TenderParticipant(tender_id=tender.id, supplier_id=user.id))
+                version = await add_participant(session, tender.id, user.id)
 
             await session.commit()
+            auction_books.add_participant(tender.id, user.id, version)
 
             # Сбрасываем таймер аукциона
-            await auction_timer.reset_timer_for_tender(tender.id)
+            await auction_timer.reset_timer_for_tender(tender.id, bid_result.closes_at)
 
             await message.answer(
                 f"✅ Ваша ставка принята!\n"
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import os
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..models import Tender
+from .unit_of_work import session_scope
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK = 1 << 20
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConditionsFiles:
+    """
+    Отправка файлов условий тендеров по file_id.
+
+    Файл загружается в Telegram один раз; file_id из ответа сохраняется в тендере
+    вместе с хэшем содержимого, и дальше отправляется только он. Если файл на диске
+    изменился (другой хэш) или Telegram больше не принимает file_id — файл
+    загружается заново. Хэш пересчитывается, только когда меняются mtime или размер.
+    """
+
+    def __init__(self):
+        # path -> (mtime_ns, size, sha256)
+        self.hashes: dict[str, tuple[int, int, str]] = {}
+
+        # Метрики
+        self.reused = 0
+        self.uploaded = 0
+
+    async def content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        memo = self.hashes.get(path)
+        if memo and memo[0] == stat.st_mtime_ns and memo[1] == stat.st_size:
+            return memo[2]
+        digest = await asyncio.to_thread(_sha256, path)
+        self.hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    async def send(self, message: Message, tender: Tender, caption: str):
+        path = tender.conditions_path
+        if not path or not os.path.exists(path):
+            return
+        digest = await self.content_hash(path)
+
+        if tender.conditions_file_id and tender.conditions_hash == digest:
+            try:
+                await message.answer_document(tender.conditions_file_id, caption=caption)
+                self.reused += 1
+                return
+            except TelegramBadRequest as e:
+                logger.warning(f"⚠️ file_id условий тендера {tender.id} не принят ({e}), загружаем файл заново")
+
+        sent = await message.answer_document(FSInputFile(path), caption=caption)
+        self.uploaded += 1
+        if sent.document:
+            await self.remember(tender, sent.document.file_id, digest)
+
+    async def remember(self, tender: Tender, file_id: str, digest: str):
+        """Сохранение file_id; версию тендера не трогает — представления от него не зависят"""
+        async with session_scope() as session:
+            await session.execute(
+                update(Tender)
+                .where(Tender.id == tender.id)
+                .values(conditions_file_id=file_id, conditions_hash=digest)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        # Объект тендера не становится «грязным», иначе flush поднял бы его версию
+        set_committed_value(tender, "conditions_file_id", file_id)
+        set_committed_value(tender, "conditions_hash", digest)
+
+    def stats(self) -> dict:
+        return {"reused": self.reused, "uploaded": self.uploaded, "hashed_files": len(self.hashes)}
+
+
+conditions_files = ConditionsFiles()
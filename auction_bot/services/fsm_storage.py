@@ -0,0 +1,239 @@
+from __future__ import annotations
+import asyncio
+import copy
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import FsmRecord
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 600
+FLUSH_CHUNK = 500  # строк в одном INSERT: не упираться в лимит параметров SQLite
+
+
+def _encode(value):
+    # Мастер создания тендера хранит дату начала как datetime
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _decode(obj: dict):
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def dump_data(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=_encode, ensure_ascii=False)
+
+
+def load_data(raw: str | None) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_decode) if raw else {}
+
+
+@dataclass
+class _Entry:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    raw: str = "{}"  # data в JSON: сериализуется при записи, чтобы ошибка досталась обработчику
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    Хранилище FSM в таблице fsm_states с кэшем отложенной записи.
+
+    Чтение — из кэша, при промахе — из базы. Запись меняет кэш и помечает ключ;
+    фоновая задача раз в flush_interval пишет все помеченные ключи одной транзакцией
+    (пустое состояние удаляет строку), close() дописывает остаток. При падении процесса
+    теряются изменения не больше чем за flush_interval.
+
+    Состояние, не менявшееся дольше ttl, считается сброшенным: читается как пустое,
+    а строки периодически удаляются. Кэш рассчитан на то, что апдейты одного
+    пользователя обрабатывает один процесс: другой процесс увидит изменения
+    только после записи в базу и загрузит их, лишь если ключа нет в его кэше.
+    Если апдейты делят несколько процессов (PARTITIONS), нужен write_back=False:
+    чтение всегда из базы, запись сразу.
+    """
+
+    def __init__(self, flush_interval: float | None = None, maxsize: int | None = None,
+                 ttl: float | None = None, write_back: bool = True):
+        self.flush_interval = flush_interval if flush_interval is not None else settings.FSM_FLUSH_INTERVAL
+        self.maxsize = maxsize or settings.FSM_CACHE_SIZE
+        self.ttl = timedelta(seconds=ttl or settings.FSM_STATE_TTL)
+        self.write_back = write_back
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+
+        self.entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.dirty: set[str] = set()
+        self.task: asyncio.Task | None = None
+        self.last_purge = datetime.utcnow()
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.expired = 0
+
+    # Кэш
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        name = self.key_builder.build(key)
+        entry = self.entries.get(name) if self.write_back else None
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(name)
+        else:
+            self.misses += 1
+            async with SessionLocal() as session:
+                record = await session.get(FsmRecord, name)
+            loaded = _Entry(record.state, load_data(record.data), record.updated_at, record.data) if record else _Entry()
+            # Пока шла загрузка, ключ мог быть записан — записанное новее прочитанного
+            if self.write_back or name in self.dirty:
+                entry = self.entries.setdefault(name, loaded)
+            else:
+                entry = self.entries[name] = loaded
+            self._evict()
+
+        if not entry.empty and datetime.utcnow() - entry.updated_at > self.ttl:
+            self.expired += 1
+            entry = self._write(name, None, {})
+        return entry
+
+    def _write(self, name: str, state: Optional[str], data: Dict[str, Any]) -> _Entry:
+        entry = _Entry(state, data, raw=dump_data(data))
+        self.entries[name] = entry
+        self.entries.move_to_end(name)
+        self.dirty.add(name)
+        self._evict()
+        self.start()
+        return entry
+
+    def _evict(self):
+        # Незаписанные ключи не вытесняются, иначе изменения потеряются
+        for name in list(self.entries):
+            if len(self.entries) <= self.maxsize:
+                break
+            if name not in self.dirty:
+                del self.entries[name]
+
+    # BaseStorage
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        value = state.state if isinstance(state, State) else state
+        self._write(self.key_builder.build(key), value, entry.data)
+        if not self.write_back:
+            await self.flush()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        self._write(self.key_builder.build(key), entry.state, copy.deepcopy(data))
+        if not self.write_back:
+            await self.flush()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._entry(key)).data)
+
+    async def close(self) -> None:
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    # Отложенная запись
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if (datetime.utcnow() - self.last_purge).total_seconds() >= PURGE_INTERVAL:
+                    await self.purge_expired()
+            except Exception as e:
+                logger.error(f"Ошибка записи состояний FSM: {e}")
+
+    async def flush(self) -> int:
+        """Запись помеченных ключей одной транзакцией; возвращает число ключей"""
+        if not self.dirty:
+            return 0
+        names, self.dirty = self.dirty, set()
+        rows, removed = [], []
+        for name in names:
+            entry = self.entries.get(name)
+            if entry is None or entry.empty:
+                removed.append(name)
+            else:
+                rows.append({"key": name, "state": entry.state, "data": entry.raw,
+                             "updated_at": entry.updated_at})
+        try:
+            async with SessionLocal() as session:
+                for i in range(0, len(rows), FLUSH_CHUNK):
+                    stmt = sqlite_insert(FsmRecord).values(rows[i:i + FLUSH_CHUNK])
+                    await session.execute(stmt.on_conflict_do_update(
+                        index_elements=["key"],
+                        set_={"state": stmt.excluded.state, "data": stmt.excluded.data,
+                              "updated_at": stmt.excluded.updated_at},
+                    ))
+                for i in range(0, len(removed), FLUSH_CHUNK):
+                    await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(removed[i:i + FLUSH_CHUNK])))
+                await session.commit()
+        except Exception:
+            # Повторим со следующей записью; более новые изменения этих ключей уже в кэше
+            self.dirty |= names
+            raise
+        self.flushes += 1
+        return len(names)
+
+    async def purge_expired(self) -> int:
+        """Удаление строк, не менявшихся дольше ttl"""
+        cutoff = datetime.utcnow() - self.ttl
+        self.last_purge = datetime.utcnow()
+        async with SessionLocal() as session:
+            result = await session.execute(
+                delete(FsmRecord).where(FsmRecord.updated_at < cutoff).returning(FsmRecord.key)
+            )
+            purged = [name for name in result.scalars() if name not in self.dirty]
+            await session.commit()
+        for name in purged:
+            self.entries.pop(name, None)
+        if purged:
+            logger.info(f"🧹 Сброшено устаревших состояний FSM: {len(purged)}")
+        return len(purged)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self.entries),
+            "dirty": len(self.dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "flushes": self.flushes,
+            "expired": self.expired,
+        }
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import SessionLocal
+from .bid_engine import BidResult, accept_bid
+from .metrics import Histogram
+
+if TYPE_CHECKING:
+    from .bid_actors import OnAccept
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+COMMIT_LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+@dataclass
+class _BidWrite:
+    tender_id: int
+    supplier_id: int
+    amount: float
+    on_accept: OnAccept | None
+    future: asyncio.Future
+
+
+async def apply_bid(session: AsyncSession, write: _BidWrite) -> BidResult:
+    """accept_bid и хук on_accept принятой заявки в транзакции session"""
+    result = await accept_bid(session, write.tender_id, write.supplier_id, write.amount)
+    if result.accepted and write.on_accept:
+        await write.on_accept(session, result)
+    return result
+
+
+class GroupCommitter:
+    """
+    Групповой коммит заявок всех тендеров.
+
+    Заявки, пришедшие в течение окна window_ms (или пока не набралось max_batch),
+    применяются в одной транзакции — один fsync на пачку вместо одного на заявку.
+    Каждый вызывающий ждёт future, который разрешается только после коммита пачки.
+    Порядок заявок одного тендера сохраняет его актор: следующую заявку он
+    отправляет, дождавшись результата предыдущей.
+
+    Если пачка падает (ошибка в заявке или в хуке on_accept), она откатывается,
+    и заявки применяются заново по одной — ошибка достаётся только своему вызывающему.
+    """
+
+    def __init__(self, window_ms: float = 5, max_batch: int = 64):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue[_BidWrite] = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+
+        # Метрики
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.commit_latency = Histogram(COMMIT_LATENCY_BUCKETS_MS)
+        self.fallbacks = 0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        while not self.queue.empty():
+            write = self.queue.get_nowait()
+            if not write.future.done():
+                write.future.set_result(BidResult(False, None, reason="not_active"))
+
+    async def submit(self, tender_id: int, supplier_id: int, amount: float,
+                     on_accept: OnAccept | None = None) -> BidResult:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(_BidWrite(tender_id, supplier_id, amount, on_accept, future))
+        self.start()
+        return await future
+
+    async def _collect(self) -> list[_BidWrite]:
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                logger.error(f"Ошибка группового коммита заявок: {e}")
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+
+    async def _commit(self, batch: list[_BidWrite]):
+        started = time.perf_counter()
+        try:
+            async with SessionLocal() as session:
+                results = [await apply_bid(session, write) for write in batch]
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Пачка из {len(batch)} заявок откатилась ({e}), применяем по одной")
+            self.fallbacks += 1
+            await self._commit_each(batch)
+            return
+
+        self.commit_latency.observe((time.perf_counter() - started) * 1000)
+        self.batch_sizes.observe(len(batch))
+        for write, result in zip(batch, results):
+            if not write.future.done():
+                write.future.set_result(result)
+
+    async def _commit_each(self, batch: list[_BidWrite]):
+        for write in batch:
+            try:
+                async with SessionLocal() as session:
+                    result = await apply_bid(session, write)
+                    await session.commit()
+            except Exception as e:
+                if not write.future.done():
+                    write.future.set_exception(e)
+            else:
+                if not write.future.done():
+                    write.future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "batches": self.batch_sizes.count,
+            "avg_batch": round(self.batch_sizes.mean, 2),
+            "avg_commit_ms": round(self.commit_latency.mean, 2),
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import select
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import User
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityCache:
+    """
+    LRU-кэш пользователей по telegram_id с TTL.
+
+    Хранит отсоединённые от сессии объекты User — только для чтения: обработчики,
+    которые меняют пользователя, загружают его в своей сессии и после коммита
+    вызывают invalidate(). TTL ограничивает устаревание, если изменение прошло
+    мимо invalidate (например, правка базы вручную). Незарегистрированные
+    не кэшируются: /start создаёт пользователя, и следующий апдейт его увидит.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items: OrderedDict[int, tuple[float, User]] = OrderedDict()
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, telegram_id: int) -> User | None:
+        item = self.items.get(telegram_id)
+        if item is not None and item[0] > time.monotonic():
+            self.items.move_to_end(telegram_id)
+            self.hits += 1
+            return item[1]
+
+        self.misses += 1
+        # Своя короткая сессия, а не сессия апдейта: объект переживает апдейт,
+        # и откат сессии апдейта не должен его просрочить
+        async with SessionLocal() as session:
+            stmt = select(User).where(User.telegram_id == telegram_id)
+            user = (await session.execute(stmt)).scalar_one_or_none()
+        if user is None:
+            self.items.pop(telegram_id, None)
+            return None
+        self.put(user)
+        return user
+
+    def put(self, user: User):
+        self.items[user.telegram_id] = (time.monotonic() + self.ttl, user)
+        self.items.move_to_end(user.telegram_id)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def invalidate(self, telegram_id: int):
+        self.items.pop(telegram_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+identity_cache = IdentityCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+class UserMiddleware(BaseMiddleware):
+    """
+    Outer-middleware апдейтов: пользователь бота определяется один раз на апдейт.
+
+    Кладёт User (или None для незарегистрированного) в data["user"] — обработчики
+    получают его параметром user.
+    """
+
+    def __init__(self, cache: IdentityCache = identity_cache):
+        self.cache = cache
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        data["user"] = await self.cache.get(from_user.id) if from_user else None
+        return await handler(event, data)
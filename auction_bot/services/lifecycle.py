@@ -0,0 +1,130 @@
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .unit_of_work import session_scope
+from ..models import Tender, TenderStatus
+
+logger = logging.getLogger(__name__)
+
+_EVENTS_KEY = "tender_transitions"
+
+
+@dataclass
+class TenderTransition:
+    """Событие смены статуса: какие тендеры перешли в status"""
+    status: str
+    tender_ids: list[int]
+
+
+Subscriber = Callable[[TenderTransition], Awaitable[None]]
+
+
+class TenderLifecycle:
+    """
+    Единая точка смены статусов тендера.
+
+    Каждый переход — один UPDATE ... WHERE status IN (<допустимые исходные>) RETURNING id:
+    проверка и запись атомарны, повторный или конкурирующий переход просто не находит строк.
+    После коммита подписчики (таймеры, книги аукционов, активатор) получают событие.
+    """
+
+    # Из каких статусов можно перейти в данный
+    ALLOWED = {
+        TenderStatus.active_pending: (TenderStatus.draft,),
+        TenderStatus.active: (TenderStatus.draft, TenderStatus.active_pending),
+        TenderStatus.closed: (TenderStatus.active,),
+        TenderStatus.cancelled: (TenderStatus.draft, TenderStatus.active_pending, TenderStatus.active),
+    }
+
+    def __init__(self):
+        self.subscribers: list[Subscriber] = []
+
+    def subscribe(self, callback: Subscriber):
+        self.subscribers.append(callback)
+
+    async def transition(self, session: AsyncSession, status: TenderStatus,
+                         tender_ids: Iterable[int] | None = None, *criteria, values: dict | None = None) -> list[int]:
+        """
+        Перевести тендеры в status в транзакции session; возвращает id действительно перешедших.
+
+        Без tender_ids переводятся все тендеры, подходящие под criteria. Фиксирует
+        транзакцию вызывающий код — через commit(), чтобы событие ушло подписчикам.
+        """
+        stmt = update(Tender).where(
+            Tender.status.in_([s.value for s in self.ALLOWED[status]]),
+            *criteria,
+        )
+        if tender_ids is not None:
+            tender_ids = list(tender_ids)
+            if not tender_ids:
+                return []
+            stmt = stmt.where(Tender.id.in_(tender_ids))
+        stmt = (
+            stmt.values(status=status.value, version=Tender.version + 1, **(values or {}))
+            .returning(Tender.id)
+            .execution_options(synchronize_session=False)
+        )
+        changed = list((await session.execute(stmt)).scalars().all())
+        if changed:
+            session.info.setdefault(_EVENTS_KEY, []).append(TenderTransition(status.value, changed))
+        return changed
+
+    async def commit(self, session: AsyncSession):
+        """Коммит транзакции и рассылка событий о переходах, сделанных в ней"""
+        await session.commit()
+        for event in session.info.pop(_EVENTS_KEY, []):
+            await self.publish(event)
+
+    async def publish(self, event: TenderTransition):
+        logger.info(f"🔀 Тендеры {event.tender_ids} → {event.status}")
+        for callback in self.subscribers:
+            try:
+                await callback(event)
+            except Exception as e:
+                logger.error(f"Ошибка подписчика на смену статуса {event.status}: {e}")
+
+    async def _single(self, status: TenderStatus, tender_id: int, values: dict | None = None) -> bool:
+        async with session_scope() as session:
+            changed = await self.transition(session, status, [tender_id], values=values)
+            await self.commit(session)
+        return bool(changed)
+
+    # Переходы, которым не нужна чужая транзакция
+
+    async def approve(self, tender_id: int) -> bool:
+        """draft → active_pending"""
+        return await self._single(TenderStatus.active_pending, tender_id)
+
+    async def activate(self, tender_ids: Iterable[int], *criteria) -> list[int]:
+        """draft / active_pending → active; торги начинаются со стартовой цены"""
+        async with session_scope() as session:
+            changed = await self.transition(
+                session, TenderStatus.active, tender_ids, *criteria,
+                values={"current_price": Tender.start_price},
+            )
+            await self.commit(session)
+        return changed
+
+    async def activate_due(self, now: datetime | None = None) -> list[int]:
+        """active_pending → active для всех тендеров, время начала которых наступило"""
+        async with session_scope() as session:
+            changed = await self.transition(
+                session, TenderStatus.active, None,
+                Tender.status == TenderStatus.active_pending.value,
+                Tender.start_at <= (now or datetime.now()),
+                values={"current_price": Tender.start_price},
+            )
+            await self.commit(session)
+        return changed
+
+    async def cancel(self, tender_id: int) -> bool:
+        return await self._single(TenderStatus.cancelled, tender_id)
+
+
+tender_lifecycle = TenderLifecycle()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+from bisect import bisect_left
+from collections import deque
+
+
+class LatencyStats:
+    """Скользящая статистика задержек (мс) по последним N наблюдениям"""
+
+    def __init__(self, window: int = 1000):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.samples.append(ms)
+        self.count += 1
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+    def format(self) -> str:
+        s = self.summary()
+        return f"p50 {s['p50_ms']:.0f} мс, p95 {s['p95_ms']:.0f} мс, макс. {s['max_ms']:.0f} мс (n={s['count']})"
+
+
+class Histogram:
+    """Гистограмма с фиксированными верхними границами корзин (плюс корзина «больше последней»)"""
+
+    def __init__(self, bounds: list[float]):
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def buckets(self) -> list[tuple[str, int]]:
+        labels = [f"≤{bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return list(zip(labels, self.counts))
+
+    def format(self, unit: str = "") -> str:
+        if not self.count:
+            return "нет данных"
+        filled = ", ".join(f"{label}{unit}: {n}" for label, n in self.buckets() if n)
+        return f"{filled} (среднее {self.mean:.1f}{unit}, n={self.count})"
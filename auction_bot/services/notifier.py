@@ -0,0 +1,140 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import User
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Простой token bucket для ограничения частоты отправки"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Остановить выдачу токенов (после TelegramRetryAfter)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_time(self) -> float:
+        """Сколько секунд ждать следующего токена (0 — можно сейчас), не расходуя его"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Notifier:
+    """
+    Рассылка уведомлений в Telegram.
+
+    Получателей резолвит одним IN-запросом, отправляет параллельно под общим
+    лимитом (~30 сообщений/с на бота) и лимитом на каждый чат, учитывает TelegramRetryAfter.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = 30, per_chat_rate: float = 1, max_retries: int = 3):
+        self.bot = bot
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, capacity=1)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def chat_wait_time(self, chat_id: int) -> float:
+        """Через сколько секунд чат снова можно будет отправить сообщение"""
+        bucket = self.chat_buckets.get(chat_id)
+        return bucket.wait_time() if bucket else 0.0
+
+    @staticmethod
+    async def resolve_chat_ids(session: AsyncSession, supplier_ids: Iterable[int]) -> Dict[int, int]:
+        """Возвращает {user.id: telegram_id} одним запросом"""
+        ids = set(supplier_ids)
+        if not ids:
+            return {}
+        stmt = select(User.id, User.telegram_id).where(User.id.in_(ids))
+        result = await session.execute(stmt)
+        return {row.id: row.telegram_id for row in result}
+
+    async def _call(self, chat_id: int, method):
+        """Вызов метода Bot API с соблюдением лимитов; при TelegramRetryAfter ставим бакеты на паузу"""
+        chat_bucket = self._chat_bucket(chat_id)
+        await chat_bucket.acquire()
+        await self.global_bucket.acquire()
+        try:
+            return await method()
+        except TelegramRetryAfter as e:
+            logger.warning(f"Flood limit для чата {chat_id}: повтор через {e.retry_after} с")
+            chat_bucket.pause(e.retry_after)
+            self.global_bucket.pause(e.retry_after)
+            raise
+
+    async def send_once(self, chat_id: int, text: str, **kwargs):
+        """Одна попытка отправки с соблюдением лимитов; ошибки Telegram пробрасываются"""
+        return await self._call(chat_id, lambda: self.bot.send_message(chat_id, text, **kwargs))
+
+    async def edit_once(self, chat_id: int, message_id: int, text: str, **kwargs):
+        """Одна попытка редактирования сообщения с соблюдением лимитов"""
+        return await self._call(
+            chat_id, lambda: self.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+        )
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Отправка одного сообщения с повторами; True при успехе"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.send_once(chat_id, text, **kwargs)
+                return True
+            except TelegramRetryAfter:
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Бот заблокирован пользователем или чат недоступен — повтор не поможет
+                logger.error(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+                return False
+            except Exception as e:
+                logger.error(f"Ошибка отправки в чат {chat_id} (попытка {attempt + 1}): {e}")
+        return False
+
+    async def broadcast(self, chat_ids: Iterable[int], text: str, **kwargs) -> int:
+        """Параллельная рассылка одного текста; возвращает число доставленных"""
+        results = await asyncio.gather(*(self.send(chat_id, text, **kwargs) for chat_id in set(chat_ids)))
+        return sum(results)
+
+    async def notify_users(self, session: AsyncSession, user_ids: Iterable[int], text: str, **kwargs) -> int:
+        """Рассылка по user.id: один запрос за telegram_id, затем параллельная отправка"""
+        chat_ids = await self.resolve_chat_ids(session, user_ids)
+        return await self.broadcast(chat_ids.values(), text, **kwargs)
+
@@ -0,0 +1,421 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterable
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup
+from sqlalchemy import and_, delete, or_, select, update, func, literal, cast, String
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import OutboxMessage, OutboxStatus, PartitionWorker, User
+from .metrics import LatencyStats
+from .notifier import Notifier
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 3600
+RELEASE_INTERVAL = 60  # с между поисками брошенных захватов (режим PARTITIONS)
+
+_dispatcher: OutboxDispatcher | None = None
+_forward_wake: Callable[[], None] | None = None
+
+
+def _dump_markup(markup) -> str | None:
+    if markup is None:
+        return None
+    return markup.model_dump_json(exclude_none=True)
+
+
+def _load_markup(raw: str | None):
+    if not raw:
+        return None
+    data = json.loads(raw)
+    if "inline_keyboard" in data:
+        return InlineKeyboardMarkup.model_validate(data)
+    return ReplyKeyboardMarkup.model_validate(data)
+
+
+async def enqueue(session: AsyncSession, chat_id: int, text: str, dedupe_key: str, reply_markup=None):
+    """
+    Поставить сообщение в outbox в текущей транзакции.
+
+    Сообщение будет отправлено только после коммита; повтор с тем же dedupe_key игнорируется.
+    """
+    now = datetime.utcnow()
+    stmt = sqlite_insert(OutboxMessage).values(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=_dump_markup(reply_markup),
+        dedupe_key=dedupe_key,
+        status=OutboxStatus.pending.value,
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+    ).on_conflict_do_nothing(index_elements=["dedupe_key"])
+    await session.execute(stmt)
+
+
+async def enqueue_users(session: AsyncSession, user_ids: Iterable[int], text: str, dedupe_prefix: str, reply_markup=None):
+    """Поставить сообщение для списка user.id одним INSERT ... SELECT (telegram_id резолвится в БД)"""
+    ids = set(user_ids)
+    if not ids:
+        return
+    now = datetime.utcnow()
+    source = select(
+        User.telegram_id,
+        literal(text),
+        literal(_dump_markup(reply_markup), String),
+        literal(f"{dedupe_prefix}:") + cast(User.id, String),
+        literal(OutboxStatus.pending.value),
+        literal(0),
+        literal(now),
+        literal(now),
+    ).where(User.id.in_(ids))
+    stmt = sqlite_insert(OutboxMessage).from_select(
+        ["chat_id", "text", "reply_markup", "dedupe_key", "status", "attempts", "next_attempt_at", "created_at"],
+        source,
+    ).on_conflict_do_nothing(index_elements=["dedupe_key"])
+    await session.execute(stmt)
+
+
+def set_forward_wake(callback: Callable[[], None] | None):
+    """Куда передать wake(), если диспетчер работает в другом процессе (держателе роли outbox)"""
+    global _forward_wake
+    _forward_wake = callback
+
+
+def wake(forward: bool = True):
+    """Разбудить диспетчер после коммита транзакции с новыми сообщениями"""
+    if _dispatcher:
+        _dispatcher.wake()
+    elif forward and _forward_wake:
+        _forward_wake()
+
+
+class OutboxDispatcher:
+    """
+    Доставка сообщений из таблицы outbox пулом воркеров.
+
+    Сообщения одного чата всегда попадают к одному воркеру и отправляются по порядку id;
+    пока у чата есть сообщение в работе или в ожидании повтора, следующие не выбираются.
+    Такие чаты отсекаются в самом запросе, а от каждого чата берётся не больше
+    chat_batch сообщений: ни чат в ожидании повтора, ни длинная очередь одного чата
+    не занимают пачку и воркер. Чат, чей лимит Telegram (1 сообщение/с) ещё не
+    восстановился, воркер откладывает и берётся за следующий.
+    Выбранные сообщения захватываются условным UPDATE pending -> sending: сообщение,
+    которое воркер успел отметить sent, пока шла выборка, повторно не уйдёт.
+    Отправка — at-least-once: статус sent ставится после успешного вызова Telegram;
+    сообщения, зависшие в sending после падения процесса, при запуске возвращаются
+    в pending. Отправленные хранятся retention секунд (пока действует их dedupe_key).
+
+    При PARTITIONS захват помечается именем процесса (owner). Остановленный диспетчер
+    сам возвращает свои захваты, а новый держатель роли outbox возвращает только
+    захваты умерших процессов (без пульса в partition_workers) и старше claim_timeout:
+    сообщения, которые прежний держатель ещё отправляет, повторно не уйдут.
+    """
+
+    def __init__(self, notifier: Notifier, workers: int | None = None, batch_size: int | None = None,
+                 poll_interval: float | None = None, max_attempts: int | None = None,
+                 retention: float | None = None, chat_batch: int | None = None,
+                 claim_timeout: float | None = None):
+        self.notifier = notifier
+        self.workers = workers or settings.OUTBOX_WORKERS
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.chat_batch = chat_batch or settings.OUTBOX_CHAT_BATCH
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        self.max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+        self.retention = timedelta(seconds=retention or settings.OUTBOX_RETENTION)
+        self.claim_timeout = timedelta(seconds=claim_timeout or settings.OUTBOX_CLAIM_TIMEOUT)
+        self.owner: str | None = None  # имя процесса при PARTITIONS
+        self.last_purge = datetime.utcnow()
+        self.last_release = datetime.utcnow()
+
+        self.queues: list[asyncio.Queue] = []
+        self.tasks: list[asyncio.Task] = []
+        self.busy_chats: set[int] = set()
+        self._wakeup = asyncio.Event()
+
+        # Метрики
+        self.ack_latency = LatencyStats()      # подтверждение заявки подавшему
+        self.fanout_latency = LatencyStats()   # от записи в outbox до отправки
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.purged = 0
+
+    def start(self):
+        global _dispatcher
+        if self.tasks:
+            return
+        _dispatcher = self
+        self.queues = [asyncio.Queue() for _ in range(self.workers)]
+        self.tasks = [asyncio.create_task(self._worker(q)) for q in self.queues]
+        self.tasks.append(asyncio.create_task(self._fetch_loop()))
+        logger.info(f"📬 Outbox запущен: {self.workers} воркеров, пачка {self.batch_size}")
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def stop(self):
+        global _dispatcher
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.busy_chats.clear()
+        if _dispatcher is self:
+            _dispatcher = None
+        if self.owner:
+            # Роль outbox ушла другому процессу: он не вернёт захваты живого процесса сам
+            try:
+                await self.release_owned()
+            except Exception as e:
+                logger.error(f"Не удалось вернуть захваченные сообщения outbox: {e}")
+
+    async def _fetch_loop(self):
+        try:
+            await self.release_stale(include_own=True)
+        except Exception as e:
+            logger.error(f"Ошибка восстановления outbox: {e}")
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._fetch_batch()
+                if datetime.utcnow() - self.last_purge >= timedelta(seconds=PURGE_INTERVAL):
+                    await self.purge_sent()
+                if self.owner and datetime.utcnow() - self.last_release >= timedelta(seconds=RELEASE_INTERVAL):
+                    await self.release_stale()
+            except Exception as e:
+                logger.error(f"Ошибка выборки outbox: {e}")
+
+    async def release_stale(self, include_own: bool = False) -> int:
+        """
+        Вернуть в pending сообщения, захваченные до остановки или падения процесса.
+
+        Без PARTITIONS диспетчер один, и при запуске брошены все захваты. При PARTITIONS —
+        только захваты процессов без пульса, зависшие дольше claim_timeout и, при
+        запуске (include_own), свои, оставшиеся от прошлого запуска с тем же именем.
+        """
+        now = datetime.utcnow()
+        self.last_release = now
+        stmt = update(OutboxMessage).where(OutboxMessage.status == OutboxStatus.sending.value)
+        if self.owner:
+            alive = select(PartitionWorker.worker).where(
+                PartitionWorker.heartbeat_at > now - timedelta(seconds=settings.PARTITION_LEASE_TTL)
+            )
+            abandoned = or_(
+                OutboxMessage.claimed_by.not_in(alive),
+                OutboxMessage.claimed_at < now - self.claim_timeout,
+            )
+            if include_own:
+                abandoned = or_(abandoned, OutboxMessage.claimed_by == self.owner)
+            else:
+                # Свои захваты сейчас в очередях воркеров
+                abandoned = and_(OutboxMessage.claimed_by != self.owner, abandoned)
+            stmt = stmt.where(or_(OutboxMessage.claimed_by.is_(None), abandoned))
+        async with SessionLocal() as session:
+            result = await session.execute(
+                stmt.values(status=OutboxStatus.pending.value, claimed_by=None, claimed_at=None)
+            )
+            await session.commit()
+        if result.rowcount:
+            logger.warning(f"📬 Возвращено в очередь незавершённых сообщений outbox: {result.rowcount}")
+        return result.rowcount
+
+    async def release_owned(self) -> int:
+        """Вернуть в pending свои захваты, которые воркеры не успели отправить"""
+        async with SessionLocal() as session:
+            result = await session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.status == OutboxStatus.sending.value, OutboxMessage.claimed_by == self.owner)
+                .values(status=OutboxStatus.pending.value, claimed_by=None, claimed_at=None)
+            )
+            await session.commit()
+        return result.rowcount
+
+    async def purge_sent(self) -> int:
+        """Удаление отправленных сообщений старше retention"""
+        self.last_purge = datetime.utcnow()
+        async with SessionLocal() as session:
+            result = await session.execute(
+                delete(OutboxMessage).where(
+                    OutboxMessage.status == OutboxStatus.sent.value,
+                    OutboxMessage.sent_at < self.last_purge - self.retention,
+                )
+            )
+            await session.commit()
+        self.purged += result.rowcount
+        if result.rowcount:
+            logger.info(f"🧹 Удалено отправленных сообщений outbox: {result.rowcount}")
+        return result.rowcount
+
+    async def _fetch_batch(self):
+        now = datetime.utcnow()
+        pending = OutboxMessage.status == OutboxStatus.pending.value
+        # Чаты, первое ожидающее сообщение которых пора отправлять (иначе чат ждёт повтора)
+        heads = (
+            select(OutboxMessage.chat_id, func.min(OutboxMessage.id).label("head_id"))
+            .where(pending)
+            .group_by(OutboxMessage.chat_id)
+            .subquery()
+        )
+        head = aliased(OutboxMessage)
+        ready_chats = (
+            select(heads.c.chat_id)
+            .join(head, head.id == heads.c.head_id)
+            .where(head.next_attempt_at <= now)
+        )
+        ranked = (
+            select(
+                OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.text,
+                OutboxMessage.reply_markup, OutboxMessage.attempts, OutboxMessage.created_at,
+                func.row_number().over(partition_by=OutboxMessage.chat_id, order_by=OutboxMessage.id).label("n"),
+            )
+            .where(
+                pending,
+                OutboxMessage.chat_id.in_(ready_chats),
+                OutboxMessage.chat_id.not_in(list(self.busy_chats)),
+            )
+            .subquery()
+        )
+        stmt = (
+            select(ranked)
+            .where(ranked.c.n <= self.chat_batch)
+            .order_by(ranked.c.id)
+            .limit(self.batch_size)
+        )
+        async with SessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+            by_chat: OrderedDict[int, list] = OrderedDict()
+            for row in rows:
+                # Чат мог стать занятым, пока шёл запрос
+                if row.chat_id not in self.busy_chats:
+                    by_chat.setdefault(row.chat_id, []).append(row)
+            if not by_chat:
+                return
+
+            # Захват: пока шёл SELECT, воркер мог отправить часть строк и освободить чат
+            claimed = set((await session.execute(
+                update(OutboxMessage)
+                .where(
+                    OutboxMessage.id.in_([row.id for messages in by_chat.values() for row in messages]),
+                    OutboxMessage.status == OutboxStatus.pending.value,
+                )
+                .values(status=OutboxStatus.sending.value, claimed_by=self.owner, claimed_at=datetime.utcnow())
+                .returning(OutboxMessage.id)
+            )).scalars())
+            await session.commit()
+
+        for chat_id, messages in by_chat.items():
+            messages = [row for row in messages if row.id in claimed]
+            if not messages:
+                continue
+            self.busy_chats.add(chat_id)
+            self.queues[hash(chat_id) % self.workers].put_nowait((chat_id, messages))
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            chat_id, messages = await queue.get()
+            delay = self.notifier.chat_wait_time(chat_id)
+            if delay > 0:
+                # Лимит чата ещё не восстановился — не ждём его, а занимаемся другими чатами
+                asyncio.get_running_loop().call_later(delay, queue.put_nowait, (chat_id, messages))
+                queue.task_done()
+                continue
+            try:
+                await self._deliver_chat(chat_id, messages)
+            except Exception as e:
+                logger.error(f"Ошибка доставки в чат {chat_id}: {e}")
+                await self._release([row.id for row in messages])
+            finally:
+                self.busy_chats.discard(chat_id)
+                queue.task_done()
+
+    async def _release(self, message_ids: list[int]):
+        """Вернуть захваченные сообщения в очередь, если доставка сорвалась (at-least-once)"""
+        try:
+            async with SessionLocal() as session:
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(message_ids), OutboxMessage.status == OutboxStatus.sending.value)
+                    .values(status=OutboxStatus.pending.value)
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Не удалось вернуть сообщения outbox в очередь (вернутся при запуске): {e}")
+
+    async def _deliver_chat(self, chat_id: int, messages: list):
+        sent_ids: list[int] = []
+        failed: list[tuple[int, str]] = []
+        retry: tuple | None = None
+
+        for row in messages:
+            try:
+                await self.notifier.send_once(chat_id, row.text, reply_markup=_load_markup(row.reply_markup))
+                sent_ids.append(row.id)
+                self.fanout_latency.observe((datetime.utcnow() - row.created_at).total_seconds() * 1000)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Повтор не поможет — помечаем и идем дальше
+                failed.append((row.id, str(e)))
+            except Exception as e:
+                delay = e.retry_after if isinstance(e, TelegramRetryAfter) else min(2 ** row.attempts, 300)
+                retry = (row, delay, str(e))
+                # Порядок в чате: следующие сообщения ждут этого
+                break
+
+        now = datetime.utcnow()
+        async with SessionLocal() as session:
+            if sent_ids:
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(sent_ids))
+                    .values(status=OutboxStatus.sent.value, sent_at=now)
+                )
+            for message_id, error in failed:
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id == message_id)
+                    .values(status=OutboxStatus.failed.value, last_error=error)
+                )
+            if retry:
+                row, delay, error = retry
+                attempts = row.attempts + 1
+                values = dict(attempts=attempts, last_error=error, status=OutboxStatus.pending.value,
+                              next_attempt_at=now + timedelta(seconds=delay))
+                if attempts >= self.max_attempts:
+                    values["status"] = OutboxStatus.failed.value
+                await session.execute(update(OutboxMessage).where(OutboxMessage.id == row.id).values(**values))
+            # Захваченные, но не отправленные (ждут повтора предыдущего) — обратно в очередь
+            done = set(sent_ids) | {message_id for message_id, _ in failed} | ({retry[0].id} if retry else set())
+            rest = [row.id for row in messages if row.id not in done]
+            if rest:
+                await session.execute(
+                    update(OutboxMessage).where(OutboxMessage.id.in_(rest)).values(status=OutboxStatus.pending.value)
+                )
+            await session.commit()
+
+        self.sent += len(sent_ids)
+        self.failed += len(failed)
+        if retry:
+            self.retried += 1
+            logger.warning(f"Сообщение outbox {retry[0].id} в чат {chat_id} будет повторено через {retry[1]} с")
+        if sent_ids:
+            # За этой пачкой могли остаться сообщения того же чата
+            self.wake()
+
+    async def pending_count(self) -> int:
+        async with SessionLocal() as session:
+            stmt = select(func.count(OutboxMessage.id)).where(OutboxMessage.status == OutboxStatus.pending.value)
+            return (await session.execute(stmt)).scalar_one()
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Tender, TenderParticipant
+
+
+async def add_participant(session: AsyncSession, tender_id: int, supplier_id: int) -> int:
+    """Добавить участника и увеличить Tender.participant_count в той же транзакции; возвращает новую версию тендера"""
+    session.add(TenderParticipant(tender_id=tender_id, supplier_id=supplier_id))
+    return (await session.execute(
+        update(Tender)
+        .where(Tender.id == tender_id)
+        .values(participant_count=Tender.participant_count + 1, version=Tender.version + 1)
+        .returning(Tender.version)
+        .execution_options(synchronize_session=False)
+    )).scalar_one()
+
+
+async def remove_participant(session: AsyncSession, participant: TenderParticipant) -> int | None:
+    """Удалить участника и уменьшить Tender.participant_count в той же транзакции; возвращает новую версию тендера"""
+    await session.delete(participant)
+    return (await session.execute(
+        update(Tender)
+        .where(Tender.id == participant.tender_id, Tender.participant_count > 0)
+        .values(participant_count=Tender.participant_count - 1, version=Tender.version + 1)
+        .returning(Tender.version)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
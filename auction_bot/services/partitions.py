@@ -0,0 +1,468 @@
+from __future__ import annotations
+import asyncio
+import logging
+import math
+import zlib
+from dataclasses import asdict, fields
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+from sqlalchemy import ColumnElement, delete, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import PartitionLease, PartitionWorker
+from . import outbox
+from .auction_book import auction_books
+from .bid_engine import BidResult
+from .lifecycle import TenderTransition
+
+if TYPE_CHECKING:
+    from .bid_actors import BidActorRegistry, OnAccept
+
+logger = logging.getLogger(__name__)
+
+PartitionsCallback = Callable[[set[int]], Awaitable[None]]
+RolesCallback = Callable[[set[str]], Awaitable[None]]
+TransitionCallback = Callable[[TenderTransition], Awaitable[None]]
+
+
+# Обязанности, которые в кластере выполняет ровно один процесс (приём апдейтов,
+# доставка outbox): аренды в той же таблице, под отрицательными номерами
+ROLES = {"updates": -1, "outbox": -2}
+_ROLE_NAMES = {number: role for role, number in ROLES.items()}
+
+
+def partition_of(tender_id: int, partitions: int) -> int:
+    # crc32, а не hash(): номер партиции должен совпадать во всех процессах
+    return zlib.crc32(str(tender_id).encode()) % partitions
+
+
+class PartitionManager:
+    """
+    Владение партициями тендеров через таблицу аренд в общей базе.
+
+    Тендер принадлежит партиции partition_of(id); партиция — процессу, который держит
+    её аренду. Раз в renew_interval процесс отмечается в partition_workers, продлевает
+    свои аренды и выравнивает их число до справедливой доли (партиций / живых процессов):
+    лишние отпускает, недостающие забирает из свободных или просроченных. Аренда
+    умершего процесса истекает через lease_ttl, и её забирают остальные. Так же, но
+    без выравнивания, распределяются роли ROLES: каждую забирает первый процесс,
+    заставший её свободной.
+
+    Аренда не заменяет проверок в базе: пока просроченный, но живой владелец не
+    заметил потерю, тендер могут обслуживать двое. Цену, закрытие и активацию
+    защищают условные UPDATE по статусу и версии, поэтому двойной владелец даёт
+    лишнюю работу, а не неверное состояние.
+    """
+
+    def __init__(self, worker: str, address: str, partitions: int | None = None,
+                 lease_ttl: float | None = None, renew_interval: float | None = None):
+        self.worker = worker
+        self.address = address
+        self.partitions = partitions or settings.PARTITIONS
+        self.lease_ttl = timedelta(seconds=lease_ttl or settings.PARTITION_LEASE_TTL)
+        self.renew_interval = renew_interval or settings.PARTITION_RENEW_INTERVAL
+
+        self.owned: set[int] = set()
+        self.owners: dict[int, str] = {}  # партиция -> адрес IPC владельца (по последнему обходу)
+        self.role_owners: dict[str, str] = {}  # роль -> адрес IPC держателя
+        self.on_acquired: list[PartitionsCallback] = []
+        self.on_released: list[PartitionsCallback] = []
+        self.roles: set[str] = set()
+        self.on_roles_acquired: list[RolesCallback] = []
+        self.on_roles_released: list[RolesCallback] = []
+        self.renewed_at = datetime.utcnow()  # последнее успешное продление
+        self.task: asyncio.Task | None = None
+
+        # Метрики
+        self.acquired = 0
+        self.released = 0
+
+    def partition(self, tender_id: int) -> int:
+        return partition_of(tender_id, self.partitions)
+
+    def owns(self, tender_id: int) -> bool:
+        return self.partition(tender_id) in self.owned
+
+    def owner_address(self, tender_id: int) -> str | None:
+        return self.owners.get(self.partition(tender_id))
+
+    async def start(self):
+        """Первое распределение (без колбэков — загрузку при старте делает main) и фоновое продление"""
+        async with SessionLocal() as session:
+            await session.execute(
+                sqlite_insert(PartitionLease)
+                .values([{"partition": p, "epoch": 0} for p in [*range(self.partitions), *ROLES.values()]])
+                .on_conflict_do_nothing(index_elements=["partition"])
+            )
+            await session.commit()
+        self.owned, self.roles = await self._rebalance()
+        self.renewed_at = datetime.utcnow()
+        logger.info(f"🧩 {self.worker}: партиции {sorted(self.owned)} из {self.partitions}, роли {sorted(self.roles)}")
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Отпустить аренды, чтобы другие процессы забрали партиции сразу, а не через lease_ttl"""
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        async with SessionLocal() as session:
+            await session.execute(
+                update(PartitionLease).where(PartitionLease.owner == self.worker)
+                .values(owner=None, address=None, expires_at=None)
+            )
+            await session.execute(delete(PartitionWorker).where(PartitionWorker.worker == self.worker))
+            await session.commit()
+        self.owned = set()
+        self.roles = set()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            try:
+                owned, roles = await self._rebalance()
+                self.renewed_at = datetime.utcnow()
+            except Exception as e:
+                logger.error(f"Ошибка продления аренды партиций: {e}")
+                if datetime.utcnow() - self.renewed_at <= self.lease_ttl:
+                    continue
+                # Аренды истекли и уже могут принадлежать другим — не дублируем их работу
+                owned, roles = set(), set()
+            await self._update_roles(roles)
+            acquired, released = owned - self.owned, self.owned - owned
+            self.owned = owned
+            if released:
+                self.released += len(released)
+                logger.info(f"🧩 {self.worker}: отпущены партиции {sorted(released)}")
+                await self._notify(self.on_released, released)
+            if acquired:
+                self.acquired += len(acquired)
+                logger.info(f"🧩 {self.worker}: получены партиции {sorted(acquired)}")
+                await self._notify(self.on_acquired, acquired)
+
+    async def _update_roles(self, roles: set[str]):
+        acquired, released = roles - self.roles, self.roles - roles
+        self.roles = roles
+        # Сначала отпускаем: роль могла уйти, пока процесс не мог продлить аренду
+        if released:
+            logger.info(f"🧩 {self.worker}: отпущены роли {sorted(released)}")
+            await self._notify(self.on_roles_released, released)
+        if acquired:
+            logger.info(f"🧩 {self.worker}: получены роли {sorted(acquired)}")
+            await self._notify(self.on_roles_acquired, acquired)
+
+    async def _notify(self, callbacks: list, changed: set):
+        for callback in callbacks:
+            try:
+                await callback(changed)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика смены партиций: {e}")
+
+    async def _rebalance(self) -> tuple[set[int], set[str]]:
+        """Одна транзакция: пульс, продление, отдача лишних и захват недостающих аренд и ролей"""
+        now = datetime.utcnow()
+        expires_at = now + self.lease_ttl
+        lease = PartitionLease
+        tenders = lease.partition.between(0, self.partitions - 1)
+        roles = lease.partition.in_(list(ROLES.values()))
+        free = or_(lease.owner.is_(None), lease.expires_at < now)
+        async with SessionLocal() as session:
+            stmt = sqlite_insert(PartitionWorker).values(worker=self.worker, address=self.address, heartbeat_at=now)
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=["worker"], set_={"address": stmt.excluded.address, "heartbeat_at": now},
+            ))
+            alive = await session.scalar(
+                select(func.count()).select_from(PartitionWorker)
+                .where(PartitionWorker.heartbeat_at > now - self.lease_ttl)
+            )
+            share = math.ceil(self.partitions / max(1, alive))
+
+            # Продлеваем только то, что ещё наше: просроченную аренду мог забрать другой процесс
+            renewed = set((await session.execute(
+                update(lease)
+                .where(lease.owner == self.worker, lease.expires_at >= now, or_(tenders, roles))
+                .values(expires_at=expires_at)
+                .returning(lease.partition)
+            )).scalars())
+            owned = {partition for partition in renewed if partition >= 0}
+            held = {_ROLE_NAMES[partition] for partition in renewed if partition < 0}
+
+            if len(owned) > share:
+                extra = sorted(owned)[share:]
+                await session.execute(
+                    update(lease).where(lease.partition.in_(extra), lease.owner == self.worker)
+                    .values(owner=None, address=None, expires_at=None)
+                )
+                owned -= set(extra)
+            elif len(owned) < share:
+                candidates = (await session.execute(
+                    select(lease.partition).where(free, tenders)
+                    .order_by(lease.partition).limit(share - len(owned))
+                )).scalars().all()
+                for partition in candidates:
+                    if await self._claim(session, partition, free, expires_at):
+                        owned.add(partition)
+
+            for role, partition in ROLES.items():
+                if role not in held and await self._claim(session, partition, free, expires_at):
+                    held.add(role)
+
+            rows = (await session.execute(
+                select(lease.partition, lease.address).where(lease.expires_at >= now, or_(tenders, roles))
+            )).all()
+            await session.commit()
+
+        self.owners = {partition: address for partition, address in rows if address and partition >= 0}
+        self.role_owners = {_ROLE_NAMES[partition]: address for partition, address in rows
+                            if address and partition < 0}
+        return owned, held
+
+    async def _claim(self, session: AsyncSession, partition: int, free: ColumnElement[bool],
+                     expires_at: datetime) -> bool:
+        # Условный захват: из двух процессов аренду получит один
+        claimed = (await session.execute(
+            update(PartitionLease).where(PartitionLease.partition == partition, free)
+            .values(owner=self.worker, address=self.address, epoch=PartitionLease.epoch + 1,
+                    expires_at=expires_at)
+            .returning(PartitionLease.partition)
+        )).scalar_one_or_none()
+        return claimed is not None
+
+    def stats(self) -> dict:
+        return {
+            "worker": self.worker,
+            "owned": len(self.owned),
+            "partitions": self.partitions,
+            "acquired": self.acquired,
+            "released": self.released,
+            "roles": sorted(self.roles),
+        }
+
+
+def _dump_result(result: BidResult) -> dict:
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in asdict(result).items()}
+
+
+def _load_result(data: dict) -> BidResult:
+    dates = {"created_at", "last_bid_at", "closes_at"}
+    return BidResult(**{
+        f.name: datetime.fromisoformat(data[f.name]) if f.name in dates and data.get(f.name) else data.get(f.name)
+        for f in fields(BidResult)
+    })
+
+
+class PartitionRouter:
+    """
+    Пересылка работы владельцу тендера по локальному HTTP (IPC) между процессами.
+
+    - Заявку на чужой тендер применяет актор владельца: хук on_accept владелец строит
+      сам (bid_hook), после принятия переносит дедлайн и т.п. (after_bid).
+    - События смены статуса получают подписчики процесса-владельца: свои тендеры —
+      локально, чужие — владельцу.
+    - Изменения участников доходят до книги аукциона владельца.
+    - wake() outbox из процессов без роли outbox будит диспетчер её держателя.
+
+    Если владелец неизвестен или не отвечает, работа выполняется локально: условные
+    UPDATE в базе делают это безопасным, а новый владелец при получении партиции
+    перечитывает состояние своих тендеров из базы.
+    """
+
+    def __init__(self, manager: PartitionManager, bid_actors: BidActorRegistry,
+                 subscribers: Iterable[TransitionCallback] = ()):
+        self.manager = manager
+        self.bid_actors = bid_actors
+        self.subscribers = list(subscribers)
+        # Задаются модулем маршрутов поставщика (там живут уведомления о заявках)
+        self.bid_hook: Callable[[int, int], Awaitable[OnAccept | None]] | None = None
+        self.after_bid: Callable[[int, BidResult], Awaitable[None]] | None = None
+
+        self.client: ClientSession | None = None
+        self.runner: web.AppRunner | None = None
+        self.pending: set[asyncio.Task] = set()
+        self.wake_task: asyncio.Task | None = None
+        self.wake_again = False
+
+        # Метрики
+        self.forwarded = 0
+        self.received = 0
+        self.fallbacks = 0
+
+    def owns(self, tender_id: int) -> bool:
+        return self.manager.owns(tender_id)
+
+    # Сервер IPC
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bid", self._handle_bid)
+        app.router.add_post("/transition", self._handle_transition)
+        app.router.add_post("/participant", self._handle_participant)
+        app.router.add_post("/wake", self._handle_wake)
+        return app
+
+    async def start(self, host: str, port: int):
+        self.client = ClientSession(timeout=ClientTimeout(total=settings.IPC_TIMEOUT))
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info(f"🔌 IPC партиций слушает {host}:{port}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        if self.wake_task:
+            await asyncio.gather(self.wake_task, return_exceptions=True)
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def _handle_bid(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        tender_id, supplier_id = data["tender_id"], data["supplier_id"]
+        self.received += 1
+        on_accept = await self.bid_hook(tender_id, supplier_id) if data.get("notify") and self.bid_hook else None
+        # Напрямую актору: этот процесс — владелец (или последний, кто о нём знает)
+        result = await self.bid_actors.get(tender_id).submit(supplier_id, data["amount"], on_accept)
+        if result.accepted and self.after_bid:
+            await self.after_bid(tender_id, result)
+        return web.json_response(_dump_result(result))
+
+    async def _handle_transition(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        self.received += 1
+        await self._publish_local(TenderTransition(data["status"], data["tender_ids"]))
+        return web.Response()
+
+    async def _handle_participant(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        self.received += 1
+        if data["joined"]:
+            auction_books.add_participant(data["tender_id"], data["supplier_id"], data.get("version"))
+        else:
+            auction_books.remove_participant(data["tender_id"], data["supplier_id"], data.get("version"))
+        return web.Response()
+
+    async def _handle_wake(self, request: web.Request) -> web.Response:
+        self.received += 1
+        # Только свой диспетчер: при устаревшем представлении о ролях запрос не гоняется по кругу
+        outbox.wake(forward=False)
+        return web.Response()
+
+    # Пересылка
+
+    async def _post(self, address: str, path: str, payload: dict) -> dict | None:
+        async with self.client.post(f"http://{address}{path}", json=payload) as resp:
+            resp.raise_for_status()
+            return await resp.json() if resp.content_type == "application/json" else None
+
+    def _remote(self, tender_id: int) -> str | None:
+        """Адрес владельца, если тендер чужой и владелец известен"""
+        if self.client is None or self.owns(tender_id):
+            return None
+        address = self.manager.owner_address(tender_id)
+        return address if address and address != self.manager.address else None
+
+    async def submit_bid(self, tender_id: int, supplier_id: int, amount: float,
+                         on_accept: OnAccept | None = None) -> BidResult | None:
+        """Заявка владельцу; None — тендер свой или владелец недоступен (применять локально)"""
+        address = self._remote(tender_id)
+        if address is None:
+            return None
+        payload = {"tender_id": tender_id, "supplier_id": supplier_id, "amount": amount,
+                   "notify": on_accept is not None}
+        try:
+            data = await self._post(address, "/bid", payload)
+        except (ClientError, asyncio.TimeoutError) as e:
+            # Если владелец успел применить заявку до сбоя, повтор отклонит условный UPDATE
+            self.fallbacks += 1
+            logger.warning(f"⚠️ Владелец тендера {tender_id} ({address}) недоступен ({e}), заявка применяется локально")
+            return None
+        self.forwarded += 1
+        return _load_result(data)
+
+    async def on_transition(self, event: TenderTransition):
+        """Подписчик TenderLifecycle: события раздаются владельцам тендеров"""
+        local: list[int] = []
+        remote: dict[str, list[int]] = {}
+        for tender_id in event.tender_ids:
+            address = self._remote(tender_id)
+            if address is None:
+                local.append(tender_id)
+            else:
+                remote.setdefault(address, []).append(tender_id)
+
+        for address, tender_ids in remote.items():
+            try:
+                await self._post(address, "/transition", {"status": event.status, "tender_ids": tender_ids})
+                self.forwarded += 1
+            except (ClientError, asyncio.TimeoutError) as e:
+                self.fallbacks += 1
+                logger.warning(f"⚠️ Событие {event.status} для {tender_ids} не доставлено {address} ({e})")
+                local.extend(tender_ids)
+        if local:
+            await self._publish_local(TenderTransition(event.status, local))
+
+    async def _publish_local(self, event: TenderTransition):
+        for callback in self.subscribers:
+            try:
+                await callback(event)
+            except Exception as e:
+                logger.error(f"Ошибка подписчика на смену статуса {event.status}: {e}")
+
+    def participant_changed(self, tender_id: int, supplier_id: int, version: int | None, joined: bool):
+        """Участник изменился в чужом тендере — сообщить книге владельца (в фоне)"""
+        address = self._remote(tender_id)
+        if address is None:
+            return
+        payload = {"tender_id": tender_id, "supplier_id": supplier_id, "version": version, "joined": joined}
+
+        async def send():
+            try:
+                await self._post(address, "/participant", payload)
+                self.forwarded += 1
+            except (ClientError, asyncio.TimeoutError) as e:
+                self.fallbacks += 1
+                logger.warning(f"⚠️ Изменение участников тендера {tender_id} не доставлено {address} ({e})")
+
+        task = asyncio.create_task(send())
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    def wake_outbox(self):
+        """Новые сообщения в outbox — разбудить диспетчер держателя роли outbox (в фоне)"""
+        address = self.manager.role_owners.get("outbox")
+        if self.client is None or not address or address == self.manager.address:
+            return
+        if self.wake_task and not self.wake_task.done():
+            # Запрос уже в пути; повторим после него, чтобы не потерять новые сообщения
+            self.wake_again = True
+            return
+
+        async def send():
+            while True:
+                self.wake_again = False
+                try:
+                    await self._post(address, "/wake", {})
+                    self.forwarded += 1
+                except (ClientError, asyncio.TimeoutError) as e:
+                    # Держатель всё равно заберёт сообщения при очередном опросе
+                    self.fallbacks += 1
+                    logger.warning(f"⚠️ Не удалось разбудить outbox {address} ({e})")
+                    return
+                if not self.wake_again:
+                    return
+
+        self.wake_task = asyncio.create_task(send())
+
+    def stats(self) -> dict:
+        return {"forwarded": self.forwarded, "received": self.received, "fallbacks": self.fallbacks}
@@ -4,7 +4,7 @@ from typing import List, Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import SessionLocal
+from .unit_of_work import session_scope
 from ..models import Tender, Bid, User, TenderParticipant
 
 class ReportService:
@@ -12,7 +12,7 @@ class ReportService:
     
     async def generate_tender_report(self, tender_id: int) -> str:
         """Генерация отчета по конкретному тендеру"""
-        async with SessionLocal() as session:
+        async with session_scope() as session:
             tender = await session.get(Tender, tender_id)
             if not tender:
                 return "Тендер не найден."
@@ -78,7 +78,7 @@ class ReportService:
     
     async def generate_detailed_report(self, tender_id: int) -> str:
         """Генерация детального отчета с расшифровкой участников"""
-        async with SessionLocal() as session:
+        async with session_scope() as session:
             tender = await session.get(Tender, tender_id)
             if not tender:
                 return "Тендер не найден."
@@ -154,7 +154,7 @@ class ReportService:
     
     async def generate_system_report(self) -> str:
         """Генерация общего отчета по системе"""
-        async with SessionLocal() as session:
+        async with session_scope() as session:
             # Статистика пользователей
             stmt = select(User)
             result = await session.execute(stmt)
@@ -226,7 +226,7 @@ class ReportService:
     
     async def generate_user_report(self, user_id: int) -> str:
         """Генерация отчета по конкретному пользователю"""
-        async with SessionLocal() as session:
+        async with session_scope() as session:
             user = await session.get(User, user_id)
             if not user:
                 return "Пользователь не найден."
@@ -261,8 +261,8 @@ class ReportService:
                             f"📋 {tender.title}\n"
                             f"   💰 Цена: {tender.current_price} ₽\n"
                             f"   📊 Статус: {tender.status}\n"
-                            f"   🏆 Участников: {len(tender.participants)}\n"
-                            f"   📈 Заявок: {len(tender.bids)}\n\n"
+                            f"   🏆 Участников: {tender.participant_count}\n"
+                            f"   📈 Заявок: {tender.bid_count}\n\n"
                         )
                 else:
                     report_text += "   • Тендеров нет\n"
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+
+from .metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """
+    Один фоновый таск на все дедлайны.
+
+    Дедлайны лежат в min-куче по времени loop.time(). Перенос дедлайна — O(log n):
+    в кучу кладётся новая запись, старая помечается устаревшей (сверяется номер записи)
+    и выбрасывается, когда доходит до вершины. Когда дедлайн наступает, вызывается
+    on_due(key); опоздание срабатывания относительно дедлайна пишется в lateness.
+    """
+
+    def __init__(self, on_due: Callable[[Hashable], Awaitable[None]]):
+        self.on_due = on_due
+        self.heap: List[Tuple[float, int, Hashable]] = []
+        self.entries: Dict[Hashable, Tuple[float, int]] = {}
+        self.lateness = LatencyStats()
+        self.fired = 0
+
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def schedule(self, key: Hashable, delay: float):
+        """Назначить (или перенести) дедлайн key через delay секунд"""
+        when = asyncio.get_running_loop().time() + delay
+        seq = next(self._seq)
+        self.entries[key] = (when, seq)
+        heapq.heappush(self.heap, (when, seq, key))
+        self._compact()
+        self.start()
+        # Будим планировщик, только если новый дедлайн раньше текущей вершины
+        if self.heap[0][1] == seq:
+            self._changed.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        return self.entries.pop(key, None) is not None
+
+    def time_left(self, key: Hashable) -> float | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return max(0.0, entry[0] - asyncio.get_running_loop().time())
+
+    def _is_current(self, seq: int, key: Hashable) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry[1] == seq
+
+    def _compact(self):
+        # При частых переносах устаревших записей становится много — пересобираем кучу
+        if len(self.heap) > 64 and len(self.heap) > 4 * len(self.entries):
+            self.heap = [(when, seq, key) for key, (when, seq) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Снимаем устаревшие записи с вершины
+            while self.heap and not self._is_current(self.heap[0][1], self.heap[0][2]):
+                heapq.heappop(self.heap)
+
+            timeout = None
+            if self.heap:
+                timeout = self.heap[0][0] - loop.time()
+
+            if timeout is None or timeout > 0:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            when, seq, key = heapq.heappop(self.heap)
+            del self.entries[key]
+            self.fired += 1
+            self.lateness.observe((loop.time() - when) * 1000)
+            try:
+                await self.on_due(key)
+            except Exception as e:
+                logger.error(f"Ошибка обработки дедлайна {key}: {e}")
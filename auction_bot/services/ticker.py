@@ -0,0 +1,181 @@
+from __future__ import annotations
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError
+
+from ..config import settings
+from ..db import SessionLocal
+from .auction_book import AuctionBook, auction_books
+from .notifier import Notifier
+
+logger = logging.getLogger(__name__)
+
+# (tender_id, chat_id)
+TickerKey = Tuple[int, int]
+
+
+class PriceTicker:
+    """
+    Живое табло аукциона: у каждого участника одно закреплённое сообщение,
+    которое редактируется вместо отправки нового на каждую заявку.
+
+    Обновления тендера откладываются на debounce секунд и перерисовываются разом;
+    для каждого чата в работе не больше одного запроса к Telegram, а пока он идёт,
+    накопившиеся версии текста схлопываются в последнюю.
+    """
+
+    def __init__(self, notifier: Notifier, debounce: float | None = None):
+        self.notifier = notifier
+        self.debounce = debounce if debounce is not None else settings.TICKER_DEBOUNCE
+
+        self.message_ids: Dict[TickerKey, int] = {}   # закреплённое сообщение в чате
+        self.rendered: Dict[TickerKey, str] = {}      # последний отправленный текст
+        self.versions: Dict[TickerKey, int] = {}      # версия тендера, по которой он отрисован
+        self.chat_ids: Dict[int, int] = {}            # user.id -> telegram_id
+
+        self._scheduled: Dict[int, asyncio.Task] = {}
+        self._pending: Dict[TickerKey, str] = {}
+        self._inflight: Dict[TickerKey, asyncio.Task] = {}  # задача, отправляющая правки в чат
+
+        # Метрики
+        self.touches = 0
+        self.edits = 0
+        self.coalesced = 0
+        self.skipped = 0
+
+    def touch(self, tender_id: int):
+        """Состояние тендера изменилось — перерисовать табло после паузы"""
+        self.touches += 1
+        if tender_id in self._scheduled:
+            return
+        self._scheduled[tender_id] = asyncio.create_task(self._flush_later(tender_id))
+
+    async def _flush_later(self, tender_id: int):
+        # Задача остаётся в _scheduled до конца отрисовки, чтобы finish() мог её отменить
+        try:
+            await asyncio.sleep(self.debounce)
+            book = auction_books.get(tender_id)
+            if book is None:
+                return
+            try:
+                await self._flush(book)
+            except Exception as e:
+                logger.error(f"Ошибка обновления табло тендера {tender_id}: {e}")
+        finally:
+            if self._scheduled.get(tender_id) is asyncio.current_task():
+                self._scheduled.pop(tender_id)
+
+    async def _flush(self, book: AuctionBook):
+        missing = [sid for sid in book.participants if sid not in self.chat_ids]
+        if missing:
+            async with SessionLocal() as session:
+                self.chat_ids.update(await Notifier.resolve_chat_ids(session, missing))
+
+        for supplier_id in book.participants:
+            chat_id = self.chat_ids.get(supplier_id)
+            if chat_id is None:
+                continue
+            key = (book.tender_id, chat_id)
+            # Тендер не менялся с прошлой отрисовки — текст был бы тем же
+            if self.versions.get(key) == book.version:
+                self.skipped += 1
+                continue
+            self.versions[key] = book.version
+            self._push(key, self.render(book, supplier_id))
+
+    async def finish(self, tender_id: int, text: str):
+        """Финальная версия табло после закрытия тендера; дальше сообщения не трогаем"""
+        task = self._scheduled.pop(tender_id, None)
+        if task:
+            # Отложенная отрисовка не должна перезаписать финальный текст
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        # Включая чаты, где первое сообщение табло ещё отправляется
+        keys = {key for key in (*self.message_ids, *self._inflight, *self._pending) if key[0] == tender_id}
+        for key in keys:
+            self._push(key, text)
+        # Даём отправиться последним правкам и забываем сообщения тендера
+        drains = [self._inflight[key] for key in keys if key in self._inflight]
+        await asyncio.gather(*drains, return_exceptions=True)
+        for key in keys:
+            self.message_ids.pop(key, None)
+            self.rendered.pop(key, None)
+            self.versions.pop(key, None)
+
+    @staticmethod
+    def render(book: AuctionBook, supplier_id: int) -> str:
+        price_str = f"{book.current_price:,.0f}".replace(",", " ")
+        rank = book.rank(supplier_id)
+        place = f"{rank} из {len(book.supplier_best)}" if rank else "— (вы еще не подавали заявок)"
+        lines = [
+            f"📊 Аукцион '{book.title}'\n",
+            f"💰 Текущая цена: {price_str} ₽",
+            f"🏅 Ваше место: {place}",
+            f"📈 Заявок: {book.bid_count}",
+        ]
+        if book.deadline:
+            minutes_left = max(0, int((book.deadline - datetime.now()).total_seconds() // 60))
+            lines.append(f"⏰ Завершение: {book.deadline.strftime('%H:%M:%S')} (осталось ~{minutes_left} мин)")
+        return "\n".join(lines)
+
+    def _push(self, key: TickerKey, text: str):
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = text
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.create_task(self._drain(key))
+
+    async def _drain(self, key: TickerKey):
+        try:
+            while key in self._pending:
+                text = self._pending.pop(key)
+                if self.rendered.get(key) == text:
+                    continue
+                try:
+                    await self._show(key, text)
+                    self.rendered[key] = text
+                except TelegramRetryAfter:
+                    # Бакеты уже на паузе — повторим с самым свежим текстом
+                    self._pending.setdefault(key, text)
+                except TelegramForbiddenError as e:
+                    self.versions.pop(key, None)
+                    logger.error(f"Табло: чат {key[1]} недоступен: {e}")
+                except Exception as e:
+                    # Не отрисовано — при следующем изменении перерисуем независимо от версии
+                    self.versions.pop(key, None)
+                    logger.error(f"Ошибка обновления табло в чате {key[1]}: {e}")
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _show(self, key: TickerKey, text: str):
+        tender_id, chat_id = key
+        message_id = self.message_ids.get(key)
+        if message_id is not None:
+            try:
+                await self.notifier.edit_once(chat_id, message_id, text)
+                self.edits += 1
+                return
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    return
+                # Сообщение удалено пользователем — создадим новое
+                self.message_ids.pop(key, None)
+
+        message = await self.notifier.send_once(chat_id, text)
+        self.message_ids[key] = message.message_id
+        try:
+            await self.notifier.bot.pin_chat_message(chat_id, message.message_id, disable_notification=True)
+        except Exception as e:
+            logger.warning(f"Не удалось закрепить табло в чате {chat_id}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "messages": len(self.message_ids),
+            "touches": self.touches,
+            "edits": self.edits,
+            "coalesced": self.coalesced,
+            "skipped": self.skipped,
+        }
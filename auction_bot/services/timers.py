@@ -1,16 +1,25 @@
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict
+from typing import Callable, Dict
 from zoneinfo import ZoneInfo
 from aiogram import Bot
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from auction_bot.keyboards import menu_supplier_registered
 
 from ..db import SessionLocal
 from ..models import Tender, TenderStatus, Bid, User, TenderParticipant, TenderAccess
+from .auction_book import auction_books
+from .bid_engine import CLOSE_AFTER_LAST_BID
+from .notifier import Notifier
+from . import outbox
+from .ticker import PriceTicker
+from .scheduler import DeadlineScheduler
+from .lifecycle import TenderTransition, tender_lifecycle
+from .versioning import VersionConflict, retry_on_conflict
 
 logger = logging.getLogger(__name__)
 local_tz = ZoneInfo("Europe/Moscow")
@@ -19,11 +28,17 @@ local_tz = ZoneInfo("Europe/Moscow")
 class AuctionTimer:
     """Сервис для управления таймерами аукционов"""
 
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, notifier: Notifier | None = None, ticker: PriceTicker | None = None):
         self.bot = bot
-        self.active_timers: Dict[int, asyncio.Task] = {}
+        self.notifier = notifier or Notifier(bot)
+        self.ticker = ticker
+        # Дедлайны всех аукционов обслуживает один планировщик
+        self.deadlines = DeadlineScheduler(self._on_deadline)
+        self.closing: set[asyncio.Task] = set()
         # Уведомления о старте: {'before': task, 'start': task} для каждого тендера
         self.start_notifications: Dict[int, Dict[str, asyncio.Task]] = {}
+        # Режим PARTITIONS: дедлайны ведёт только владелец тендера
+        self.owns: Callable[[int], bool] | None = None
 
     # 🔹 Универсальная функция для форматирования цен
     @staticmethod
@@ -31,186 +46,304 @@ class AuctionTimer:
         return f"{value:,.0f}".replace(",", " ")
 
     async def start_timer_for_tender(self, tender_id: int, delay_minutes: int = 2):
-        """Запуск таймера для тендера"""
-        if tender_id in self.active_timers:
-            self.active_timers[tender_id].cancel()
+        """Запуск (или перенос) таймера тендера — одна запись в куче дедлайнов, без отдельного таска"""
+        await self.schedule_close(tender_id, datetime.now() + timedelta(minutes=delay_minutes))
 
-        end_time = datetime.now() + timedelta(minutes=delay_minutes)
-        task = asyncio.create_task(self._wait_and_close_tender(tender_id, delay_minutes))
-        self.active_timers[tender_id] = task
+    async def schedule_close(self, tender_id: int, closes_at: datetime):
+        """Назначить закрытие тендера на closes_at (локальное время, как Tender.closes_at)"""
+        if self.owns and not self.owns(tender_id):
+            return
+        self.deadlines.schedule(tender_id, max(0.0, (closes_at - datetime.now()).total_seconds()))
 
-        logger.info(f"⏱ Таймер запущен для тендера {tender_id}, "
-                    f"длительность {delay_minutes} мин, завершение: {end_time.strftime('%d.%m.%Y %H:%M:%S')}")
+        book = auction_books.get(tender_id)
+        if book:
+            book.deadline = closes_at
 
-    async def _wait_and_close_tender(self, tender_id: int, delay_minutes: int):
-        """Ожидание и закрытие тендера"""
-        try:
-            await asyncio.sleep(delay_minutes * 60)
-
-            async with SessionLocal() as session:
-                tender = await session.get(Tender, tender_id, options=[selectinload(Tender.bids)])
-                if not tender or tender.status != TenderStatus.active.value:
-                    return
+        logger.info(f"⏱ Таймер тендера {tender_id}: завершение {closes_at.strftime('%d.%m.%Y %H:%M:%S')}")
 
-                if tender.last_bid_at:
-                    elapsed = datetime.now() - tender.last_bid_at
-                    if elapsed < timedelta(minutes=2):
-                        logger.info(f"🔄 Новая ставка в тендере {tender_id}, таймер перезапускается")
-                        await self.start_timer_for_tender(tender_id, 2)
-                        return
+    async def rehydrate(self) -> int:
+        """
+        Восстановление дедлайнов после перезапуска.
 
-            await self._close_tender(tender_id)
-
-        except asyncio.CancelledError:
-            logger.info(f"⏹ Таймер для тендера {tender_id} отменен")
-        except Exception as e:
-            logger.error(f"⚠️ Ошибка в таймере для тендера {tender_id}: {e}")
-        finally:
-            self.active_timers.pop(tender_id, None)
+        Читаются только активные тендеры (индекс по status, closes_at); истекшие
+        за время простоя закрываются сразу же планировщиком.
+        """
+        now = datetime.now()
+        async with SessionLocal() as session:
+            # Тендеры, начатые до появления closes_at: дедлайн считаем от последней заявки
+            stmt = select(Tender.id, Tender.last_bid_at).where(
+                Tender.status == TenderStatus.active.value,
+                Tender.closes_at.is_(None),
+                Tender.last_bid_at.is_not(None),
+            )
+            for tender_id, last_bid_at in (await session.execute(stmt)).all():
+                await session.execute(
+                    update(Tender).where(Tender.id == tender_id, Tender.closes_at.is_(None))
+                    .values(closes_at=last_bid_at + CLOSE_AFTER_LAST_BID, version=Tender.version + 1)
+                )
+            await session.commit()
+
+            stmt = select(Tender.id, Tender.closes_at).where(
+                Tender.status == TenderStatus.active.value,
+                Tender.closes_at.is_not(None),
+            )
+            rows = (await session.execute(stmt)).all()
+
+        if self.owns:
+            rows = [row for row in rows if self.owns(row[0])]
+        overdue = 0
+        for tender_id, closes_at in rows:
+            if closes_at <= now:
+                overdue += 1
+            await self.schedule_close(tender_id, closes_at)
+
+        logger.info(f"⏱ Восстановлено дедлайнов: {len(rows)}, из них истекших: {overdue}")
+        return len(rows)
+
+    async def _on_deadline(self, tender_id: int):
+        """Дедлайн наступил: новых заявок не было (каждая заявка переносит дедлайн)"""
+        # Закрытие идёт отдельно, чтобы медленная рассылка не задерживала следующие дедлайны
+        task = asyncio.create_task(self._close_tender(tender_id))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
 
     async def _close_tender(self, tender_id: int):
-        """Закрытие тендера и уведомления"""
+        """Закрытие тендера и уведомления (пишутся в outbox в транзакции закрытия)"""
         try:
-            async with SessionLocal() as session:
-                tender = await session.get(Tender, tender_id, options=[selectinload(Tender.bids)])
-                if not tender or tender.status != TenderStatus.active.value:
-                    return
-
-                tender.status = TenderStatus.closed.value
-                await session.commit()
-
-                winner = None
-                winner_bid = None
-
-                if tender.bids:
-                    # Победитель по минимальной цене
-                    winner_bid = min(tender.bids, key=lambda x: x.amount)
-                    winner = await session.get(User, winner_bid.supplier_id)
-
-                    created_at_local = winner_bid.created_at.replace(tzinfo=timezone.utc).astimezone(local_tz)
-                    price_str = self.format_price(winner_bid.amount)
-
-                    # Победитель
-                    if winner:
-                        try:
-                            await self.bot.send_message(
-                                winner.telegram_id,
-                                f"🏆 Поздравляем! Вы выиграли тендер!\n\n"
-                                f"📋 {tender.title}\n"
-                                f"💰 Ваша цена: {price_str} ₽\n"
-                                f"📅 Время подачи: {created_at_local.strftime('%H:%M:%S')}\n\n"
-                                f"Организатор свяжется с вами для обсуждения деталей.",
-                                reply_markup=menu_supplier_registered
-                            )
-                        except Exception as e:
-                            logger.error(f"Ошибка отправки победителю: {e}")
-
-                    # Участники
-                    await self._notify_participants_about_closure(tender_id, winner.id if winner else None)
-
-                    # Организатор
-                    organizer = await session.get(User, tender.organizer_id)
-                    if organizer:
-                        # Формируем ход торгов (как у тебя было)
-                        bids_report = "📊 ХОД ТОРГОВ:\n\n"
-                        for i, bid in enumerate(tender.bids, start=1):
-                            supplier = await session.get(User, bid.supplier_id)
-                            org_name = supplier.org_name if supplier else "Неизвестная компания"
-                            bids_report += (
-                                f"{i}. 🏢 {org_name}\n"
-                                f"   💰 Цена: {self.format_price(bid.amount)} ₽\n"
-                                f"   ⏰ Время: {bid.created_at.astimezone(local_tz).strftime('%H:%M:%S')}\n\n"
-                            )
-
-                        # Формируем рейтинг участников по их самой низкой ставке
-                        # Группируем ставки по участникам и находим минимальную для каждого
-                        participant_best_bids = {}
-                        for bid in tender.bids:
-                            supplier_id = bid.supplier_id
-                            if supplier_id not in participant_best_bids or bid.amount < participant_best_bids[supplier_id].amount:
-                                participant_best_bids[supplier_id] = bid
-                        
-                        # Сортируем по лучшей ставке каждого участника
-                        sorted_participants = sorted(participant_best_bids.values(), key=lambda x: x.amount)
-                        rating_report = "🏅 Итоговый рейтинг участников:\n\n"
-                        for i, bid in enumerate(sorted_participants, start=1):
-                            supplier = await session.get(User, bid.supplier_id)
-                            org_name = supplier.org_name if supplier else "Неизвестная компания"
-                            bid_price_str = self.format_price(bid.amount)
-                            rating_report += f"{i}. 🏢 {org_name} — {bid_price_str} ₽\n"
-
-                        # Победитель
-                        winner_name = winner.org_name if winner else "Неизвестно"
-
-                        try:
-                            await self.bot.send_message(
-                                organizer.telegram_id,
-                                f"🔴 Аукцион завершен!\n\n"
-                                f"📋 {tender.title}\n"
-                                f"🏆 Победитель: {winner_name}\n"
-                                f"💰 Цена: {price_str} ₽\n\n"
-                                f"{rating_report}\n"
-                                f"{bids_report}"
-                            )
-                        except Exception as e:
-                            logger.error(f"Ошибка отправки организатору: {e}")
-
-
-                else:
-                    # Нет ставок
-                    organizer = await session.get(User, tender.organizer_id)
-                    if organizer:
-                        try:
-                            await self.bot.send_message(
-                                organizer.telegram_id,
-                                f"🔴 Аукцион завершен без заявок!\n\n"
-                                f"📋 {tender.title}"
-                            )
-                        except Exception as e:
-                            logger.error(f"Ошибка отправки организатору: {e}")
-
-                logger.info(f"✅ Тендер {tender.id} закрыт")
+            tender = await retry_on_conflict(lambda: self._close_if_due(tender_id))
+            if tender is None:
+                return
+            await self._after_close(tender)
+            logger.info(f"✅ Тендер {tender_id} закрыт")
         except Exception as e:
             logger.error(f"Ошибка при закрытии тендера {tender_id}: {e}")
 
-    async def _notify_participants_about_closure(self, tender_id: int, winner_id: int = None):
-        """Уведомление участников о завершении аукциона"""
-        try:
-            async with SessionLocal() as session:
-                stmt = select(TenderParticipant).where(TenderParticipant.tender_id == tender_id)
-                result = await session.execute(stmt)
-                participants = result.scalars().all()
-
-                tender = await session.get(Tender, tender_id)
-
-                # Определяем номер победителя
-                winner_number = None
-                if winner_id:
-                    for i, participant in enumerate(participants):
-                        if participant.supplier_id == winner_id:
-                            winner_number = i + 1
-                            break
-
-                closure_text = (
+    async def _close_if_due(self, tender_id: int) -> Tender | None:
+        """
+        Одна попытка закрытия: закрытый тендер или None, если закрывать нечего.
+
+        Переход active → closed условный по версии, прочитанной здесь же: если между
+        чтением и UPDATE прошла заявка, переход не найдёт строку (VersionConflict),
+        и попытка повторится с новым дедлайном — тендер не закроется поверх свежей заявки.
+        """
+        async with SessionLocal() as session:
+            tender = await session.get(Tender, tender_id)
+            if not tender or tender.status != TenderStatus.active.value:
+                return None
+            if tender.closes_at and tender.closes_at > datetime.now():
+                # Заявка успела перенести дедлайн
+                await self.schedule_close(tender_id, tender.closes_at)
+                return None
+
+            if not await tender_lifecycle.transition(
+                session, TenderStatus.closed, [tender_id], Tender.version == tender.version
+            ):
+                # Либо тендер уже закрыт параллельно (следующая попытка увидит статус), либо прошла заявка
+                raise VersionConflict(f"тендер {tender_id}, версия {tender.version}")
+            await self._enqueue_results(session, tender)
+            await tender_lifecycle.commit(session)
+        return tender
+
+    async def _after_close(self, tender: Tender):
+        """Действия после коммита закрытия (книгу и таймер снимают подписчики TenderLifecycle)"""
+        outbox.wake()
+        if self.ticker:
+            await self.ticker.finish(
+                tender.id,
+                f"🔴 Аукцион '{tender.title}' завершен\n\n"
+                f"💰 Итоговая цена: {self.format_price(tender.current_price)} ₽"
+            )
+
+    async def _enqueue_results(self, session: AsyncSession, tender: Tender):
+        """Итоги аукциона победителю, участникам и организатору — в outbox, в переданной транзакции"""
+        tender_id = tender.id
+
+        # Ход торгов — один запрос с именами поставщиков
+        stmt = (
+            select(Bid.supplier_id, Bid.amount, Bid.created_at, User.org_name)
+            .outerjoin(User, User.id == Bid.supplier_id)
+            .where(Bid.tender_id == tender_id)
+            .order_by(Bid.created_at)
+        )
+        bids = (await session.execute(stmt)).all()
+
+        # Рейтинг по лучшей цене каждого участника считает БД
+        best = (
+            select(Bid.supplier_id, func.min(Bid.amount).label("best_amount"))
+            .where(Bid.tender_id == tender_id)
+            .group_by(Bid.supplier_id)
+            .subquery()
+        )
+        stmt = (
+            select(
+                best.c.supplier_id,
+                best.c.best_amount,
+                User.org_name,
+                User.telegram_id,
+                func.rank().over(order_by=best.c.best_amount.asc()).label("place"),
+            )
+            .outerjoin(User, User.id == best.c.supplier_id)
+            .order_by("place")
+        )
+        rating = (await session.execute(stmt)).all()
+
+        winner = None
+        winner_bid = None
+
+        if bids:
+            # Победитель — первое место; время — когда он подал свою лучшую цену
+            winner = rating[0]
+            winner_bid = next(
+                bid for bid in bids
+                if bid.supplier_id == winner.supplier_id and bid.amount == winner.best_amount
+            )
+
+            created_at_local = winner_bid.created_at.replace(tzinfo=timezone.utc).astimezone(local_tz)
+            price_str = self.format_price(winner_bid.amount)
+
+            # Победитель
+            if winner.telegram_id is not None:
+                await outbox.enqueue(
+                    session,
+                    winner.telegram_id,
+                    f"🏆 Поздравляем! Вы выиграли тендер!\n\n"
+                    f"📋 {tender.title}\n"
+                    f"💰 Ваша цена: {price_str} ₽\n"
+                    f"📅 Время подачи: {created_at_local.strftime('%H:%M:%S')}\n\n"
+                    f"Организатор свяжется с вами для обсуждения деталей.",
+                    dedupe_key=f"close:{tender_id}:winner",
+                    reply_markup=menu_supplier_registered
+                )
+
+            # Участники
+            await self._notify_participants_about_closure(session, tender, winner.supplier_id)
+
+            # Организатор
+            organizer = await session.get(User, tender.organizer_id)
+            if organizer:
+                bids_report = "📊 ХОД ТОРГОВ:\n\n"
+                for i, bid in enumerate(bids, start=1):
+                    org_name = bid.org_name or "Неизвестная компания"
+                    bid_local = bid.created_at.replace(tzinfo=timezone.utc).astimezone(local_tz)
+                    bids_report += (
+                        f"{i}. 🏢 {org_name}\n"
+                        f"   💰 Цена: {self.format_price(bid.amount)} ₽\n"
+                        f"   ⏰ Время: {bid_local.strftime('%H:%M:%S')}\n\n"
+                    )
+
+                rating_report = "🏅 Итоговый рейтинг участников:\n\n"
+                for row in rating:
+                    org_name = row.org_name or "Неизвестная компания"
+                    rating_report += f"{row.place}. 🏢 {org_name} — {self.format_price(row.best_amount)} ₽\n"
+
+                # Победитель
+                winner_name = winner.org_name or "Неизвестно"
+
+                await outbox.enqueue(
+                    session,
+                    organizer.telegram_id,
                     f"🔴 Аукцион завершен!\n\n"
                     f"📋 {tender.title}\n"
-                    f"🏆 Победитель: Участник {winner_number if winner_number else '—'}\n"
-                    f"💰 Цена: {self.format_price(tender.current_price)} ₽\n"
-                    f"📅 Время завершения: {datetime.now().strftime('%H:%M:%S')}\n\n"
-                    f"Спасибо за участие!"
+                    f"🏆 Победитель: {winner_name}\n"
+                    f"💰 Цена: {price_str} ₽\n\n"
+                    f"{rating_report}\n"
+                    f"{bids_report}",
+                    dedupe_key=f"close:{tender_id}:organizer"
                 )
 
-                # Отправляем всем, кроме победителя
-                for participant in participants:
-                    if participant.supplier_id != winner_id:
-                        user = await session.get(User, participant.supplier_id)
-                        if user:
-                            try:
-                                await self.bot.send_message(user.telegram_id, closure_text)
-                            except Exception as e:
-                                logger.error(f"Ошибка отправки участнику: {e}")
-        except Exception as e:
-            logger.error(f"Ошибка уведомления участников: {e}")
+        else:
+            # Нет ставок
+            organizer = await session.get(User, tender.organizer_id)
+            if organizer:
+                await outbox.enqueue(
+                    session,
+                    organizer.telegram_id,
+                    f"🔴 Аукцион завершен без заявок!\n\n"
+                    f"📋 {tender.title}",
+                    dedupe_key=f"close:{tender_id}:organizer"
+                )
+
+    async def close_expired(self, concurrency: int = 10) -> dict:
+        """
+        Массовое закрытие истекших аукционов.
+
+        Истекшие тендеры выбираются и переводятся в closed одним условным UPDATE
+        по индексу (status, closes_at); итоги пишутся в outbox в той же транзакции,
+        так что закрытый тендер не останется без итогов. После коммита параллельно,
+        не больше concurrency одновременно, идут только финальные табло.
+        Возвращает число закрытых и время фаз.
+        """
+        started = time.perf_counter()
+        expired = Tender.closes_at <= datetime.now()
+        async with SessionLocal() as session:
+            if self.owns:
+                # Режим PARTITIONS: закрываем только тендеры своих партиций
+                stmt = select(Tender.id).where(Tender.status == TenderStatus.active.value, expired)
+                candidates = [i for i in (await session.execute(stmt)).scalars() if self.owns(i)]
+                tender_ids = await tender_lifecycle.transition(session, TenderStatus.closed, candidates, expired)
+            else:
+                tender_ids = await tender_lifecycle.transition(session, TenderStatus.closed, None, expired)
+            tenders = []
+            if tender_ids:
+                stmt = select(Tender).where(Tender.id.in_(tender_ids)).order_by(Tender.id)
+                tenders = (await session.execute(stmt)).scalars().all()
+                for tender in tenders:
+                    await self._enqueue_results(session, tender)
+            await tender_lifecycle.commit(session)
+        transition_ms = (time.perf_counter() - started) * 1000
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def finish(tender: Tender):
+            async with semaphore:
+                await self._after_close(tender)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(finish(tender) for tender in tenders), return_exceptions=True)
+        delivery_ms = (time.perf_counter() - started) * 1000
+
+        failed = 0
+        for tender, result in zip(tenders, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error(f"Ошибка при обновлении табло тендера {tender.id}: {result}")
+
+        if tender_ids:
+            logger.info(f"✅ Закрыто истекших тендеров: {len(tender_ids)} "
+                        f"(закрытие с итогами {transition_ms:.0f} мс, табло {delivery_ms:.0f} мс, ошибок {failed})")
+        return {
+            "closed": len(tender_ids),
+            "failed": failed,
+            "transition_ms": round(transition_ms, 2),
+            "delivery_ms": round(delivery_ms, 2),
+        }
+
+    async def _notify_participants_about_closure(self, session: AsyncSession, tender: Tender, winner_id: int = None):
+        """Уведомление участников о завершении аукциона (в outbox, в транзакции закрытия)"""
+        stmt = (
+            select(TenderParticipant.supplier_id)
+            .where(TenderParticipant.tender_id == tender.id)
+            .order_by(TenderParticipant.id)
+        )
+        participants = (await session.execute(stmt)).scalars().all()
+
+        # Определяем номер победителя
+        winner_number = None
+        if winner_id and winner_id in participants:
+            winner_number = participants.index(winner_id) + 1
+
+        closure_text = (
+            f"🔴 Аукцион завершен!\n\n"
+            f"📋 {tender.title}\n"
+            f"🏆 Победитель: Участник {winner_number if winner_number else '—'}\n"
+            f"💰 Цена: {self.format_price(tender.current_price)} ₽\n"
+            f"📅 Время завершения: {datetime.now().strftime('%H:%M:%S')}\n\n"
+            f"Спасибо за участие!"
+        )
+
+        # Отправляем всем, кроме победителя
+        recipients = [supplier_id for supplier_id in participants if supplier_id != winner_id]
+        await outbox.enqueue_users(session, recipients, closure_text, dedupe_prefix=f"close:{tender.id}")
 
 
     async def schedule_start_notifications(self, tender_id: int):
@@ -243,6 +376,7 @@ class AuctionTimer:
                     self.start_notifications[tender_id]['before'].cancel()
                 task_before = asyncio.create_task(self._notify_participants_at_time(
                     tender_id,
+                    kind="before",
                     delay=notify_before.total_seconds(),
                     message_template=(
                         f"⏰ Тендер <b>{tender.title}</b> начнется через 10 минут!\n"
@@ -260,6 +394,7 @@ class AuctionTimer:
                     self.start_notifications[tender_id]['start'].cancel()
                 task_start = asyncio.create_task(self._notify_participants_at_time(
                     tender_id,
+                    kind="start",
                     delay=notify_start.total_seconds(),
                     message_template=(
                         f"🟢 Тендер <b>{tender.title}</b> начался!\n"
@@ -271,24 +406,19 @@ class AuctionTimer:
             else:
                 logger.warning(f"Skipped start notification for tender {tender_id}, time already passed")
 
-    async def _notify_participants_at_time(self, tender_id: int, delay: float, message_template: str):
+    async def _notify_participants_at_time(self, tender_id: int, kind: str, delay: float, message_template: str):
         logger.info(f"Tender {tender_id} → waiting {delay:.0f} sec before notification")
         await asyncio.sleep(delay)
 
         async with SessionLocal() as session:
             # Получаем только участников тендера
-            stmt = select(TenderParticipant).where(TenderParticipant.tender_id == tender_id)
-            result = await session.execute(stmt)
-            participants = result.scalars().all()
+            stmt = select(TenderParticipant.supplier_id).where(TenderParticipant.tender_id == tender_id)
+            supplier_ids = set((await session.execute(stmt)).scalars().all())
 
-            for supplier_id in {p.supplier_id for p in participants}:
-                user = await session.get(User, supplier_id)
-                if user:
-                    try:
-                        await self.bot.send_message(user.telegram_id, message_template)
-                        logger.info(f"Notification sent to user {user.id}")
-                    except Exception as e:
-                        logger.error(f"Failed to send notification to user {user.id}: {e}")
+            await outbox.enqueue_users(session, supplier_ids, message_template, dedupe_prefix=f"{kind}:{tender_id}")
+            await session.commit()
+        outbox.wake()
+        logger.info(f"Tender {tender_id} → notification queued for {len(supplier_ids)} participants")
 
     async def cancel_start_notifications(self, tender_id: int):
         """Отмена уведомлений (10 мин и старт) для тендера"""
@@ -306,37 +436,37 @@ class AuctionTimer:
     async def cleanup(self):
         """Очистка всех таймеров и уведомлений"""
         # таймеры аукционов
-        for tender_id in list(self.active_timers.keys()):
-            await self.cancel_timer_for_tender(tender_id)
+        await self.deadlines.stop()
+        self.deadlines.entries.clear()
+        self.deadlines.heap.clear()
         # уведомления о старте
         for tender_id in list(self.start_notifications.keys()):
             await self.cancel_start_notifications(tender_id)
         logger.info("Все таймеры и уведомления очищены")
 
-    async def reset_timer_for_tender(self, tender_id: int):
-        if tender_id in self.active_timers:
-            self.active_timers[tender_id].cancel()
+    async def reset_timer_for_tender(self, tender_id: int, closes_at: datetime | None = None):
+        """Перенос дедлайна после заявки; closes_at — дедлайн, уже записанный в тендер"""
         logger.info(f"🔄 Сброс таймера для тендера {tender_id}")
-        await self.start_timer_for_tender(tender_id, 2)
+        if closes_at:
+            await self.schedule_close(tender_id, closes_at)
+        else:
+            await self.start_timer_for_tender(tender_id, 2)
+
+    async def on_transition(self, event: TenderTransition):
+        """Подписчик TenderLifecycle: у закрытого или отменённого тендера таймеров нет"""
+        if event.status not in (TenderStatus.closed.value, TenderStatus.cancelled.value):
+            return
+        for tender_id in event.tender_ids:
+            await self.cancel_timer_for_tender(tender_id)
+            await self.cancel_start_notifications(tender_id)
 
     async def cancel_timer_for_tender(self, tender_id: int):
-        if tender_id in self.active_timers:
-            self.active_timers[tender_id].cancel()
-            self.active_timers.pop(tender_id, None)
+        if self.deadlines.cancel(tender_id):
             logger.info(f"⏹ Таймер для тендера {tender_id} отменен")
 
     async def check_all_active_tenders(self):
         try:
-            async with SessionLocal() as session:
-                stmt = select(Tender).where(Tender.status == TenderStatus.active.value)
-                result = await session.execute(stmt)
-                active_tenders = result.scalars().all()
-
-                for tender in active_tenders:
-                    if tender.last_bid_at:
-                        elapsed = datetime.now() - tender.last_bid_at
-                        if elapsed > timedelta(minutes=2):
-                            await self._close_tender(tender.id)
+            await self.close_expired()
         except Exception as e:
             logger.error(f"Ошибка при проверке тендеров: {e}")
 
@@ -350,9 +480,4 @@ class AuctionTimer:
                 await asyncio.sleep(60)
 
     def get_active_timers_count(self) -> int:
-        return len(self.active_timers)
-
-    async def cleanup(self):
-        for tender_id in list(self.active_timers.keys()):
-            await self.cancel_timer_for_tender(tender_id)
-        logger.info("Все таймеры очищены")
+        return len(self.deadlines)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+SESSION_BUCKETS = [0, 1, 2, 3, 4, 6, 8]
+STATEMENT_BUCKETS = [0, 1, 2, 4, 8, 16, 32, 64]
+
+
+class UnitOfWork:
+    """Сессия апдейта и счётчики обращений к базе за время его обработки"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        # Сессию переиспользует только задача апдейта: задачи, созданные из обработчика
+        # (акторы, табло, групповой коммит), наследуют контекст, но живут дольше апдейта
+        self.task = asyncio.current_task()
+        self.active = True
+        self.sessions: set[int] = set()
+        self.statements = 0
+
+    def owns_current_task(self) -> bool:
+        return self.active and asyncio.current_task() is self.task
+
+
+_current: ContextVar[UnitOfWork | None] = ContextVar("unit_of_work", default=None)
+
+
+def current_unit_of_work() -> UnitOfWork | None:
+    uow = _current.get()
+    return uow if uow is not None and uow.owns_current_task() else None
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для обработчиков и вызываемых ими помощников.
+
+    Внутри апдейта — общая сессия апдейта: её не закрывают, а коммит (если
+    обработчик не закоммитил сам) и откат при ошибке делает UnitOfWorkMiddleware.
+    Вне апдейта (таймеры, акторы, фоновые задачи) — новая сессия, как SessionLocal().
+    """
+    uow = current_unit_of_work()
+    if uow is not None:
+        yield uow.session
+        return
+    async with SessionLocal() as session:
+        yield session
+
+
+@event.listens_for(Session, "after_begin")
+def _count_session(session: Session, transaction, connection):
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.sessions.add(id(session))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.statements += 1
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """
+    Outer-middleware апдейтов: одна сессия базы на апдейт.
+
+    Сессия передаётся обработчикам параметром session и через session_scope()
+    помощникам. После обработчика незакоммиченные изменения коммитятся, при
+    исключении — откатываются. Соединение сессия берёт лениво, так что апдейты
+    без обращения к базе пул не трогают.
+    """
+
+    def __init__(self):
+        # Метрики: сколько сессий (транзакций на соединении) и SQL-запросов занимает один апдейт
+        self.sessions = Histogram(SESSION_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with SessionLocal() as session:
+            uow = UnitOfWork(session)
+            token = _current.set(uow)
+            try:
+                data["session"] = session
+                result = await handler(event, data)
+                if session.in_transaction():
+                    try:
+                        await session.commit()
+                    except Exception as e:
+                        logger.error(f"Ошибка коммита сессии апдейта: {e}")
+                        await session.rollback()
+                return result
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                uow.active = False
+                _current.reset(token)
+                self.sessions.observe(len(uow.sessions))
+                self.statements.observe(uow.statements)
+
+
+unit_of_work = UnitOfWorkMiddleware()
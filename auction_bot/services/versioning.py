@@ -0,0 +1,61 @@
+from __future__ import annotations
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from sqlalchemy.orm.exc import StaleDataError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class VersionConflict(Exception):
+    """Строка тендера изменилась между чтением и условной записью по версии"""
+
+
+async def retry_on_conflict(operation: Callable[[], Awaitable[T]], attempts: int = 3, delay: float = 0.05) -> T:
+    """
+    Повтор операции «прочитать → записать при той же версии» при конфликте.
+
+    operation должна сама открывать сессию и перечитывать тендер: повтор
+    со старыми данными дал бы тот же конфликт.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await operation()
+        except (VersionConflict, StaleDataError) as e:
+            if attempt == attempts:
+                raise
+            logger.info(f"🔁 Конфликт версий ({e}), попытка {attempt + 1} из {attempts}")
+            await asyncio.sleep(delay * attempt)
+
+
+class VersionedCache(Generic[T]):
+    """
+    Кэш отрисованных представлений с версией строки как токеном валидности.
+
+    Запись годна, пока версия тендера не изменилась; вытесняются давно не читанные.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self.items: OrderedDict[Hashable, tuple[int, T]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int) -> T | None:
+        item = self.items.get(key)
+        if item is None or item[0] != version:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: Hashable, version: int, value: T):
+        self.items[key] = (version, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import asyncio
+import hmac
+import logging
+import secrets
+import time
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from ..config import settings
+from .metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Приём апдейтов через webhook: aiohttp-сервер, ограниченная очередь и пул воркеров.
+
+    Обработчик HTTP только проверяет секретный токен, разбирает апдейт и кладёт его
+    в очередь — Telegram получает 200 сразу, не дожидаясь обработчиков бота. Если
+    очередь заполнена, отвечаем 503: Telegram повторит доставку позже, а память не
+    растёт под наплывом. Апдейты обрабатывают workers воркеров через dp.feed_update,
+    поэтому апдейты одного чата, как и при опросе с handle_as_tasks, могут
+    обрабатываться параллельно.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, path: str | None = None, secret: str | None = None,
+                 queue_size: int | None = None, workers: int | None = None):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.path = path or settings.WEBHOOK_PATH
+        # Telegram допускает в токене 1–256 символов A-Z, a-z, 0-9, _ и -
+        self.secret = secret or settings.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self.workers = workers or settings.WEBHOOK_WORKERS
+
+        self.queue: asyncio.Queue[tuple[Update, float]] = asyncio.Queue(queue_size or settings.WEBHOOK_QUEUE_SIZE)
+        self.tasks: list[asyncio.Task] = []
+        self.runner: web.AppRunner | None = None
+
+        # Метрики
+        self.handler_latency = LatencyStats()   # feed_update одного апдейта
+        self.update_latency = LatencyStats()    # от приёма HTTP-запроса до конца обработки
+        self.received = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"⚠️ Некорректный апдейт в webhook: {e}")
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait((update, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            update, received_at = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки апдейта {update.update_id}: {e}")
+            finally:
+                finished = time.perf_counter()
+                self.handler_latency.observe((finished - started) * 1000)
+                self.update_latency.observe((finished - received_at) * 1000)
+                self.queue.task_done()
+
+    async def start(self, host: str | None = None, port: int | None = None):
+        """Запуск воркеров и HTTP-сервера (без регистрации webhook в Telegram)"""
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        # В режиме PARTITIONS процессы слушают один порт, ядро делит между ними соединения
+        site = web.TCPSite(self.runner, host or settings.WEBHOOK_HOST, port or settings.WEBHOOK_PORT,
+                           reuse_port=bool(settings.PARTITIONS) or None)
+        await site.start()
+        logger.info(f"🌐 Webhook слушает {site.name}: {self.workers} воркеров, очередь {self.queue.maxsize}")
+
+    async def stop(self, drain_timeout: float = 10):
+        """Остановка приёма, дообработка очереди и остановка воркеров"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Webhook остановлен, в очереди осталось {self.queue.qsize()} апдейтов")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def register(self, url: str):
+        """Регистрация webhook в Telegram"""
+        await self.bot.set_webhook(
+            url=url.rstrip("/") + self.path,
+            secret_token=self.secret,
+            allowed_updates=self.dispatcher.resolve_used_update_types(),
+            # При PARTITIONS регистрирует заново процесс, перенявший приём, — накопленное не сбрасываем
+            drop_pending_updates=not settings.PARTITIONS,
+        )
+
+    async def run(self, url: str, register: bool = True):
+        """Приём апдейтов до отмены: сервер, регистрация webhook в Telegram, остановка"""
+        # События запуска и остановки диспетчера, как при опросе (например, запись состояний FSM)
+        workflow = {**self.dispatcher.workflow_data, "dispatcher": self.dispatcher, "bots": [self.bot]}
+        await self.dispatcher.emit_startup(bot=self.bot, **workflow)
+        await self.start()
+        # При PARTITIONS webhook регистрирует держатель роли updates; остальные
+        # процессы принимают апдейты на том же порту
+        if register:
+            await self.register(url)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+            await self.dispatcher.emit_shutdown(bot=self.bot, **workflow)
+            await self.bot.session.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "received": self.received,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
@@ -0,0 +1,164 @@
+"""
+Задержка частых запросов до и после миграций с индексами.
+
+Создаёт временную SQLite-базу со схемой до миграций 2–3 (без новых индексов),
+заполняет её (по умолчанию 1 000 000 заявок), замеряет запросы, затем применяет
+миграции тем же run_migrations, что и бот при старте, и замеряет снова.
+
+    python -m benchmarks.bench_indexes [--bids 1000000] [--repeat 50] [--db /tmp/bench.db]
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+
+from auction_bot.migrations import MIGRATIONS, run_migrations, schema_migrations
+from auction_bot.models import Base, Bid, Tender, TenderAccess, TenderParticipant, TenderStatus
+
+# Индексы, которые добавляют миграции 2–3: в исходной схеме их нет
+NEW_INDEXES = (
+    "ix_bids_tender_created_at",
+    "ix_bids_supplier_id",
+    "ix_tenders_status_start_at",
+    "ux_tender_participants_tender_supplier",
+    "ux_tender_access_tender_supplier",
+)
+
+
+def build(path: str, bids: int, tenders: int, suppliers: int):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        for name in NEW_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        # Схема «как до миграций»: версия 1 уже применена
+        schema_migrations.create(conn, checkfirst=True)
+        conn.execute(schema_migrations.insert().values(
+            version=MIGRATIONS[0].version, name=MIGRATIONS[0].name, applied_at=datetime.now()
+        ))
+    engine.dispose()
+
+    rnd = random.Random(42)
+    now = datetime.now()
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=OFF")
+    db.execute("PRAGMA synchronous=OFF")
+    db.executemany(
+        "INSERT INTO users (id, telegram_id, role, banned, created_at) VALUES (?, ?, 'supplier', 0, ?)",
+        ((i, 10_000_000 + i, now) for i in range(1, suppliers + 1)),
+    )
+    statuses = [TenderStatus.closed.value] * 8 + [TenderStatus.active.value, TenderStatus.active_pending.value]
+    db.executemany(
+        "INSERT INTO tenders (id, title, start_price, start_at, status, organizer_id, created_at, current_price, "
+        "min_bid_decrease, participant_count, bid_count) VALUES (?, ?, 1000000, ?, ?, 1, ?, 1000000, 100, 0, 0)",
+        (
+            (i, f"Тендер {i}", now + timedelta(minutes=rnd.randint(-10_000, 10_000)), rnd.choice(statuses), now)
+            for i in range(1, tenders + 1)
+        ),
+    )
+    # Каждый тендер — 10 участников с доступом; заявки подают только они
+    pairs = [(t, s) for t in range(1, tenders + 1) for s in rnd.sample(range(1, suppliers + 1), 10)]
+    db.executemany("INSERT INTO tender_participants (tender_id, supplier_id, joined_at) VALUES (?, ?, ?)",
+                   ((t, s, now) for t, s in pairs))
+    db.executemany("INSERT INTO tender_access (tender_id, supplier_id, granted_at) VALUES (?, ?, ?)",
+                   ((t, s, now) for t, s in pairs))
+
+    def bid_rows():
+        for i in range(bids):
+            tender_id, supplier_id = pairs[rnd.randrange(len(pairs))]
+            yield tender_id, supplier_id, 1_000_000 - rnd.random() * 900_000, now + timedelta(seconds=i)
+
+    db.executemany("INSERT INTO bids (tender_id, supplier_id, amount, created_at) VALUES (?, ?, ?, ?)", bid_rows())
+    db.commit()
+    db.execute("ANALYZE")
+    db.close()
+    return pairs
+
+
+def queries(pairs, tenders: int, suppliers: int):
+    """Запросы из обработчиков бота: (название, фабрика statement со случайными параметрами)"""
+    rnd = random.Random(7)
+    return [
+        ("журнал заявок тендера",
+         lambda: select(Bid.id, Bid.supplier_id, Bid.amount, Bid.created_at)
+         .where(Bid.tender_id == rnd.randint(1, tenders)).order_by(Bid.created_at)),
+        ("рейтинг при закрытии",
+         lambda: select(Bid.supplier_id, func.min(Bid.amount))
+         .where(Bid.tender_id == rnd.randint(1, tenders)).group_by(Bid.supplier_id)),
+        ("мои заявки",
+         lambda: select(Bid.id, Bid.amount, Bid.created_at)
+         .where(Bid.supplier_id == rnd.randint(1, suppliers)).order_by(Bid.created_at.desc())),
+        ("участник тендера",
+         lambda: (lambda t, s: select(TenderParticipant.id)
+                  .where(TenderParticipant.tender_id == t, TenderParticipant.supplier_id == s))(*rnd.choice(pairs))),
+        ("доступ к тендеру",
+         lambda: (lambda t, s: select(TenderAccess.id)
+                  .where(TenderAccess.tender_id == t, TenderAccess.supplier_id == s))(*rnd.choice(pairs))),
+        ("тендеры к активации",
+         lambda: select(Tender.id).where(
+             Tender.status == TenderStatus.active_pending.value, Tender.start_at <= datetime.now())),
+    ]
+
+
+def measure(conn, stmt_factory, repeat: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        stmt = stmt_factory()
+        start = time.perf_counter()
+        conn.execute(stmt).all()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def run(conn, pairs, args) -> dict[str, tuple[float, float]]:
+    return {
+        name: measure(conn, factory, args.repeat)
+        for name, factory in queries(pairs, args.tenders, args.suppliers)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bids", type=int, default=1_000_000)
+    parser.add_argument("--tenders", type=int, default=5_000)
+    parser.add_argument("--suppliers", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--db", help="путь к файлу базы (по умолчанию временный)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    if os.path.exists(path):
+        os.remove(path)
+
+    start = time.perf_counter()
+    pairs = build(path, args.bids, args.tenders, args.suppliers)
+    print(f"База {path}: {args.bids} заявок, {args.tenders} тендеров — {time.perf_counter() - start:.1f} с")
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as conn:
+        before = run(conn, pairs, args)
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        applied = run_migrations(conn)
+        conn.exec_driver_sql("ANALYZE")
+        print(f"Миграции {applied} — {time.perf_counter() - start:.1f} с")
+    with engine.connect() as conn:
+        after = run(conn, pairs, args)
+    engine.dispose()
+
+    print(f"\n{'запрос, мс':<24}{'до p50':>10}{'до p95':>10}{'после p50':>12}{'после p95':>12}{'ускорение':>11}")
+    for name, (b50, b95) in before.items():
+        a50, a95 = after[name]
+        print(f"{name:<24}{b50:>10.2f}{b95:>10.2f}{a50:>12.2f}{a95:>12.2f}{b50 / max(a50, 1e-6):>10.0f}×")
+
+
+if __name__ == "__main__":
+    main()
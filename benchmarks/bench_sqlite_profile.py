@@ -0,0 +1,99 @@
+"""
+Пропускная способность заявок с профилем SQLite и без него.
+
+100 одновременных участников подают заявки в несколько тендеров: каждая итерация —
+чтение текущей цены и accept_bid с коммитом, как в обработчике заявки (без акторов,
+чтобы нагрузка на базу была конкурентной). Сравниваются движки из create_engines:
+без профиля (журнал отката, общий пул) и с профилем (WAL, pragma, один писатель,
+пул читателей).
+
+    python -m benchmarks.bench_sqlite_profile [--bidders 100] [--bids 20] [--tenders 10]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from auction_bot.db import create_engines, create_session_factory
+from auction_bot.models import Base, Tender, TenderStatus, User
+from auction_bot.services.bid_engine import accept_bid
+from auction_bot.services.metrics import LatencyStats
+
+
+async def prepare(session_factory, engine, tenders: int, bidders: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as session:
+        session.add_all(User(id=i, telegram_id=i) for i in range(1, bidders + 1))
+        session.add_all(
+            Tender(
+                id=i, title=f"Тендер {i}", start_price=10_000_000, current_price=10_000_000,
+                min_bid_decrease=1, status=TenderStatus.active.value, organizer_id=1, start_at=datetime.now(),
+            )
+            for i in range(1, tenders + 1)
+        )
+        await session.commit()
+
+
+async def bidder(session_factory, supplier_id: int, tender_id: int, bids: int, stats: LatencyStats, counters: dict):
+    for _ in range(bids):
+        start = time.perf_counter()
+        try:
+            async with session_factory() as session:
+                price = (await session.execute(
+                    select(Tender.current_price).where(Tender.id == tender_id)
+                )).scalar_one()
+                result = await accept_bid(session, tender_id, supplier_id, price - 1)
+                await session.commit()
+            counters["accepted" if result.accepted else "rejected"] += 1
+        except OperationalError:
+            counters["locked"] += 1
+        stats.observe((time.perf_counter() - start) * 1000)
+
+
+async def run(profile: bool, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench_profile.db")
+    writer, reader = create_engines(f"sqlite+aiosqlite:///{path}", profile)
+    session_factory = create_session_factory(writer, reader)
+    await prepare(session_factory, writer, args.tenders, args.bidders)
+
+    stats = LatencyStats()
+    counters = {"accepted": 0, "rejected": 0, "locked": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        bidder(session_factory, i, i % args.tenders + 1, args.bids, stats, counters)
+        for i in range(1, args.bidders + 1)
+    ))
+    elapsed = time.perf_counter() - start
+
+    await writer.dispose()
+    if reader is not writer:
+        await reader.dispose()
+    return {"elapsed": elapsed, "stats": stats, **counters}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bidders", type=int, default=100)
+    parser.add_argument("--bids", type=int, default=20, help="заявок на участника")
+    parser.add_argument("--tenders", type=int, default=10)
+    args = parser.parse_args()
+
+    for profile in (False, True):
+        r = await run(profile, args)
+        done = r["accepted"] + r["rejected"]
+        print(
+            f"{'профиль' if profile else 'без профиля':<12} "
+            f"{done / r['elapsed']:>8.0f} транз/с  принято {r['accepted']}, отклонено {r['rejected']}, "
+            f"database is locked {r['locked']}  |  {r['stats'].format()}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
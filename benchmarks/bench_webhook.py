@@ -0,0 +1,102 @@
+"""
+Приём апдейтов через webhook: пропускная способность и задержка обработки.
+
+Поднимает WebhookServer на локальном порту с отдельным Dispatcher, обработчик
+сообщений которого имитирует работу (ожидание ввода-вывода --work-ms). Клиенты
+параллельно отправляют синтетические апдейты message с секретным токеном, как
+Telegram. Замер идёт до обработки последнего апдейта; сравниваются разные
+числа воркеров. К Bot API запросов нет.
+
+    python -m benchmarks.bench_webhook [--updates 5000] [--clients 50] [--work-ms 5] [--workers 1 4 16 64]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+
+from aiohttp import ClientSession, TCPConnector
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+
+from auction_bot.services.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "bench-secret"
+
+
+def make_dispatcher(work_ms: float) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        await asyncio.sleep(work_ms / 1000)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+def synthetic_update(update_id: int) -> dict:
+    chat_id = 1000 + update_id % 500
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": "Активные тендеры",
+        },
+    }
+
+
+async def client(session: ClientSession, url: str, ids: list[int]):
+    for update_id in ids:
+        async with session.post(url, json=synthetic_update(update_id), headers={SECRET_HEADER: SECRET}) as resp:
+            await resp.read()
+
+
+async def run(workers: int, args) -> dict:
+    bot = Bot(token="123456:bench")
+    server = WebhookServer(make_dispatcher(args.work_ms), bot, path="/webhook", secret=SECRET,
+                           queue_size=args.queue, workers=workers)
+    await server.start(host="127.0.0.1", port=args.port)
+    url = f"http://127.0.0.1:{args.port}/webhook"
+
+    start = time.perf_counter()
+    async with ClientSession(connector=TCPConnector(limit=args.clients)) as session:
+        await asyncio.gather(*(
+            client(session, url, list(range(i, args.updates, args.clients)))
+            for i in range(args.clients)
+        ))
+    await server.queue.join()
+    elapsed = time.perf_counter() - start
+
+    await server.stop()
+    await bot.session.close()
+    return {"elapsed": elapsed, "server": server}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=50, help="параллельных HTTP-клиентов")
+    parser.add_argument("--work-ms", type=float, default=5, help="время обработчика, мс")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queue", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        r = await run(workers, args)
+        server = r["server"]
+        handled = server.handler_latency.count
+        print(
+            f"воркеров {workers:<3} {handled / r['elapsed']:>8.0f} апдейтов/с  "
+            f"обработчик p99 {server.handler_latency.percentile(99):.1f} мс  |  "
+            f"от приёма: {server.update_latency.format()}  |  "
+            f"отклонено (503) {server.rejected}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())